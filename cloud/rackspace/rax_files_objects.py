@@ -64,6 +64,16 @@ options:
       - put
       - delete
     default: get
+  skip_unchanged:
+    description:
+      - Skip transferring objects whose local MD5 already matches the etag
+        of the remote object.  The container is listed once to obtain the
+        etags.
+    choices:
+      - "yes"
+      - "no"
+    default: "yes"
+    version_added: "2.1"
   src:
     description:
       - Source from which to upload files.  Used to specify a remote object as a source for
@@ -84,6 +94,21 @@ options:
       - Indicate desired state of the resource
     choices: ['present', 'absent']
     default: present
+  state_file:
+    description:
+      - Path to a local file used to record completed transfers of a get or
+        put operation.  If the operation is interrupted or some objects fail,
+        running it again with the same I(state_file) resumes it without
+        re-checking objects that already completed.  The file is removed once
+        every object has been transferred.
+    default: null
+    version_added: "2.1"
+  threads:
+    description:
+      - Number of objects to upload or download concurrently.  Each worker
+        opens its own connection to Cloud Files.
+    default: 1
+    version_added: "2.1"
   type:
     description:
       - Type of object to do work on
@@ -134,6 +159,14 @@ EXAMPLES = '''
           testkey: testdata
           who_uploaded_this: someuser@example.com
 
+    - name: "Upload a large folder with 8 workers, resumable if interrupted"
+      rax_files_objects:
+        container: testcont
+        method: put
+        src: ~/Downloads/onehundred
+        threads: 8
+        state_file: ~/.testcont-upload.state
+
     - name: "Upload one file to test container with TTL of 60 seconds"
       rax_files_objects: container=testcont method=put src=~/Downloads/testcont/file3 expires=60
 
@@ -183,6 +216,12 @@ EXAMPLES = '''
       rax_files_objects:  container=testcont type=meta
 '''
 
+import hashlib
+import json
+import Queue
+import threading
+import time
+
 try:
     import pyrax
     HAS_PYRAX = True
@@ -192,6 +231,11 @@ except ImportError:
 EXIT_DICT = dict(success=False)
 META_PREFIX = 'x-object-meta-'
 
+# The resume state is rewritten after this many completed objects or this
+# many seconds, whichever comes first, rather than after every object
+STATE_FLUSH_OBJECTS = 100
+STATE_FLUSH_SECONDS = 5
+
 
 def _get_container(module, cf, container):
     try:
@@ -200,6 +244,279 @@ def _get_container(module, cf, container):
         module.fail_json(msg=e.message)
 
 
+def _md5_file(path, blocksize=65536):
+    """ Returns the hex MD5 digest of a local file, which is what Cloud Files
+    reports as the etag of an object that was not uploaded in segments
+    """
+    digest = hashlib.md5()
+    f = open(path, 'rb')
+    try:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            digest.update(block)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+
+class TransferEngine(object):
+    """ Moves objects between a local directory and a single container using
+    a pool of worker threads.
+
+    Every worker gets its own container handle from ``connect``, as the
+    underlying HTTP connections are not safe to share between threads; when
+    ``connect`` is not given all workers use ``container``.  The container is
+    listed once; objects whose remote etag matches the MD5 of
+    the local file are skipped.  Completed transfers are recorded in
+    ``state_file`` (when given) together with the local size and mtime, so an
+    interrupted run can be resumed without re-hashing what already finished.
+    The state is written in batches, so at most the last batch of a killed
+    run is transferred again.
+    """
+
+    def __init__(self, container, direction, threads=1, skip_unchanged=True,
+                 state_file=None, connect=None):
+        self.container = container
+        self.connect = connect or (lambda: container)
+        self.direction = direction
+        self.threads = max(1, threads or 1)
+        self.skip_unchanged = skip_unchanged
+        self.state_file = state_file
+        self.transferred = []
+        self.skipped = []
+        self.meta_updated = []
+        self.failed = {}
+        self.bytes = 0
+        self.results = {}
+        self._lock = threading.Lock()
+        self._remote = None
+        self._state = self._load_state()
+        self._pending = 0
+        self._flushed = time.time()
+
+    def _load_state(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            f = open(self.state_file)
+            try:
+                state = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return {}
+        if state.get('direction') != self.direction:
+            return {}
+        return state.get('done', {})
+
+    def _save_state(self):
+        """ Must be called with the lock held """
+        if not self.state_file:
+            return
+        tmp = '%s.%s.tmp' % (self.state_file, os.getpid())
+        f = open(tmp, 'w')
+        try:
+            json.dump(dict(direction=self.direction, done=self._state), f)
+        finally:
+            f.close()
+        os.rename(tmp, self.state_file)
+        self._pending = 0
+        self._flushed = time.time()
+
+    def _maybe_save_state(self):
+        """ Must be called with the lock held """
+        self._pending += 1
+        if (self._pending >= STATE_FLUSH_OBJECTS or
+                time.time() - self._flushed >= STATE_FLUSH_SECONDS):
+            self._save_state()
+
+    def clear_state(self):
+        if self.state_file and os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+    def remote_objects(self):
+        """ Lists the container once and returns a name -> etag dict """
+        if self._remote is None:
+            self._remote = dict((o.name, o.etag) for o in
+                                self.container.get_objects(full_listing=True))
+        return self._remote
+
+    def _unchanged(self, name, path, etag):
+        """ Decides whether a local file and a remote object are identical,
+        using the resume state before falling back to hashing the file
+        """
+        if not etag or not os.path.isfile(path):
+            return False
+        st = os.stat(path)
+        done = self._state.get(name)
+        if done and done == [etag, st.st_size, int(st.st_mtime)]:
+            return True
+        if not self.skip_unchanged:
+            return False
+        return _md5_file(path) == etag
+
+    def _record(self, name, path, etag, nbytes, result):
+        self._lock.acquire()
+        try:
+            self.transferred.append(name)
+            self.bytes += nbytes
+            if result is not None:
+                self.results[name] = result
+            if self.state_file:
+                st = os.stat(path)
+                self._state[name] = [etag, st.st_size, int(st.st_mtime)]
+                self._maybe_save_state()
+        finally:
+            self._lock.release()
+
+    def _upload(self, container, name, path, headers, meta, ttl):
+        etag = self.remote_objects().get(name)
+        if self._unchanged(name, path, etag):
+            updated = False
+            if meta:
+                obj = container.get_object(name)
+                current = obj.get_metadata()
+                for k, v in meta.items():
+                    if current.get('%s%s' % (META_PREFIX, k.lower())) != str(v):
+                        obj.set_metadata(meta)
+                        updated = True
+                        break
+            self._lock.acquire()
+            try:
+                self.skipped.append(name)
+                if updated:
+                    self.meta_updated.append(name)
+            finally:
+                self._lock.release()
+            return
+        obj = container.upload_file(path, obj_name=name, ttl=ttl,
+                                    headers=headers)
+        self._record(name, path, obj.etag, obj.total_bytes, obj)
+
+    def _download(self, container, name, path, dest, structure):
+        etag = self.remote_objects().get(name)
+        if self._unchanged(name, path, etag):
+            self._lock.acquire()
+            try:
+                self.skipped.append(name)
+            finally:
+                self._lock.release()
+            return
+        container.download_object(name, dest, structure=structure)
+        self._record(name, path, etag, os.path.getsize(path), None)
+
+    def _worker(self, jobs, func, args):
+        container = None
+        error = None
+        try:
+            container = self.connect()
+        except Exception, e:
+            error = str(e)
+        while True:
+            try:
+                name, path = jobs.get_nowait()
+            except Queue.Empty:
+                return
+            if container is not None:
+                try:
+                    func(container, name, path, *args)
+                    continue
+                except Exception, e:
+                    error = str(e)
+            self._lock.acquire()
+            try:
+                self.failed[name] = error
+            finally:
+                self._lock.release()
+
+    def _run(self, jobs, func, *args):
+        """ Runs func(container, name, path, *args) for every (name, path)
+        in jobs, with one container handle per worker
+        """
+        queue = Queue.Queue()
+        for job in jobs:
+            queue.put(job)
+
+        # List the container before starting the workers so that they all
+        # share the same snapshot
+        self.remote_objects()
+
+        workers = []
+        for i in range(min(self.threads, len(jobs)) or 1):
+            t = threading.Thread(target=self._worker,
+                                 args=(queue, func, args))
+            t.daemon = True
+            t.start()
+            workers.append(t)
+        for t in workers:
+            t.join()
+
+        if not self.failed:
+            self.clear_state()
+        elif self._pending:
+            self._save_state()
+
+    def upload(self, jobs, meta=None, ttl=None):
+        headers = dict()
+        if meta:
+            # Send the metadata with the object itself rather than POSTing it
+            # afterwards, which costs a request per object
+            for k, v in meta.items():
+                headers['%s%s' % (META_PREFIX, k)] = v
+        self._run(jobs, self._upload, headers, meta, ttl)
+
+    def download(self, jobs, dest, structure=True):
+        self._run(jobs, self._download, dest, structure)
+
+
+def _folder_objects(src):
+    """ Returns (object name, local path) for every file below src, named
+    relative to src
+    """
+    jobs = []
+    for root, dirs, files in os.walk(src):
+        for name in files:
+            path = os.path.join(root, name)
+            obj_name = os.path.relpath(path, src).replace(os.sep, '/')
+            jobs.append((obj_name, path))
+    return jobs
+
+
+def _container_factory(cf, container):
+    """ Returns a callable giving a new connection to container, for use by
+    worker threads
+    """
+    def _connect():
+        return pyrax.connect_to_cloudfiles(
+            region=cf.region_name).get_container(container)
+    return _connect
+
+
+def _transfer_engine(module, cf, c, direction):
+    threads = module.params.get('threads')
+    connect = None
+    if threads > 1:
+        connect = _container_factory(cf, c.name)
+    state_file = module.params.get('state_file')
+    if state_file:
+        state_file = os.path.abspath(os.path.expanduser(state_file))
+    return TransferEngine(c, direction, threads=threads,
+                          skip_unchanged=module.params.get('skip_unchanged'),
+                          state_file=state_file, connect=connect)
+
+
+def _fail_transfers(module, engine, c):
+    msg = "Error: %s of %s objects failed to transfer" % (
+        len(engine.failed),
+        len(engine.failed) + len(engine.transferred) + len(engine.skipped))
+    if engine.state_file:
+        msg += '; rerun to resume from %s' % engine.state_file
+    module.fail_json(msg=msg, container=c.name, failed=engine.failed,
+                     transferred=engine.transferred, skipped=engine.skipped)
+
+
 def upload(module, cf, container, src, dest, meta, expires):
     """ Uploads a single object or a folder to Cloud Files Optionally sets an
     metadata, TTL value (expires), or Content-Disposition and Content-Encoding
@@ -207,8 +524,6 @@ def upload(module, cf, container, src, dest, meta, expires):
     """
     c = _get_container(module, cf, container)
 
-    num_objs_before = len(c.get_object_names())
-
     if not src:
         module.fail_json(msg='src must be specified when uploading')
 
@@ -221,76 +536,29 @@ def upload(module, cf, container, src, dest, meta, expires):
         module.fail_json(msg='dest cannot be set when whole '
                              'directories are uploaded')
 
-    cont_obj = None
-    if dest and not is_dir:
-        try:
-            cont_obj = c.upload_file(src, obj_name=dest, ttl=expires)
-        except Exception, e:
-            module.fail_json(msg=e.message)
-    elif is_dir:
-        try:
-            id, total_bytes = cf.upload_folder(src, container=c.name, ttl=expires)
-        except Exception, e:
-            module.fail_json(msg=e.message)
-
-        while True:
-            bytes = cf.get_uploaded(id)
-            if bytes == total_bytes:
-                break
-            time.sleep(1)
+    if is_dir:
+        jobs = _folder_objects(src)
     else:
-        try:
-            cont_obj = c.upload_file(src, ttl=expires)
-        except Exception, e:
-            module.fail_json(msg=e.message)
-
-    num_objs_after = len(c.get_object_names())
+        jobs = [(dest or os.path.basename(src), src)]
 
-    if not meta:
-        meta = dict()
-
-    meta_result = dict()
-    if meta:
-        if cont_obj:
-            meta_result = cont_obj.set_metadata(meta)
-        else:
-            def _set_meta(objs, meta):
-                """ Sets metadata on a list of objects specified by name """
-                for obj in objs:
-                    try:
-                        result = c.get_object(obj).set_metadata(meta)
-                    except Exception, e:
-                        module.fail_json(msg=e.message)
-                    else:
-                        meta_result[obj] = result
-                return meta_result
-
-            def _walker(objs, path, filenames):
-                """ Callback func for os.path.walk  """
-                prefix = ''
-                if path != src:
-                    prefix = path.split(src)[-1].lstrip('/')
-                filenames = [os.path.join(prefix, name) for name in filenames
-                             if not os.path.isdir(os.path.join(path, name))]
-                objs += filenames
-
-            _objs = []
-            os.path.walk(src, _walker, _objs)
-            meta_result = _set_meta(_objs, meta)
+    engine = _transfer_engine(module, cf, c, 'put')
+    engine.upload(jobs, meta=meta, ttl=expires)
+    if engine.failed:
+        _fail_transfers(module, engine, c)
 
     EXIT_DICT['success'] = True
     EXIT_DICT['container'] = c.name
     EXIT_DICT['msg'] = "Uploaded %s to container: %s" % (src, c.name)
-    if cont_obj or locals().get('bytes'):
+    EXIT_DICT['transferred'] = engine.transferred
+    EXIT_DICT['skipped'] = engine.skipped
+    if engine.transferred or engine.meta_updated:
         EXIT_DICT['changed'] = True
-    if meta_result:
+    if meta and (engine.transferred or engine.meta_updated):
         EXIT_DICT['meta'] = dict(updated=True)
 
-    if cont_obj:
-        EXIT_DICT['bytes'] = cont_obj.total_bytes
-        EXIT_DICT['etag'] = cont_obj.etag
-    else:
-        EXIT_DICT['bytes'] = total_bytes
+    EXIT_DICT['bytes'] = engine.bytes
+    if not is_dir and engine.transferred:
+        EXIT_DICT['etag'] = engine.results[jobs[0][0]].etag
 
     module.exit_json(**EXIT_DICT)
 
@@ -308,42 +576,43 @@ def download(module, cf, container, src, dest, structure):
     # Attempt to fetch the container by name
     c = _get_container(module, cf, container)
 
+    dest = os.path.abspath(os.path.expanduser(dest))
+    is_dir = os.path.isdir(dest)
+
+    if not is_dir:
+        module.fail_json(msg='dest must be a directory')
+
+    engine = _transfer_engine(module, cf, c, 'get')
+
     # Accept a single object name or a comma-separated list of objs
     # If not specified, get the entire container
     if src:
         objs = src.split(',')
         objs = map(str.strip, objs)
     else:
-        objs = c.get_object_names()
-
-    dest = os.path.abspath(os.path.expanduser(dest))
-    is_dir = os.path.isdir(dest)
-
-    if not is_dir:
-        module.fail_json(msg='dest must be a directory')
+        objs = sorted(engine.remote_objects().keys())
 
-    results = []
+    jobs = []
     for obj in objs:
-        try:
-            c.download_object(obj, dest, structure=structure)
-        except Exception, e:
-            module.fail_json(msg=e.message)
+        if structure:
+            path = os.path.join(dest, *obj.split('/'))
         else:
-            results.append(obj)
+            path = os.path.join(dest, obj.split('/')[-1])
+        jobs.append((obj, path))
 
-    len_results = len(results)
-    len_objs = len(objs)
+    engine.download(jobs, dest, structure=structure)
+    if engine.failed:
+        _fail_transfers(module, engine, c)
 
     EXIT_DICT['container'] = c.name
-    EXIT_DICT['requested_downloaded'] = results
-    if results:
+    EXIT_DICT['requested_downloaded'] = engine.transferred
+    EXIT_DICT['skipped'] = engine.skipped
+    EXIT_DICT['bytes'] = engine.bytes
+    if engine.transferred:
         EXIT_DICT['changed'] = True
-    if len_results == len_objs:
-        EXIT_DICT['success'] = True
-        EXIT_DICT['msg'] = "%s objects downloaded to %s" % (len_results, dest)
-    else:
-        EXIT_DICT['msg'] = "Error: only %s of %s objects were " \
-                           "downloaded" % (len_results, len_objs)
+    EXIT_DICT['success'] = True
+    EXIT_DICT['msg'] = "%s objects downloaded to %s" % (
+        len(engine.transferred), dest)
     module.exit_json(**EXIT_DICT)
 
 
@@ -569,6 +838,9 @@ def main():
             clear_meta=dict(default=False, type='bool'),
             structure=dict(default=True, type='bool'),
             expires=dict(type='int'),
+            threads=dict(default=1, type='int'),
+            skip_unchanged=dict(default=True, type='bool'),
+            state_file=dict(),
         )
     )
 
@@ -600,4 +872,5 @@ def main():
 from ansible.module_utils.basic import *
 from ansible.module_utils.rax import *
 
-main()
+if __name__ == '__main__':
+    main()
@@ -24,8 +24,17 @@ import datetime
 import glob
 import traceback
 import re
+from collections import deque
 import shlex
 import os
+import errno
+import select
+import subprocess
+import tempfile
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
 
 DOCUMENTATION = '''
 ---
@@ -75,6 +84,51 @@ options:
       - if command warnings are on in ansible.cfg, do not warn about this particular line if set to no/false.
     required: false
     default: True
+  cache_key:
+    version_added: "2.1"
+    description:
+      - Name of the result cache entry of this command. When set, the command line, the C(executable),
+        the C(chdir), the variables of C(cache_env) and the C(inputs) are fingerprinted, and a successful
+        result is recorded on the host under C(~/.ansible/cache/command). While the fingerprint does not
+        change, the command is not run again and the recorded rc, stdout and stderr are returned
+        with C(changed=False) and C(cached=True).
+      - Only supported under C(args:), not in the free-form command line.
+    required: false
+    default: null
+  inputs:
+    version_added: "2.1"
+    description:
+      - Files, directories (walked recursively) or glob patterns the result of the command depends on,
+        fingerprinted from their path, size, mtime, inode and mode without reading them. Only used with C(cache_key).
+      - Only supported under C(args:), not in the free-form command line.
+    required: false
+    default: null
+  cache_env:
+    version_added: "2.1"
+    description:
+      - Names of the environment variables the result of the command depends on. Only used with C(cache_key).
+      - Only supported under C(args:), not in the free-form command line.
+    required: false
+    default: null
+  max_output_bytes:
+    version_added: "2.1"
+    description:
+      - When set, stdout and stderr are read as they are produced and written to spool files on the host,
+        and only their first and last bytes, up to I(max_output_bytes) per stream, are returned.
+        The result then also has the C(stdout_bytes) and C(stderr_bytes) counts and, for a truncated
+        stream, the path of its complete output in C(stdout_spool) or C(stderr_spool).
+      - The spool files of truncated streams are left on the host for the caller to remove once read, the
+        others are removed when the command ends. Results with truncated output are not recorded by C(cache_key).
+      - Only supported under C(args:), not in the free-form command line.
+    required: false
+    default: null
+  spool_dir:
+    version_added: "2.1"
+    description:
+      - Directory of the spool files of C(max_output_bytes), the temporary directory by default.
+      - Only supported under C(args:), not in the free-form command line.
+    required: false
+    default: null
 notes:
     -  If you want to run a command through the shell (say you are using C(<),
        C(>), C(|), etc), you actually want the M(shell) module instead. The
@@ -100,6 +154,22 @@ EXAMPLES = '''
   args:
     chdir: somedir/
     creates: /path/to/database
+
+# Only run the migrations again when the migrations or the settings changed
+- command: ./manage.py migrate --noinput
+  args:
+    chdir: /srv/app
+    cache_key: app-migrate
+    inputs:
+      - /srv/app/*/migrations
+      - /srv/app/settings.py
+    cache_env: [ DJANGO_SETTINGS_MODULE ]
+
+# Keep only the first and last 64KiB of a verbose build log in the result
+- command: make V=1
+  args:
+    chdir: /usr/src/project
+    max_output_bytes: 65536
 '''
 
 # Dict of options and their defaults
@@ -155,6 +225,229 @@ def check_command(commandline):
     return warnings
 
 
+# directory of the recorded results of the commands run with cache_key
+RESULT_CACHE_DIR = os.path.join('~', '.ansible', 'cache', 'command')
+
+
+def fingerprint_inputs(digest, inputs):
+    ''' adds the stat based fingerprint of the inputs to digest; directories
+    are walked, the files are not read '''
+    for pattern in inputs:
+        pattern = os.path.expanduser(pattern)
+        paths = glob.glob(pattern)
+        if not paths:
+            digest.update('missing:%s\0' % pattern)
+            continue
+        paths.sort()
+        for path in paths:
+            entries = [path]
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    files.sort()
+                    for name in dirs + files:
+                        entries.append(os.path.join(root, name))
+            for entry in entries:
+                try:
+                    st = os.lstat(entry)
+                except OSError:
+                    digest.update('missing:%s\0' % entry)
+                    continue
+                digest.update('%s:%d:%r:%d:%o\0' % (entry, st.st_size, st.st_mtime, st.st_ino, st.st_mode))
+
+
+def get_fingerprint(args, shell, executable, chdir, cache_env, inputs):
+    digest = sha1()
+    digest.update('%r\0%r\0%r\0%r\0' % (args, shell, executable, chdir))
+    names = list(cache_env or [])
+    names.sort()
+    for name in names:
+        digest.update('%s=%r\0' % (name, os.environ.get(name)))
+    fingerprint_inputs(digest, inputs or [])
+    return digest.hexdigest()
+
+
+def _result_cache_path(cache_key):
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', cache_key)
+    # keys only differing in the replaced characters must not collide
+    name += '-' + sha1(cache_key).hexdigest()[:8]
+    return os.path.join(os.path.expanduser(RESULT_CACHE_DIR), name + '.json')
+
+
+def load_result(cache_key, fingerprint):
+    ''' returns the recorded result of cache_key if it has the same fingerprint '''
+    try:
+        f = open(_result_cache_path(cache_key))
+        try:
+            record = json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return None
+    if not isinstance(record, dict) or record.get('fingerprint') != fingerprint:
+        return None
+    return record
+
+
+def save_result(cache_key, record):
+    path = _result_cache_path(cache_key)
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), 0700)
+        fd, tmp_path = tempfile.mkstemp('.json', '.result', os.path.dirname(path))
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump(record, f)
+        finally:
+            f.close()
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        # the cache is only an optimisation
+        pass
+
+
+def _utf8_head(data):
+    ''' drops a UTF-8 sequence cut off at the end of data '''
+    for i in range(len(data) - 1, max(len(data) - 4, -1), -1):
+        byte = ord(data[i])
+        if byte & 0xC0 == 0x80:
+            continue
+        if byte >= 0xF0:
+            needed = 4
+        elif byte >= 0xE0:
+            needed = 3
+        elif byte >= 0xC0:
+            needed = 2
+        else:
+            needed = 1
+        if len(data) - i < needed:
+            return data[:i]
+        break
+    return data
+
+
+def _utf8_tail(data):
+    ''' drops the continuation bytes of a UTF-8 sequence cut off at the start of data '''
+    i = 0
+    while i < 3 and i < len(data) and ord(data[i]) & 0xC0 == 0x80:
+        i += 1
+    return data[i:]
+
+
+class OutputCapture(object):
+    ''' keeps the first and last bytes of a stream, up to limit bytes in
+    all, and tees the whole stream to a spool file. The spool file of a
+    truncated stream is left for the caller to remove. '''
+
+    def __init__(self, name, limit, spool_dir):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        # chunks, joined only once in output()
+        self.head = []
+        self.head_size = 0
+        self.tail = deque()
+        self.tail_size = 0
+        self.size = 0
+        fd, self.spool_path = tempfile.mkstemp('.%s' % name, 'ansible-command-', spool_dir)
+        self.spool = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self.size += len(data)
+        self.spool.write(data)
+        if self.head_size < self.head_limit:
+            taken = data[:self.head_limit - self.head_size]
+            self.head.append(taken)
+            self.head_size += len(taken)
+            data = data[len(taken):]
+        if data:
+            self.tail.append(data)
+            self.tail_size += len(data)
+            # drop the chunks that fell entirely out of the tail window
+            while self.tail_size - len(self.tail[0]) >= self.tail_limit:
+                self.tail_size -= len(self.tail.popleft())
+
+    def truncated(self):
+        return self.size > self.head_limit + self.tail_limit
+
+    def close(self):
+        ''' closes the spool file, removed unless the output was truncated '''
+        self.spool.close()
+        if not self.truncated():
+            os.remove(self.spool_path)
+            self.spool_path = None
+
+    def output(self):
+        head = ''.join(self.head)
+        tail = ''.join(self.tail)
+        if not self.truncated():
+            return head + tail
+        # cut on character boundaries, so that the result stays valid UTF-8
+        head = _utf8_head(head)
+        tail = _utf8_tail(tail[-self.tail_limit:])
+        return '%s\n[... %d bytes omitted, the complete output is in %s ...]\n%s' % (
+            head, self.size - len(head) - len(tail), self.spool_path, tail)
+
+
+def run_streaming(module, args, shell, executable, limit, spool_dir):
+    ''' runs args like module.run_command, but reads stdout and stderr as they
+    are produced into OutputCapture objects; returns (rc, stdout, stderr) '''
+    if shell:
+        if executable:
+            args = [executable, '-c', args]
+            shell = False
+    else:
+        args = [os.path.expandvars(os.path.expanduser(arg)) for arg in args]
+
+    env = os.environ.copy()
+    env.update(getattr(module, 'run_command_environ_update', {}))
+
+    captures = {}
+    try:
+        stdout = OutputCapture('stdout', limit, spool_dir)
+        try:
+            stderr = OutputCapture('stderr', limit, spool_dir)
+        except (IOError, OSError):
+            stdout.close()
+            raise
+    except (IOError, OSError), e:
+        module.fail_json(rc=257, msg="cannot create the spool files: %s" % str(e))
+    devnull = open(os.devnull)
+    try:
+        try:
+            cmd = subprocess.Popen(args, shell=shell, close_fds=True, env=env, stdin=devnull,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except (OSError, IOError), e:
+            stdout.close()
+            stderr.close()
+            module.fail_json(rc=e.errno, msg=str(e), cmd=args)
+    finally:
+        devnull.close()
+
+    captures[cmd.stdout.fileno()] = stdout
+    captures[cmd.stderr.fileno()] = stderr
+    try:
+        while captures:
+            try:
+                readable = select.select(captures.keys(), [], [])[0]
+            except select.error, e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd in readable:
+                data = os.read(fd, 65536)
+                if data:
+                    captures[fd].write(data)
+                else:
+                    del captures[fd]
+        rc = cmd.wait()
+    finally:
+        cmd.stdout.close()
+        cmd.stderr.close()
+        stdout.close()
+        stderr.close()
+    return rc, stdout, stderr
+
+
 def main():
 
     # the command module is the one ansible module that does not take key=value args
@@ -168,6 +461,11 @@ def main():
           creates = dict(),
           removes = dict(),
           warn = dict(type='bool', default=True),
+          cache_key = dict(),
+          inputs = dict(type='list'),
+          cache_env = dict(type='list'),
+          max_output_bytes = dict(type='int'),
+          spool_dir = dict(),
         )
     )
 
@@ -178,10 +476,19 @@ def main():
     creates  = module.params['creates']
     removes  = module.params['removes']
     warn = module.params['warn']
+    cache_key = module.params['cache_key']
+    max_output_bytes = module.params['max_output_bytes']
+    spool_dir = module.params['spool_dir']
 
     if args.strip() == '':
         module.fail_json(rc=256, msg="no command given")
 
+    if max_output_bytes is not None and max_output_bytes < 2:
+        module.fail_json(rc=256, msg="max_output_bytes must be at least 2")
+
+    if spool_dir:
+        spool_dir = os.path.abspath(os.path.expanduser(spool_dir))
+
     if chdir:
         chdir = os.path.abspath(os.path.expanduser(chdir))
         os.chdir(chdir)
@@ -218,11 +525,34 @@ def main():
     if warn:
         warnings = check_command(args)
 
+    if cache_key:
+        fingerprint = get_fingerprint(args, shell, executable, chdir, module.params['cache_env'], module.params['inputs'])
+        record = load_result(cache_key, fingerprint)
+        if record is not None:
+            module.exit_json(
+                cmd      = record['cmd'],
+                stdout   = record['stdout'],
+                stderr   = record['stderr'],
+                rc       = record['rc'],
+                start    = record['start'],
+                end      = record['end'],
+                delta    = record['delta'],
+                changed  = False,
+                cached   = True,
+                warnings = warnings
+            )
+
     if not shell:
         args = shlex.split(args)
     startd = datetime.datetime.now()
 
-    rc, out, err = module.run_command(args, executable=executable, use_unsafe_shell=shell)
+    streams = {}
+    if max_output_bytes is None:
+        rc, out, err = module.run_command(args, executable=executable, use_unsafe_shell=shell)
+    else:
+        rc, streams['stdout'], streams['stderr'] = run_streaming(module, args, shell, executable, max_output_bytes, spool_dir)
+        out = streams['stdout'].output()
+        err = streams['stderr'].output()
 
     endd = datetime.datetime.now()
     delta = endd - startd
@@ -232,7 +562,7 @@ def main():
     if err is None:
         err = ''
 
-    module.exit_json(
+    result = dict(
         cmd      = args,
         stdout   = out.rstrip("\r\n"),
         stderr   = err.rstrip("\r\n"),
@@ -240,12 +570,31 @@ def main():
         start    = str(startd),
         end      = str(endd),
         delta    = str(delta),
-        changed  = True,
-        warnings = warnings
     )
 
+    for name, capture in streams.items():
+        result['%s_bytes' % name] = capture.size
+        result['%s_spool' % name] = capture.spool_path
+
+    if cache_key:
+        # only successful and complete results are recorded, failures are
+        # retried and truncated output refers to spool files which the
+        # caller may remove
+        complete = True
+        for capture in streams.values():
+            if capture.truncated():
+                complete = False
+        if rc == 0 and complete:
+            record = dict(result)
+            record['fingerprint'] = fingerprint
+            save_result(cache_key, record)
+        result['cached'] = False
+
+    module.exit_json(changed=True, warnings=warnings, **result)
+
 # import module snippets
 from ansible.module_utils.basic import *
 from ansible.module_utils.splitter import *
 
-main()
+if __name__ == '__main__':
+    main()
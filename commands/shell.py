@@ -62,6 +62,45 @@ options:
     required: false
     default: True
     version_added: "1.8"
+  cache_key:
+    description:
+      - Name of the result cache entry of this command, see the M(command) module. While the command line,
+        C(executable), C(chdir), C(cache_env) and C(inputs) do not change, the recorded result of the last
+        successful run is returned instead of running the command again.
+      - Only supported under C(args:), not in the free-form command line.
+    required: false
+    default: null
+    version_added: "2.1"
+  inputs:
+    description:
+      - Files, directories or glob patterns the result of the command depends on. Only used with C(cache_key).
+      - Only supported under C(args:), not in the free-form command line.
+    required: false
+    default: null
+    version_added: "2.1"
+  cache_env:
+    description:
+      - Names of the environment variables the result of the command depends on. Only used with C(cache_key).
+      - Only supported under C(args:), not in the free-form command line.
+    required: false
+    default: null
+    version_added: "2.1"
+  max_output_bytes:
+    description:
+      - When set, stdout and stderr are streamed to spool files on the host and only their first and last
+        bytes, up to I(max_output_bytes) per stream, are returned, see the M(command) module.
+      - The spool files of truncated streams are left on the host for the caller to remove once read.
+      - Only supported under C(args:), not in the free-form command line.
+    required: false
+    default: null
+    version_added: "2.1"
+  spool_dir:
+    description:
+      - Directory of the spool files of C(max_output_bytes), the temporary directory by default.
+      - Only supported under C(args:), not in the free-form command line.
+    required: false
+    default: null
+    version_added: "2.1"
 notes:
    -  If you want to execute a command securely and predictably, it may be
       better to use the M(command) module instead. Best practices when writing
@@ -54,8 +54,30 @@ options:
   target:
     description:
       - Location, on the remote host, of the dump file to read from or write to. Uncompressed SQL
-        files (C(.sql)) as well as bzip2 (C(.bz2)), gzip (C(.gz)) and xz (Added in 2.0) compressed files are supported.
+        files (C(.sql)) as well as bzip2 (C(.bz2)), gzip (C(.gz)), xz (Added in 2.0) and zstd (C(.zst), added in 2.1)
+        compressed files are supported.
+      - The multi-threaded C(pigz), C(pbzip2), C(xz -T0) and C(zstd -T0) are used when available.
+      - With I(jobs) greater than 1 this is a directory holding one file for the schema and one for the data of each table.
     required: false
+  compression:
+    description:
+      - Compression of the dump, instead of guessing it from the extension of I(target).
+      - Required to compress the files of a dump with I(jobs) greater than 1.
+    required: false
+    default: null
+    choices: [ "none", "gzip", "bzip2", "xz", "zstd" ]
+    version_added: "2.1"
+  jobs:
+    description:
+      - Number of tables to dump or import in parallel, each with its own C(mysqldump) or C(mysql) process.
+      - The schema of the database is dumped to C(<name>-schema.sql) and the data of each table to
+        C(<name>.<table>.sql) inside I(target). Importing such a directory loads the schema first.
+      - Each table is dumped in its own session, so the dump is not a consistent snapshot across tables
+        while they are being written to.
+      - Not supported with name=all.
+    required: false
+    default: 1
+    version_added: "2.1"
 author: "Ansible Core Team"
 extends_documentation_fragment: mysql
 '''
@@ -73,12 +95,20 @@ EXAMPLES = '''
 
 # Imports file.sql similiar to mysql -u <username> -p <password> < hostname.sql
 - mysql_db: state=import name=all target=/tmp/{{ inventory_hostname }}.sql
+
+# Dumps 'my_db' to a directory, 8 tables at a time, each compressed with zstd
+- mysql_db: state=dump name=my_db target=/srv/dumps/my_db jobs=8 compression=zstd
+
+# Imports the directory written above, 8 tables at a time
+- mysql_db: state=import name=my_db target=/srv/dumps/my_db jobs=8
 '''
 
 import os
-import pipes
+import Queue
 import stat
 import subprocess
+import tempfile
+import threading
 
 try:
     import MySQLdb
@@ -100,98 +130,244 @@ def db_delete(cursor, db):
     cursor.execute(query)
     return True
 
-def db_dump(module, host, user, password, db_name, target, all_databases, port, config_file, socket=None, ssl_cert=None, ssl_key=None, ssl_ca=None):
-    cmd = module.get_bin_path('mysqldump', True)
-    # If defined, mysqldump demands --defaults-extra-file be the first option
+# Compression programs by dump file extension, multi-threaded ones first.
+COMPRESSORS = {
+    '.gz': [['pigz'], ['gzip']],
+    '.bz2': [['pbzip2'], ['bzip2']],
+    '.xz': [['xz', '-T0'], ['xz']],
+    '.zst': [['zstd', '-T0', '-q'], ['zstd', '-q']],
+}
+COMPRESSION_SUFFIXES = dict(none='', gzip='.gz', bzip2='.bz2', xz='.xz', zstd='.zst')
+
+# Only this much of the output of mysql/mysqldump is kept for the result
+MAX_OUTPUT = 65536
+
+def get_compressor(module, suffix, decompress=False):
+    """ Returns the command to (de)compress a stream for a dump file suffix,
+    or None for uncompressed dumps
+    """
+    if suffix not in COMPRESSORS:
+        return None
+    for cmd in COMPRESSORS[suffix]:
+        path = module.get_bin_path(cmd[0])
+        if path and decompress:
+            return [path, '-dc']
+        elif path:
+            return [path, '-c'] + cmd[1:]
+    module.fail_json(msg="unable to find any of %s to handle %s files" % (
+        ', '.join([c[0] for c in COMPRESSORS[suffix]]), suffix))
+
+def run_pipeline(cmds, stdin=None, stdout=None):
+    """ Runs the commands connected by pipes, like a shell pipeline but
+    without a shell. The dump data flows directly between the processes and
+    files, so memory use does not depend on its size.
+
+    The stderr of every command, and the stdout of the last one unless a file
+    is given, are spooled to temporary files; only the last MAX_OUTPUT bytes
+    of each are returned. The return code is the first non-zero one, as with
+    pipefail.
+    """
+    spools = []
+    procs = []
+    prev = stdin
+    out_spool = None
+    if stdout is None:
+        out_spool = tempfile.TemporaryFile()
+        spools.append(out_spool)
+    try:
+        for i, cmd in enumerate(cmds):
+            out = subprocess.PIPE
+            if i == len(cmds) - 1:
+                out = stdout or out_spool
+            err = tempfile.TemporaryFile()
+            spools.append(err)
+            p = subprocess.Popen(cmd, stdin=prev, stdout=out, stderr=err, close_fds=True)
+            # The next command must be the only reader, so that a writer gets
+            # SIGPIPE when its reader dies
+            if procs:
+                procs[-1].stdout.close()
+            procs.append(p)
+            prev = p.stdout
+
+        rc = 0
+        for p in procs:
+            p.wait()
+            if p.returncode != 0 and rc == 0:
+                rc = p.returncode
+
+        def tail(f):
+            f.seek(0, 2)
+            f.seek(max(0, f.tell() - MAX_OUTPUT))
+            return f.read()
+
+        output = ''
+        if out_spool is not None:
+            output = tail(out_spool)
+        errors = ''.join([tail(f) for f in spools if f is not out_spool])
+    finally:
+        for f in spools:
+            f.close()
+    return rc, output, errors
+
+def run_parallel(func, items, jobs):
+    """ Calls func(item) for every item from at most jobs threads and returns
+    the (rc, stdout, stderr, bytes) results in the order of items
+    """
+    results = [None] * len(items)
+    queue = Queue.Queue()
+    for i, item in enumerate(items):
+        queue.put((i, item))
+
+    def worker():
+        while True:
+            try:
+                i, item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[i] = func(item)
+            except Exception, e:
+                results[i] = (1, '', '%s\n' % e, 0)
+
+    threads = []
+    for i in range(min(jobs, len(items))):
+        t = threading.Thread(target=worker)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    return results
+
+def get_connection_args(host, user, password, port, config_file, socket=None, ssl_cert=None, ssl_key=None, ssl_ca=None):
+    """ Command line options shared by mysqldump and mysql. These are passed
+    as argv, so they must not be shell quoted.
+    """
+    args = []
+    # If defined, --defaults-extra-file must be the first option
     if config_file:
-        cmd += " --defaults-extra-file=%s" % pipes.quote(config_file)
-    cmd += " --quick"
+        args.append("--defaults-extra-file=%s" % config_file)
     if user is not None:
-        cmd += " --user=%s" % pipes.quote(user)
+        args.append("--user=%s" % user)
     if password is not None:
-        cmd += " --password=%s" % pipes.quote(password)
+        args.append("--password=%s" % password)
     if ssl_cert is not None:
-        cmd += " --ssl-cert=%s" % pipes.quote(ssl_cert)
+        args.append("--ssl-cert=%s" % ssl_cert)
     if ssl_key is not None:
-        cmd += " --ssl-key=%s" % pipes.quote(ssl_key)
-    if ssl_cert is not None:
-        cmd += " --ssl-ca=%s" % pipes.quote(ssl_ca)
+        args.append("--ssl-key=%s" % ssl_key)
+    if ssl_ca is not None:
+        args.append("--ssl-ca=%s" % ssl_ca)
     if socket is not None:
-        cmd += " --socket=%s" % pipes.quote(socket)
+        args.append("--socket=%s" % socket)
     else:
-        cmd += " --host=%s --port=%i" % (pipes.quote(host), port)
+        args.append("--host=%s" % host)
+        args.append("--port=%i" % port)
+    return args
+
+def get_tables(cursor, db):
+    cursor.execute("SELECT table_name FROM information_schema.tables "
+                   "WHERE table_schema = %s AND table_type = 'BASE TABLE'", (db,))
+    return [row[0] for row in cursor.fetchall()]
+
+def dump_to_file(module, cmd, target, suffix):
+    compressor = get_compressor(module, suffix)
+    out = open(target, 'wb')
+    try:
+        if compressor:
+            rc, stdout, stderr = run_pipeline([cmd, compressor], stdout=out)
+        else:
+            rc, stdout, stderr = run_pipeline([cmd], stdout=out)
+    finally:
+        out.close()
+    return rc, stdout, stderr, os.path.getsize(target)
+
+def load_from_file(module, cmd, source, suffix):
+    decompressor = get_compressor(module, suffix, decompress=True)
+    f = open(source, 'rb')
+    try:
+        if decompressor:
+            rc, stdout, stderr = run_pipeline([decompressor, cmd], stdin=f)
+        else:
+            rc, stdout, stderr = run_pipeline([cmd], stdin=f)
+    finally:
+        f.close()
+    return rc, stdout, stderr, os.path.getsize(source)
+
+def combine_results(results):
+    """ Folds (rc, stdout, stderr, bytes) tuples into one """
+    rc = 0
+    for r in results:
+        if r[0] != 0:
+            rc = r[0]
+            break
+    return (rc, ''.join([r[1] for r in results]),
+            ''.join([r[2] for r in results]), sum([r[3] for r in results]))
+
+def db_dump(module, cursor, conn_args, db_name, target, all_databases, compression=None, jobs=1):
+    cmd = [module.get_bin_path('mysqldump', True)] + conn_args + ['--quick']
+
+    if jobs <= 1:
+        suffix = COMPRESSION_SUFFIXES.get(compression, os.path.splitext(target)[-1])
+        if all_databases:
+            cmd.append("--all-databases")
+        else:
+            cmd.append(db_name)
+        return dump_to_file(module, cmd, target, suffix)
+
+    # mydumper style: the schema in one file, then the data of every table
+    # in its own file, dumped jobs tables at a time
     if all_databases:
-        cmd += " --all-databases"
-    else:
-        cmd += " %s" % pipes.quote(db_name)
-
-    path = None
-    if os.path.splitext(target)[-1] == '.gz':
-        path = module.get_bin_path('gzip', True)
-    elif os.path.splitext(target)[-1] == '.bz2':
-        path = module.get_bin_path('bzip2', True)
-    elif os.path.splitext(target)[-1] == '.xz':
-        path = module.get_bin_path('xz', True)
-
-    if path:
-        cmd = '%s | %s > %s' % (cmd, path, pipes.quote(target))
-    else:
-        cmd += " > %s" % pipes.quote(target)
+        module.fail_json(msg="jobs cannot be used with name=all")
+    if not os.path.isdir(target):
+        os.makedirs(target)
+    suffix = COMPRESSION_SUFFIXES.get(compression, '')
 
-    rc, stdout, stderr = module.run_command(cmd, use_unsafe_shell=True)
-    return rc, stdout, stderr
+    schema = os.path.join(target, '%s-schema.sql%s' % (db_name, suffix))
+    result = dump_to_file(module, cmd + ['--no-data', '--routines', '--triggers', db_name], schema, suffix)
+    if result[0] != 0:
+        return result
 
-def db_import(module, host, user, password, db_name, target, all_databases, port, config_file, socket=None, ssl_cert=None, ssl_key=None, ssl_ca=None):
+    def dump_table(table):
+        path = os.path.join(target, '%s.%s.sql%s' % (db_name, table, suffix))
+        return dump_to_file(module, cmd + ['--no-create-info', '--skip-triggers', db_name, table], path, suffix)
+
+    return combine_results([result] + run_parallel(dump_table, get_tables(cursor, db_name), jobs))
+
+def db_import(module, conn_args, db_name, target, all_databases, compression=None, jobs=1):
     if not os.path.exists(target):
         return module.fail_json(msg="target %s does not exist on the host" % target)
 
-    cmd = [module.get_bin_path('mysql', True)]
-    # --defaults-file must go first, or errors out
-    if config_file:
-        cmd.append("--defaults-extra-file=%s" % pipes.quote(config_file))
-    if user:
-        cmd.append("--user=%s" % pipes.quote(user))
-    if password:
-        cmd.append("--password=%s" % pipes.quote(password))
-    if socket is not None:
-        cmd.append("--socket=%s" % pipes.quote(socket))
-    if ssl_cert is not None:
-        cmd.append("--ssl-cert=%s" % pipes.quote(ssl_cert))
-    if ssl_key is not None:
-        cmd.append("--ssl-key=%s" % pipes.quote(ssl_key))
-    if ssl_cert is not None:
-        cmd.append("--ssl-ca=%s" % pipes.quote(ssl_ca))
-    else:
-        cmd.append("--host=%s" % pipes.quote(host))
-        cmd.append("--port=%i" % port)
+    cmd = [module.get_bin_path('mysql', True)] + conn_args
     if not all_databases:
         cmd.append("-D")
-        cmd.append(pipes.quote(db_name))
-
-    comp_prog_path = None
-    if os.path.splitext(target)[-1] == '.gz':
-        comp_prog_path = module.get_bin_path('gzip', required=True)
-    elif os.path.splitext(target)[-1] == '.bz2':
-        comp_prog_path = module.get_bin_path('bzip2', required=True)
-    elif os.path.splitext(target)[-1] == '.xz':
-        comp_prog_path = module.get_bin_path('xz', required=True)
-
-    if comp_prog_path:
-        p1 = subprocess.Popen([comp_prog_path, '-dc', target], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        p2 = subprocess.Popen(cmd, stdin=p1.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        (stdout2, stderr2) = p2.communicate()
-        p1.stdout.close()
-        p1.wait()
-        if p1.returncode != 0:
-            stderr1 = p1.stderr.read()
-            return p1.returncode, '', stderr1
-        else:
-            return p2.returncode, stdout2, stderr2
-    else:
-        cmd = ' '.join(cmd)
-        cmd += " < %s" % pipes.quote(target)
-        rc, stdout, stderr = module.run_command(cmd, use_unsafe_shell=True)
-        return rc, stdout, stderr
+        cmd.append(db_name)
+
+    if not os.path.isdir(target):
+        suffix = COMPRESSION_SUFFIXES.get(compression, os.path.splitext(target)[-1])
+        return load_from_file(module, cmd, target, suffix)
+
+    # A directory written by a parallel dump: the schema has to be loaded
+    # before the data files, which are independent of each other
+    if all_databases:
+        module.fail_json(msg="directory dumps cannot be imported with name=all")
+    schema = None
+    data = []
+    for name in sorted(os.listdir(target)):
+        suffix = os.path.splitext(name)[-1]
+        if name.startswith('%s-schema.sql' % db_name):
+            schema = (os.path.join(target, name), suffix)
+        elif '.sql' in name:
+            data.append((os.path.join(target, name), suffix))
+    if schema is None:
+        module.fail_json(msg="no %s-schema.sql file found in %s" % (db_name, target))
+
+    result = load_from_file(module, cmd, schema[0], schema[1])
+    if result[0] != 0:
+        return result
+
+    def load(item):
+        return load_from_file(module, cmd, item[0], item[1])
+
+    return combine_results([result] + run_parallel(load, data, max(jobs, 1)))
 
 def db_create(cursor, db, encoding, collation):
     query_params = dict(enc=encoding, collate=collation)
@@ -225,6 +401,8 @@ def main():
             ssl_key=dict(default=None),
             ssl_ca=dict(default=None),
             config_file=dict(default="~/.my.cnf"),
+            compression=dict(default=None, choices=["none", "gzip", "bzip2", "xz", "zstd"]),
+            jobs=dict(default=1, type='int'),
         )
     )
 
@@ -248,6 +426,8 @@ def main():
     login_password = module.params["login_password"]
     login_user = module.params["login_user"]
     login_host = module.params["login_host"]
+    compression = module.params["compression"]
+    jobs = module.params["jobs"]
 
     # make sure the target path is expanded for ~ and $HOME
     if target is not None:
@@ -282,21 +462,23 @@ def main():
             except Exception, e:
                 module.fail_json(msg="error deleting database: " + str(e))
         elif state == "dump":
-            rc, stdout, stderr = db_dump(module, login_host, login_user,
-                                        login_password, db, target, all_databases,
-                                        login_port, config_file, socket, ssl_cert, ssl_key, ssl_ca)
+            conn_args = get_connection_args(login_host, login_user, login_password,
+                                            login_port, config_file, socket, ssl_cert, ssl_key, ssl_ca)
+            rc, stdout, stderr, size = db_dump(module, cursor, conn_args, db, target,
+                                               all_databases, compression, jobs)
             if rc != 0:
                 module.fail_json(msg="%s" % stderr)
             else:
-                module.exit_json(changed=True, db=db, msg=stdout)
+                module.exit_json(changed=True, db=db, msg=stdout, bytes=size)
         elif state == "import":
-            rc, stdout, stderr = db_import(module, login_host, login_user,
-                                        login_password, db, target, all_databases,
-                                        login_port, config_file, socket, ssl_cert, ssl_key, ssl_ca)
+            conn_args = get_connection_args(login_host, login_user, login_password,
+                                            login_port, config_file, socket, ssl_cert, ssl_key, ssl_ca)
+            rc, stdout, stderr, size = db_import(module, conn_args, db, target,
+                                                 all_databases, compression, jobs)
             if rc != 0:
                 module.fail_json(msg="%s" % stderr)
             else:
-                module.exit_json(changed=True, db=db, msg=stdout)
+                module.exit_json(changed=True, db=db, msg=stdout, bytes=size)
     else:
         if state == "present":
             try:
@@ -22,6 +22,7 @@ module: postgresql_db
 short_description: Add or remove PostgreSQL databases from a remote host.
 description:
    - Add or remove PostgreSQL databases from a remote host.
+   - Dump databases with C(pg_dump) and restore them with C(pg_restore) or C(psql).
 version_added: "0.6"
 options:
   name:
@@ -87,9 +88,61 @@ options:
   state:
     description:
       - The database state
+      - C(dump) and C(restore) were added in 2.1.
     required: false
     default: present
-    choices: [ "present", "absent" ]
+    choices: [ "present", "absent", "dump", "restore" ]
+  target:
+    description:
+      - Location, on the remote host, of the dump to write to or read from with I(state=dump) or I(state=restore).
+      - The format is chosen from the name. C(.sql) is a plain SQL script and C(.sql.gz), C(.sql.bz2) and C(.sql.xz)
+        are plain SQL scripts streamed through C(pigz)/C(gzip), C(pbzip2)/C(bzip2) or C(xz -T0).
+        C(.tar) is the tar format and C(.tar.gz), C(.tar.bz2) and C(.tar.xz) are tar archives streamed through
+        the same compressors. C(.pgc), C(.dump) and C(.backup) are the custom format and a name without
+        an extension (or an existing directory) is the directory format.
+      - Dumps are written next to I(target) and only moved into place once complete.
+    required: false
+    default: null
+    version_added: "2.1"
+  jobs:
+    description:
+      - Number of tables to dump or restore in parallel (C(pg_dump -j) / C(pg_restore -j)).
+      - Parallel dumps require the directory format, parallel restores the directory or custom format.
+    required: false
+    default: 1
+    version_added: "2.1"
+  compress:
+    description:
+      - Compression level (0-9) for the custom and directory formats, or for the compressor of a plain SQL dump.
+    required: false
+    default: null
+    version_added: "2.1"
+  single_transaction:
+    description:
+      - Restore in a single transaction, so a failed restore leaves the database untouched.
+      - Ignored when I(jobs) is greater than 1, as parallel restores cannot share one transaction.
+    required: false
+    default: "yes"
+    choices: [ "yes", "no" ]
+    version_added: "2.1"
+  sections:
+    description:
+      - Only dump or restore the named sections, any of C(pre-data), C(data) and C(post-data).
+    required: false
+    default: null
+    version_added: "2.1"
+  tables:
+    description:
+      - Only dump or restore the named tables.
+    required: false
+    default: null
+    version_added: "2.1"
+  exclude_tables:
+    description:
+      - Tables to leave out of a dump. Only supported with I(state=dump).
+    required: false
+    default: null
+    version_added: "2.1"
 notes:
    - The default authentication assumes that you are either logging in as or sudo'ing to the C(postgres) account on the host.
    - This module uses I(psycopg2), a Python PostgreSQL database adapter. You must ensure that psycopg2 is installed on
@@ -110,8 +163,22 @@ EXAMPLES = '''
                  lc_collate='de_DE.UTF-8'
                  lc_ctype='de_DE.UTF-8'
                  template='template0'
+
+# Dump "acme" with 8 parallel jobs to a directory format dump
+- postgresql_db: name=acme state=dump target=/srv/backups/acme jobs=8
+
+# Dump the schema only as a compressed SQL script
+- postgresql_db: name=acme state=dump target=/tmp/acme-schema.sql.gz sections=pre-data,post-data
+
+# Restore a directory format dump into "acme_staging" with 8 parallel jobs
+- postgresql_db: name=acme_staging state=restore target=/srv/backups/acme jobs=8
 '''
 
+import os
+import shutil
+import subprocess
+import tempfile
+
 try:
     import psycopg2
     import psycopg2.extras
@@ -221,6 +288,222 @@ def db_matches(cursor, db, owner, template, encoding, lc_collate, lc_ctype):
         else:
             return True
 
+# ===========================================
+# Dump and restore support.
+#
+
+# Extensions of plain SQL dumps that are streamed through a compressor,
+# mapped to the programs that can handle them, preferred first.
+COMPRESSORS = {
+    '.gz': [['pigz'], ['gzip']],
+    '.bz2': [['pbzip2'], ['bzip2']],
+    '.xz': [['xz', '-T0'], ['xz']],
+}
+
+def get_dump_format(target):
+    """ Returns the pg_dump format and the compression suffix (if any) to
+    use for a dump target, based on its name
+    """
+    base, ext = os.path.splitext(target)
+    if ext in COMPRESSORS:
+        inner = os.path.splitext(base)[1]
+        if inner == '.tar':
+            return 'tar', ext
+        elif inner in ('.pgc', '.dump', '.backup'):
+            raise NotSupportedError('The custom format is compressed by '
+                                    'pg_dump itself, use compress rather '
+                                    'than a %s suffix' % ext)
+        return 'plain', ext
+    elif ext == '.sql':
+        return 'plain', None
+    elif ext == '.tar':
+        return 'tar', None
+    elif ext in ('.pgc', '.dump', '.backup'):
+        return 'custom', None
+    elif ext == '' or os.path.isdir(target):
+        return 'directory', None
+    raise NotSupportedError('Unable to determine the dump format of %s' % target)
+
+def get_compressor(module, suffix, decompress=False):
+    for cmd in COMPRESSORS[suffix]:
+        path = module.get_bin_path(cmd[0])
+        if path:
+            if decompress:
+                return [path, '-dc']
+            return [path, '-c'] + cmd[1:]
+    module.fail_json(msg="Unable to find any of %s to handle %s files" % (
+        ', '.join([c[0] for c in COMPRESSORS[suffix]]), suffix))
+
+def run_pipeline(cmds, stdin=None, stdout=None):
+    """ Runs the commands connected by pipes, like a shell pipeline but
+    without a shell, so the data never passes through this process.
+
+    stdin and stdout are file objects for the ends of the pipeline.  stderr
+    of every command is spooled to a temporary file so that a chatty command
+    can neither deadlock the pipeline nor grow our memory.  Returns the
+    first non-zero return code (or 0), the output of the last command if
+    stdout was not given, and the combined stderr.
+    """
+    errfiles = []
+    procs = []
+    prev = stdin
+    try:
+        for i, cmd in enumerate(cmds):
+            if i == len(cmds) - 1 and stdout is not None:
+                out = stdout
+            else:
+                out = subprocess.PIPE
+            err = tempfile.TemporaryFile()
+            errfiles.append(err)
+            p = subprocess.Popen(cmd, stdin=prev, stdout=out, stderr=err,
+                                 close_fds=True)
+            # Only the next command must hold the read end, so that the
+            # writer gets SIGPIPE if the reader dies
+            if procs:
+                procs[-1].stdout.close()
+            procs.append(p)
+            prev = p.stdout
+
+        output = ''
+        if stdout is None:
+            output = procs[-1].stdout.read()
+            procs[-1].stdout.close()
+        rc = 0
+        for p in procs:
+            p.wait()
+            if p.returncode != 0 and rc == 0:
+                rc = p.returncode
+
+        errors = []
+        for err in errfiles:
+            err.seek(0)
+            errors.append(err.read())
+    finally:
+        for err in errfiles:
+            err.close()
+    return rc, output, ''.join(errors)
+
+def get_conn_args(kw):
+    """ Turns psycopg2 connection keywords into libpq command line options.
+    The password is passed through PGPASSWORD by the caller.
+    """
+    args = []
+    if 'host' in kw:
+        args.append('--host=%s' % kw['host'])
+    if 'port' in kw:
+        args.append('--port=%s' % kw['port'])
+    if 'user' in kw:
+        args.append('--username=%s' % kw['user'])
+    return args
+
+def get_filter_args(sections, tables, exclude_tables=()):
+    """ Returns the section and table options shared by pg_dump and
+    pg_restore; exclude_tables is only understood by pg_dump
+    """
+    args = []
+    for section in sections:
+        args.append('--section=%s' % section)
+    for table in tables:
+        args.append('--table=%s' % table)
+    for table in exclude_tables:
+        args.append('--exclude-table=%s' % table)
+    return args
+
+def db_dump(module, db, target, conn_args, jobs, compress, filter_args):
+    fmt, suffix = get_dump_format(target)
+    if jobs > 1 and fmt != 'directory':
+        raise NotSupportedError('Parallel dumps (jobs > 1) require the '
+                                'directory format, not %s' % fmt)
+
+    cmd = [module.get_bin_path('pg_dump', True)] + conn_args
+    cmd.append('--format=%s' % fmt)
+    if jobs > 1:
+        cmd.append('--jobs=%d' % jobs)
+    if compress is not None and fmt in ('custom', 'directory'):
+        cmd.append('--compress=%d' % compress)
+    cmd.extend(filter_args)
+
+    # Dump next to the target and move it into place once complete, so an
+    # interrupted dump never replaces a good one
+    partial = '%s.partial-%d' % (target.rstrip(os.sep), os.getpid())
+    try:
+        if suffix:
+            compressor = get_compressor(module, suffix)
+            if compress is not None:
+                compressor.append('-%d' % compress)
+            out = open(partial, 'wb')
+            try:
+                rc, stdout, stderr = run_pipeline([cmd + [db], compressor],
+                                                  stdout=out)
+            finally:
+                out.close()
+        else:
+            rc, stdout, stderr = run_pipeline(cmd + ['--file=%s' % partial, db])
+
+        if rc == 0:
+            if os.path.isdir(target) and not os.path.islink(target):
+                old = '%s.old-%d' % (target.rstrip(os.sep), os.getpid())
+                os.rename(target, old)
+                os.rename(partial, target)
+                shutil.rmtree(old)
+            else:
+                os.rename(partial, target)
+    finally:
+        if os.path.isdir(partial):
+            shutil.rmtree(partial)
+        elif os.path.exists(partial):
+            os.remove(partial)
+    return rc, stdout, stderr
+
+def db_restore(module, db, target, conn_args, jobs, single_transaction,
+               filter_args):
+    if not os.path.exists(target):
+        module.fail_json(msg="target %s does not exist on the host" % target)
+    fmt, suffix = get_dump_format(target)
+
+    if fmt == 'plain':
+        if jobs > 1 or filter_args:
+            raise NotSupportedError('jobs, sections and tables are not '
+                                    'supported when restoring plain SQL dumps')
+        cmd = [module.get_bin_path('psql', True)] + conn_args
+        cmd.extend(['--quiet', '--no-psqlrc', '--set=ON_ERROR_STOP=1',
+                    '--dbname=%s' % db])
+        if single_transaction:
+            cmd.append('--single-transaction')
+        if not suffix:
+            return run_pipeline([cmd + ['--file=%s' % target]])
+        # psql applies --single-transaction to --file input only, so read
+        # the decompressed dump through --file=- rather than plain stdin
+        cmd.append('--file=-')
+        source = open(target, 'rb')
+        try:
+            return run_pipeline([get_compressor(module, suffix, True), cmd],
+                                stdin=source)
+        finally:
+            source.close()
+
+    if suffix and jobs > 1:
+        raise NotSupportedError('Parallel restores (jobs > 1) are not '
+                                'supported from compressed tar archives')
+    cmd = [module.get_bin_path('pg_restore', True)] + conn_args
+    cmd.append('--dbname=%s' % db)
+    if jobs > 1:
+        # pg_restore cannot run parallel jobs inside one transaction
+        cmd.append('--jobs=%d' % jobs)
+    elif single_transaction:
+        cmd.append('--single-transaction')
+    cmd.extend(filter_args)
+    if suffix:
+        # pg_restore reads the archive from stdin when given no file
+        source = open(target, 'rb')
+        try:
+            return run_pipeline([get_compressor(module, suffix, True), cmd],
+                                stdin=source)
+        finally:
+            source.close()
+    cmd.append(target)
+    return run_pipeline([cmd])
+
 # ===========================================
 # Module execution.
 #
@@ -239,7 +522,14 @@ def main():
             encoding=dict(default=""),
             lc_collate=dict(default=""),
             lc_ctype=dict(default=""),
-            state=dict(default="present", choices=["absent", "present"]),
+            state=dict(default="present", choices=["absent", "present", "dump", "restore"]),
+            target=dict(default=None),
+            jobs=dict(default=1, type='int'),
+            compress=dict(default=None, type='int'),
+            single_transaction=dict(default=True, type='bool'),
+            sections=dict(default=[], type='list'),
+            tables=dict(default=[], type='list'),
+            exclude_tables=dict(default=[], type='list'),
         ),
         supports_check_mode = True
     )
@@ -255,8 +545,31 @@ def main():
     lc_collate = module.params["lc_collate"]
     lc_ctype = module.params["lc_ctype"]
     state = module.params["state"]
+    target = module.params["target"]
+    jobs = module.params["jobs"]
     changed = False
 
+    if state in ("dump", "restore"):
+        if not target:
+            module.fail_json(msg="with state=%s target is required" % state)
+        target = os.path.expandvars(os.path.expanduser(target))
+        if jobs < 1:
+            module.fail_json(msg="jobs must be a positive number")
+        for section in module.params["sections"]:
+            if section not in ("pre-data", "data", "post-data"):
+                module.fail_json(msg="invalid section %s, must be one of "
+                                     "pre-data, data or post-data" % section)
+        if state == "dump":
+            filter_args = get_filter_args(module.params["sections"],
+                                          module.params["tables"],
+                                          module.params["exclude_tables"])
+        elif module.params["exclude_tables"]:
+            module.fail_json(msg="exclude_tables is only supported with "
+                                 "state=dump")
+        else:
+            filter_args = get_filter_args(module.params["sections"],
+                                          module.params["tables"])
+
     # To use defaults values, keyword arguments must be absent, so
     # check which values are empty and don't include in the **kw
     # dictionary
@@ -295,8 +608,38 @@ def main():
             elif state == "present":
                 changed = not db_matches(cursor, db, owner, template, encoding,
                                          lc_collate, lc_ctype)
+            elif state in ("dump", "restore"):
+                changed = True
             module.exit_json(changed=changed,db=db)
 
+        if state in ("dump", "restore"):
+            # pg_dump, pg_restore and psql pick the password up from here
+            if kw.get("password"):
+                os.environ["PGPASSWORD"] = kw["password"]
+            conn_args = get_conn_args(kw)
+
+        if state == "dump":
+            if not db_exists(cursor, db):
+                module.fail_json(msg="database %s does not exist" % db)
+            rc, stdout, stderr = db_dump(module, db, target, conn_args, jobs,
+                                         module.params["compress"], filter_args)
+            if rc != 0:
+                module.fail_json(msg=stderr, rc=rc)
+            module.exit_json(changed=True, db=db, target=target, msg=stdout)
+
+        elif state == "restore":
+            try:
+                db_create(cursor, db, owner, template, encoding,
+                          lc_collate, lc_ctype)
+            except SQLParseError, e:
+                module.fail_json(msg=str(e))
+            rc, stdout, stderr = db_restore(module, db, target, conn_args, jobs,
+                                            module.params["single_transaction"],
+                                            filter_args)
+            if rc != 0:
+                module.fail_json(msg=stderr, rc=rc)
+            module.exit_json(changed=True, db=db, target=target, msg=stdout)
+
         if state == "absent":
             try:
                 changed = db_delete(cursor, db)
@@ -86,6 +86,10 @@ options:
   priv:
     description:
       - "PostgreSQL privileges string in the format: C(table:priv1,priv2)"
+      - "A table name of the form C(schema.*) stands for all tables in the schema (added in 2.1), which are
+        granted or revoked with a single C(ALL TABLES IN SCHEMA) statement."
+      - "The privileges currently held on all the tables named are read with one catalog query and
+        tables needing the same change are handled by one statement. This requires PostgreSQL 9.0 or later."
     required: false
     default: null
   role_attr_flags:
@@ -153,6 +157,9 @@ EXAMPLES = '''
 # Remove test user from test database and the cluster
 - postgresql_user: db=test name=test priv=ALL state=absent
 
+# Grant read access to every table in the reporting schema
+- postgresql_user: db=acme name=analyst priv=CONNECT/reporting.*:SELECT
+
 # Example privileges string format
 INSERT,UPDATE/table:SELECT/anothertable:ALL
 
@@ -184,6 +191,9 @@ PRIV_TO_AUTHID_COLUMN = dict(SUPERUSER='rolsuper', CREATEROLE='rolcreaterole',
                              INHERIT='rolinherit', LOGIN='rolcanlogin',
                              REPLICATION='rolreplication')
 
+# Maximum number of tables named in a single GRANT/REVOKE statement
+TABLE_BATCH_SIZE = 1000
+
 class InvalidFlagsError(Exception):
     pass
 
@@ -324,46 +334,133 @@ def user_delete(cursor, user):
     cursor.execute("RELEASE SAVEPOINT ansible_pgsql_user_delete")
     return True
 
-def has_table_privileges(cursor, user, table, privs):
-    """
-    Return the difference between the privileges that a user already has and
-    the privileges that they desire to have.
+def quote_role(user):
+    if user == 'PUBLIC':
+        return 'PUBLIC'
+    return pg_quote_identifier(user, 'role')
 
-    :returns: tuple of:
-        * privileges that they have and were requested
-        * privileges they currently hold but were not requested
-        * privileges requested that they do not hold
+def split_table_name(name):
+    if '.' in name:
+        return tuple(name.split('.', 1))
+    return ('public', name)
+
+def get_tables_privileges(cursor, user, schemas):
     """
-    cur_privs = get_table_privileges(cursor, user, table)
-    have_currently = cur_privs.intersection(privs)
-    other_current = cur_privs.difference(privs)
-    desired = privs.difference(cur_privs)
-    return (have_currently, other_current, desired)
+    Return the privileges the user holds on every table, view, materialized
+    view and foreign table in the given schemas, read with a single catalog
+    query.
 
-def get_table_privileges(cursor, user, table):
-    if '.' in table:
-        schema, table = table.split('.', 1)
+    :returns: dict mapping (schema, table) to a set of privileges. Tables on
+        which the user holds nothing are included with an empty set.
+    """
+    if user == 'PUBLIC':
+        grantee = 0
     else:
-        schema = 'public'
-    query = '''SELECT privilege_type FROM information_schema.role_table_grants
-    WHERE grantee=%s AND table_name=%s AND table_schema=%s'''
-    cursor.execute(query, (user, table, schema))
-    return frozenset([x[0] for x in cursor.fetchall()])
+        cursor.execute("SELECT oid FROM pg_catalog.pg_roles WHERE rolname=%(user)s", {'user': user})
+        row = cursor.fetchone()
+        if row is None:
+            grantee = None
+        else:
+            grantee = row[0]
+
+    # A NULL relacl means the default privileges, under which only the owner
+    # holds anything (all of it)
+    query = """SELECT n.nspname, c.relname,
+        c.relacl IS NULL AND c.relowner = %(grantee)s AS owner_default,
+        ARRAY(SELECT a.privilege_type FROM pg_catalog.aclexplode(c.relacl) a
+              WHERE a.grantee = %(grantee)s) AS privs
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relkind IN ('r', 'v', 'm', 'f', 'p') AND n.nspname = ANY(%(schemas)s)"""
+    cursor.execute(query, {'grantee': grantee, 'schemas': list(schemas)})
+    o = {}
+    for schema, table, owner_default, privs in cursor.fetchall():
+        if owner_default:
+            o[(schema, table)] = set(VALID_PRIVS['table'].difference(['ALL']))
+        else:
+            o[(schema, table)] = set(privs)
+    return o
 
-def grant_table_privileges(cursor, user, table, privs):
+def grant_table_privileges(cursor, user, tables, privs):
+    # Note: priv escaped by parse_privs
+    privs = ', '.join(privs)
+    for i in range(0, len(tables), TABLE_BATCH_SIZE):
+        query = 'GRANT %s ON TABLE %s TO %s' % (
+            privs,
+            ', '.join([pg_quote_identifier(t, 'table') for t in tables[i:i + TABLE_BATCH_SIZE]]),
+            quote_role(user))
+        cursor.execute(query)
+
+def revoke_table_privileges(cursor, user, tables, privs):
     # Note: priv escaped by parse_privs
     privs = ', '.join(privs)
-    query = 'GRANT %s ON TABLE %s TO %s' % (
-        privs, pg_quote_identifier(table, 'table'), pg_quote_identifier(user, 'role') )
+    for i in range(0, len(tables), TABLE_BATCH_SIZE):
+        query = 'REVOKE %s ON TABLE %s FROM %s' % (
+            privs,
+            ', '.join([pg_quote_identifier(t, 'table') for t in tables[i:i + TABLE_BATCH_SIZE]]),
+            quote_role(user))
+        cursor.execute(query)
+
+def grant_schema_tables_privileges(cursor, user, schema, privs):
+    # Note: priv escaped by parse_privs
+    query = 'GRANT %s ON ALL TABLES IN SCHEMA %s TO %s' % (
+        ', '.join(privs), pg_quote_identifier(schema, 'schema'), quote_role(user))
     cursor.execute(query)
 
-def revoke_table_privileges(cursor, user, table, privs):
+def revoke_schema_tables_privileges(cursor, user, schema, privs):
     # Note: priv escaped by parse_privs
-    privs = ', '.join(privs)
-    query = 'REVOKE %s ON TABLE %s FROM %s' % (
-        privs, pg_quote_identifier(table, 'table'), pg_quote_identifier(user, 'role') )
+    query = 'REVOKE %s ON ALL TABLES IN SCHEMA %s FROM %s' % (
+        ', '.join(privs), pg_quote_identifier(schema, 'schema'), quote_role(user))
     cursor.execute(query)
 
+def reconcile_table_privileges(cursor, user, tables, grant):
+    """
+    Grant (or revoke) table privileges with as few statements as possible.
+
+    The current privileges of the user on every table involved are read
+    with one query and compared in memory. Tables missing the same set of
+    privileges (or holding the same set to revoke) share a single
+    GRANT/REVOKE statement, and a ``schema.*`` table name is handled with
+    one ``ALL TABLES IN SCHEMA`` statement.
+
+    :returns: True if any statement was executed
+    """
+    current = get_tables_privileges(cursor, user,
+                                    set([split_table_name(t)[0] for t in tables]))
+
+    def difference(key, privs):
+        held = current.get(key, set())
+        if grant:
+            return privs.difference(held)
+        return privs.intersection(held)
+
+    batches = {}
+    schemas = []
+    for name, privs in tables.iteritems():
+        schema, table = split_table_name(name)
+        if table == '*':
+            for key in current:
+                if key[0] == schema and difference(key, privs):
+                    schemas.append((schema, privs))
+                    break
+            continue
+        diff = difference((schema, table), privs)
+        if diff:
+            batches.setdefault(frozenset(diff), []).append(name)
+
+    for schema, privs in schemas:
+        if grant:
+            grant_schema_tables_privileges(cursor, user, schema, privs)
+        else:
+            revoke_schema_tables_privileges(cursor, user, schema, privs)
+    for privs, names in batches.iteritems():
+        names.sort()
+        if grant:
+            grant_table_privileges(cursor, user, names, privs)
+        else:
+            revoke_table_privileges(cursor, user, names, privs)
+    return bool(schemas or batches)
+
 def get_database_privileges(cursor, user, db):
     priv_map = {
         'C':'CREATE',
@@ -427,39 +524,32 @@ def revoke_privileges(cursor, user, privs):
     if privs is None:
         return False
 
-    revoke_funcs = dict(table=revoke_table_privileges, database=revoke_database_privileges)
-    check_funcs = dict(table=has_table_privileges, database=has_database_privileges)
-
     changed = False
-    for type_ in privs:
-        for name, privileges in privs[type_].iteritems():
-            # Check that any of the privileges requested to be removed are
-            # currently granted to the user
-            differences = check_funcs[type_](cursor, user, name, privileges)
-            if differences[0]:
-                revoke_funcs[type_](cursor, user, name, privileges)
-                changed = True
+    for name, privileges in privs['database'].iteritems():
+        # Check that any of the privileges requested to be removed are
+        # currently granted to the user
+        differences = has_database_privileges(cursor, user, name, privileges)
+        if differences[0]:
+            revoke_database_privileges(cursor, user, name, privileges)
+            changed = True
+    if privs['table']:
+        changed = reconcile_table_privileges(cursor, user, privs['table'], grant=False) or changed
     return changed
 
 def grant_privileges(cursor, user, privs):
     if privs is None:
         return False
 
-    grant_funcs = dict(table=grant_table_privileges, database=grant_database_privileges)
-    check_funcs = dict(table=has_table_privileges, database=has_database_privileges)
-
-    grant_funcs = dict(table=grant_table_privileges, database=grant_database_privileges)
-    check_funcs = dict(table=has_table_privileges, database=has_database_privileges)
-
     changed = False
-    for type_ in privs:
-        for name, privileges in privs[type_].iteritems():
-            # Check that any of the privileges requested for the user are
-            # currently missing
-            differences = check_funcs[type_](cursor, user, name, privileges)
-            if differences[2]:
-                grant_funcs[type_](cursor, user, name, privileges)
-                changed = True
+    for name, privileges in privs['database'].iteritems():
+        # Check that any of the privileges requested for the user are
+        # currently missing
+        differences = has_database_privileges(cursor, user, name, privileges)
+        if differences[2]:
+            grant_database_privileges(cursor, user, name, privileges)
+            changed = True
+    if privs['table']:
+        changed = reconcile_table_privileges(cursor, user, privs['table'], grant=True) or changed
     return changed
 
 def parse_role_attrs(role_attr_flags):
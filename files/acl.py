@@ -89,11 +89,23 @@ options:
     choices: [ 'yes', 'no' ]
     description:
       - Recursively sets the specified ACL (added in Ansible 2.0). Incompatible with C(state=query).
+      - Symlinks found below I(name) are not followed.
+
+  entries:
+    version_added: "2.1"
+    required: false
+    default: null
+    description:
+      - List of ACL entries to set or remove at once, each in the I(entry) form
+        C([default:]<etype>:<qualifier>[:<perms>]). Incompatible with I(entry), I(entity), I(etype) and I(permissions).
 author:
     - "Brian Coca (@bcoca)"
     - "Jérémie Astori (@astorije)"
 notes:
-    - The "acl" module requires that acls are enabled on the target filesystem and that the setfacl and getfacl binaries are installed.
+    - The "acl" module requires that acls are enabled on the target filesystem.
+    - The ACLs are read and written directly as the C(system.posix_acl_access) and C(system.posix_acl_default)
+      extended attributes, through the C library. The setfacl and getfacl binaries are only used where it is not
+      available, or when I(name) is a symlink and I(follow=no).
 '''
 
 EXAMPLES = '''
@@ -112,6 +124,16 @@ EXAMPLES = '''
 # Obtain the acl for a specific file
 - acl: name=/etc/foo.conf
   register: acl_info
+
+# Grant several entries on a whole tree at once
+- acl:
+    name: /srv/shared
+    recursive: yes
+    state: present
+    entries:
+      - user:joe:rwX
+      - group:staff:r-X
+      - default:group:staff:r-X
 '''
 
 RETURN = '''
@@ -122,6 +144,45 @@ acl:
     sample: [ "user::rwx", "group::rwx", "other::rwx" ]
 '''
 
+import errno
+import grp
+import os
+import pwd
+import stat
+import struct
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# in-process access to the ACL extended attributes, through the C library
+try:
+    import ctypes
+    import ctypes.util
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    for _name in ('getxattr', 'lgetxattr'):
+        getattr(_libc, _name).restype = ctypes.c_ssize_t
+    HAVE_NATIVE_ACL = True
+except Exception:
+    HAVE_NATIVE_ACL = False
+
+# layout of the system.posix_acl_* attributes, see linux/posix_acl_xattr.h
+ACL_XATTR_VERSION = 2
+ACL_UNDEFINED_ID = 0xFFFFFFFF
+ACL_USER_OBJ = 0x01
+ACL_USER = 0x02
+ACL_GROUP_OBJ = 0x04
+ACL_GROUP = 0x08
+ACL_MASK = 0x10
+ACL_OTHER = 0x20
+ACL_BASE_TAGS = (ACL_USER_OBJ, ACL_GROUP_OBJ, ACL_OTHER)
+ACL_XATTRS = {False: 'system.posix_acl_access', True: 'system.posix_acl_default'}
+ACL_TAG_NAMES = {ACL_USER_OBJ: 'user', ACL_USER: 'user', ACL_GROUP_OBJ: 'group',
+                 ACL_GROUP: 'group', ACL_MASK: 'mask', ACL_OTHER: 'other'}
+
 
 def split_entry(entry):
     ''' splits entry and ensures normalized return'''
@@ -218,6 +279,258 @@ def run_acl(module, cmd, check_rc=True):
         return lines
 
 
+def _native_call(func, path, follow, *args):
+    '''Calls the (l)xattr function of the C library, raising OSError on failure.'''
+    if isinstance(path, unicode):
+        path = path.encode('utf-8')
+    if not follow:
+        func = 'l' + func
+    result = getattr(_libc, func)(path, *args)
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), path)
+    return result
+
+
+def _native_read(func, path, follow, *args):
+    '''Calls a function of the C library that fills a buffer, retrying while the value grows in between.'''
+    while True:
+        size = _native_call(func, path, follow, *(args + (None, 0)))
+        buf = ctypes.create_string_buffer(size)
+        try:
+            size = _native_call(func, path, follow, *(args + (buf, size)))
+        except OSError, e:
+            if e.errno == errno.ERANGE:
+                continue
+            raise
+        return buf.raw[:size]
+
+
+def get_xattr(path, name, follow=True):
+    '''Returns the value of the extended attribute name of path, or None if it is not set.'''
+    try:
+        return _native_read('getxattr', path, follow, name)
+    except OSError, e:
+        if e.errno == errno.ENODATA:
+            return None
+        raise
+
+
+def set_xattr(path, name, value, follow=True):
+    _native_call('setxattr', path, follow, name, value, len(value), 0)
+
+
+def parse_acl_xattr(data):
+    '''Returns a dict of (tag, qualifier) to permission bits from a system.posix_acl_* value.'''
+    acl = {}
+    if not data:
+        return acl
+    version = struct.unpack('<I', data[:4])[0]
+    if version != ACL_XATTR_VERSION:
+        raise ValueError("unsupported ACL version %d" % version)
+    for offset in range(4, len(data) - 7, 8):
+        tag, perm, qualifier = struct.unpack('<HHI', data[offset:offset + 8])
+        acl[(tag, qualifier)] = perm
+    return acl
+
+
+def build_acl_xattr(acl):
+    '''Builds a system.posix_acl_* value, entries sorted the way the kernel expects them.'''
+    keys = acl.keys()
+    keys.sort()
+    return struct.pack('<I', ACL_XATTR_VERSION) + ''.join([struct.pack('<HHI', tag, acl[(tag, qualifier)], qualifier) for tag, qualifier in keys])
+
+
+def acl_from_mode(mode):
+    '''The access ACL equivalent to the permission bits of a file without extended ACL.'''
+    return {(ACL_USER_OBJ, ACL_UNDEFINED_ID): (mode >> 6) & 7,
+            (ACL_GROUP_OBJ, ACL_UNDEFINED_ID): (mode >> 3) & 7,
+            (ACL_OTHER, ACL_UNDEFINED_ID): mode & 7}
+
+
+def format_acl(acl, prefix=''):
+    '''Returns the entries of acl as getfacl would print them.'''
+    keys = acl.keys()
+    keys.sort()
+    lines = []
+    for tag, qualifier in keys:
+        entity = ''
+        if tag == ACL_USER:
+            try:
+                entity = pwd.getpwuid(qualifier).pw_name
+            except KeyError:
+                entity = str(qualifier)
+        elif tag == ACL_GROUP:
+            try:
+                entity = grp.getgrgid(qualifier).gr_name
+            except KeyError:
+                entity = str(qualifier)
+        perm = acl[(tag, qualifier)]
+        perms = ''.join([(perm & bit) and char or '-' for bit, char in ((4, 'r'), (2, 'w'), (1, 'x'))])
+        lines.append('%s%s:%s:%s' % (prefix, ACL_TAG_NAMES[tag], entity, perms))
+    return lines
+
+
+class NativeAcl(object):
+    '''Sets or removes ACL entries by reading and writing the ACL extended
+    attributes directly. The entries are resolved once and an inode is only
+    written when its ACL differs from the wanted one.'''
+
+    def __init__(self, module, entries, state):
+        self.module = module
+        self.state = state
+        self.entries = []
+        self.explicit_mask = {False: False, True: False}
+        for default, etype, entity, permissions in entries:
+            tag, qualifier = self._resolve(etype, entity)
+            if state == 'present':
+                bits, conditional_x = self._parse_permissions(permissions)
+                if tag == ACL_MASK:
+                    self.explicit_mask[bool(default)] = True
+            else:
+                if tag in ACL_BASE_TAGS:
+                    self.module.fail_json(msg="the %s::%s entry cannot be removed" % (etype, entity or ''))
+                bits, conditional_x = None, False
+            self.entries.append((bool(default), tag, qualifier, bits, conditional_x))
+        self.kinds = set([default for default, tag, qualifier, bits, conditional_x in self.entries])
+
+    def _resolve(self, etype, entity):
+        if etype == 'mask':
+            return ACL_MASK, ACL_UNDEFINED_ID
+        if etype == 'other':
+            return ACL_OTHER, ACL_UNDEFINED_ID
+        if not entity:
+            if etype == 'user':
+                return ACL_USER_OBJ, ACL_UNDEFINED_ID
+            return ACL_GROUP_OBJ, ACL_UNDEFINED_ID
+        try:
+            return {'user': ACL_USER, 'group': ACL_GROUP}[etype], int(entity)
+        except ValueError:
+            try:
+                if etype == 'user':
+                    return ACL_USER, pwd.getpwnam(entity).pw_uid
+                return ACL_GROUP, grp.getgrnam(entity).gr_gid
+            except KeyError:
+                self.module.fail_json(msg="%s %s does not exist" % (etype, entity))
+
+    def _parse_permissions(self, permissions):
+        '''Returns the permission bits and whether X (execute only for
+        directories or files executable by someone) was given.'''
+        if not permissions:
+            self.module.fail_json(msg="'permissions' MUST be set when 'state=present'.")
+        if permissions.isdigit() and len(permissions) == 1 and int(permissions) < 8:
+            return int(permissions), False
+        bits = 0
+        conditional_x = False
+        for char in permissions:
+            if char == 'r':
+                bits |= 4
+            elif char == 'w':
+                bits |= 2
+            elif char == 'x':
+                bits |= 1
+            elif char == 'X':
+                conditional_x = True
+            elif char != '-':
+                self.module.fail_json(msg="invalid permissions %s" % permissions)
+        return bits, conditional_x
+
+    def read(self, path, st, default):
+        data = get_xattr(path, ACL_XATTRS[default])
+        if data is None and not default:
+            return acl_from_mode(st.st_mode)
+        return parse_acl_xattr(data)
+
+    def modify(self, path, st, acl, default):
+        '''Returns acl with the entries of the default or access kind applied,
+        recalculating the mask like setfacl does.'''
+        new = dict(acl)
+        conditional = []
+        for entry_default, tag, qualifier, bits, conditional_x in self.entries:
+            if entry_default != default:
+                continue
+            if self.state == 'absent':
+                new.pop((tag, qualifier), None)
+                continue
+            if default and not new:
+                # like setfacl, a new default ACL starts from the base entries of the access ACL
+                access = self.read(path, st, False)
+                for base in ACL_BASE_TAGS:
+                    new[(base, ACL_UNDEFINED_ID)] = access[(base, ACL_UNDEFINED_ID)]
+            if conditional_x:
+                conditional.append((tag, qualifier))
+            new[(tag, qualifier)] = bits
+
+        if conditional:
+            # X is judged on the resulting ACL rather than on the current mode,
+            # which the mask may have made executable, to stay idempotent
+            executable = stat.S_ISDIR(st.st_mode)
+            for key, perm in new.items():
+                if key[0] != ACL_MASK and key not in conditional and perm & 1:
+                    executable = True
+            if executable:
+                for key in conditional:
+                    new[key] |= 1
+
+        if new and not self.explicit_mask[default]:
+            group_class = [perm for (tag, qualifier), perm in new.items() if tag in (ACL_USER, ACL_GROUP)]
+            if group_class or (ACL_MASK, ACL_UNDEFINED_ID) in new:
+                mask = new.get((ACL_GROUP_OBJ, ACL_UNDEFINED_ID), 0)
+                for perm in group_class:
+                    mask |= perm
+                new[(ACL_MASK, ACL_UNDEFINED_ID)] = mask
+        return new
+
+    def apply(self, path, st):
+        '''Applies the entries to path; returns whether its ACLs changed.'''
+        changed = False
+        for default in self.kinds:
+            if default and not stat.S_ISDIR(st.st_mode):
+                # only directories have a default ACL
+                continue
+            acl = self.read(path, st, default)
+            new = self.modify(path, st, acl, default)
+            if new != acl:
+                changed = True
+                if not self.module.check_mode:
+                    set_xattr(path, ACL_XATTRS[default], build_acl_xattr(new))
+        return changed
+
+    def _entries(self, path):
+        if scandir is not None:
+            for entry in scandir(path):
+                yield entry.path, entry.stat(follow_symlinks=False)
+        else:
+            for name in os.listdir(path):
+                fsname = os.path.join(path, name)
+                yield fsname, os.lstat(fsname)
+
+    def run(self, path, recursive):
+        '''Applies the entries to path, and to everything below it when
+        recursive; symlinks below path are skipped. Returns the number of
+        changed inodes.'''
+        changed = 0
+        pending = [(path, os.stat(path))]
+        while pending:
+            fsname, st = pending.pop()
+            if self.apply(fsname, st):
+                changed += 1
+            if recursive and stat.S_ISDIR(st.st_mode):
+                for entry, entry_st in self._entries(fsname):
+                    if not stat.S_ISLNK(entry_st.st_mode):
+                        pending.append((entry, entry_st))
+        return changed
+
+    def query(self, path, default):
+        st = os.stat(path)
+        if default:
+            return format_acl(self.read(path, st, True))
+        lines = format_acl(self.read(path, st, False))
+        if stat.S_ISDIR(st.st_mode):
+            lines.extend(format_acl(self.read(path, st, True), 'default:'))
+        return lines
+
+
 def main():
     if get_platform().lower() != 'linux':
         module.fail_json(msg="The acl module is only available for Linux distributions.")
@@ -242,12 +555,14 @@ def main():
             follow=dict(required=False, type='bool', default=True),
             default=dict(required=False, type='bool', default=False),
             recursive=dict(required=False, type='bool', default=False),
+            entries=dict(required=False, type='list'),
         ),
         supports_check_mode=True,
     )
 
     path = os.path.expanduser(module.params.get('name'))
     entry = module.params.get('entry')
+    entries = module.params.get('entries')
     entity = module.params.get('entity')
     etype = module.params.get('etype')
     permissions = module.params.get('permissions')
@@ -262,7 +577,21 @@ def main():
     if state == 'query' and recursive:
         module.fail_json(msg="'recursive' MUST NOT be set when 'state=query'.")
 
-    if not entry:
+    if entries:
+        if entry or etype or entity or permissions:
+            module.fail_json(msg="'entries' MUST NOT be set when 'entry', 'entity', 'etype' or 'permissions' are set.")
+
+        if state == 'query':
+            module.fail_json(msg="'entries' MUST NOT be set when 'state=query'.")
+    elif entry:
+        if etype or entity or permissions:
+            module.fail_json(msg="'entry' MUST NOT be set when 'entity', 'etype' or 'permissions' are set.")
+
+        if state == 'query':
+            module.fail_json(msg="'entry' MUST NOT be set when 'state=query'.")
+
+        entries = [entry]
+    else:
         if state == 'absent' and permissions:
             module.fail_json(msg="'permissions' MUST NOT be set when 'state=absent'.")
 
@@ -272,57 +601,77 @@ def main():
         if state in ['present', 'absent'] and not etype:
             module.fail_json(msg="'etype' MUST be set when 'state=%s'." % state)
 
-    if entry:
-        if etype or entity or permissions:
-            module.fail_json(msg="'entry' MUST NOT be set when 'entity', 'etype' or 'permissions' are set.")
-
-        if state == 'present' and not entry.count(":") in [2, 3]:
-            module.fail_json(msg="'entry' MUST have 3 or 4 sections divided by ':' when 'state=present'.")
-
-        if state == 'absent' and not entry.count(":") in [1, 2]:
-            module.fail_json(msg="'entry' MUST have 2 or 3 sections divided by ':' when 'state=absent'.")
-
-        if state == 'query':
-            module.fail_json(msg="'entry' MUST NOT be set when 'state=query'.")
-
-        default_flag, etype, entity, permissions = split_entry(entry)
-        if default_flag != None:
-            default = default_flag
+    acl_entries = []
+    if entries:
+        for entry in entries:
+            if state == 'present' and not entry.count(":") in [2, 3]:
+                module.fail_json(msg="'entry' MUST have 3 or 4 sections divided by ':' when 'state=present'.")
+
+            if state == 'absent' and not entry.count(":") in [1, 2]:
+                module.fail_json(msg="'entry' MUST have 2 or 3 sections divided by ':' when 'state=absent'.")
+
+            default_flag, entry_etype, entry_entity, entry_permissions = split_entry(entry)
+            if not entry_etype:
+                module.fail_json(msg="invalid entry type in '%s'." % entry)
+            if default_flag == None:
+                default_flag = default
+            acl_entries.append((default_flag, entry_etype, entry_entity, entry_permissions))
+    elif state != 'query':
+        acl_entries.append((default, etype, entity, permissions))
+
+    if state == 'absent':
+        # the permissions are never part of an entry to remove
+        acl_entries = [(d, t, e, None) for d, t, e, p in acl_entries]
+
+    # a symlink itself is left to setfacl/getfacl --physical, as before
+    native = HAVE_NATIVE_ACL and (follow or not os.path.islink(path))
+    if native:
+        path = os.path.realpath(path)
 
     changed = False
     msg = ""
 
-    if state == 'present':
-        entry = build_entry(etype, entity, permissions)
-        command = build_command(
-            module, 'set', path, follow,
-            default, recursive, entry
-        )
-        changed = acl_changed(module, command)
-
-        if changed and not module.check_mode:
-            run_acl(module, command)
-        msg = "%s is present" % entry
-
-    elif state == 'absent':
-        entry = build_entry(etype, entity)
-        command = build_command(
-            module, 'rm', path, follow,
-            default, recursive, entry
-        )
-        changed = acl_changed(module, command)
-
-        if changed and not module.check_mode:
-            run_acl(module, command, False)
-        msg = "%s is absent" % entry
+    if state in ['present', 'absent']:
+        msg = "%s is %s" % (', '.join([(d and 'default:' or '') + build_entry(t, e, p) for d, t, e, p in acl_entries]), state)
+
+        if native:
+            try:
+                changed = NativeAcl(module, acl_entries, state).run(path, recursive) > 0
+            except (OSError, IOError, ValueError), e:
+                module.fail_json(msg="failed to set the acl: %s" % str(e))
+        else:
+            for entry_default, entry_etype, entry_entity, entry_permissions in acl_entries:
+                if state == 'present':
+                    entry = build_entry(entry_etype, entry_entity, entry_permissions)
+                    command = build_command(
+                        module, 'set', path, follow,
+                        entry_default, recursive, entry
+                    )
+                else:
+                    entry = build_entry(entry_etype, entry_entity)
+                    command = build_command(
+                        module, 'rm', path, follow,
+                        entry_default, recursive, entry
+                    )
+
+                if acl_changed(module, command):
+                    changed = True
+                    if not module.check_mode:
+                        run_acl(module, command, state == 'present')
 
     elif state == 'query':
         msg = "current acl"
 
-    acl = run_acl(
-        module,
-        build_command(module, 'get', path, follow, default, recursive)
-    )
+    if native:
+        try:
+            acl = NativeAcl(module, [], 'query').query(path, default)
+        except (OSError, IOError, ValueError), e:
+            module.fail_json(msg="failed to read the acl: %s" % str(e))
+    else:
+        acl = run_acl(
+            module,
+            build_command(module, 'get', path, follow, default, recursive)
+        )
 
     module.exit_json(changed=changed, msg=msg, acl=acl)
 
@@ -19,15 +19,28 @@
 # along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 
 import errno
+import os
 import shutil
 import stat
+import sys
 import grp
 import pwd
+import threading
+import Queue
 try:
     import selinux
     HAVE_SELINUX=True
 except ImportError:
     HAVE_SELINUX=False
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+# os.fchown and os.fchmod are new in python 2.6
+HAVE_FCHOWN = hasattr(os, 'fchown') and hasattr(os, 'fchmod')
 
 DOCUMENTATION = '''
 ---
@@ -79,6 +92,15 @@ options:
     version_added: "1.1"
     description:
       - recursively set the specified file attributes (applies only to state=directory)
+      - owner, group, mode and SELinux context are resolved once and every entry is only
+        stat'ed once (listed with C(scandir) when available); the module returns per
+        attribute counts of the changed entries in C(recurse_stats).
+  threads:
+    required: false
+    default: 1
+    version_added: "2.1"
+    description:
+      - number of threads the subdirectories are shared between when I(recurse=yes).
   force:
     required: false
     default: "no"
@@ -107,6 +129,9 @@ EXAMPLES = '''
 # create a directory if it doesn't exist
 - file: path=/etc/some_directory state=directory mode=0755
 
+# recursively set the ownership of a large tree from 8 threads
+- file: path=/srv/data state=directory owner=www-data group=www-data recurse=yes threads=8
+
 '''
 
 
@@ -126,27 +151,268 @@ def get_state(path):
 
     return 'absent'
 
-def recursive_set_attributes(module, path, follow, file_args):
-    changed = False
-    for root, dirs, files in os.walk(path):
-        for fsobj in dirs + files:
-            fsname = os.path.join(root, fsobj)
-            if not os.path.islink(fsname):
-                tmp_file_args = file_args.copy()
-                tmp_file_args['path']=fsname
-                changed |= module.set_fs_attributes_if_different(tmp_file_args, changed)
+class RecursiveAttributes(object):
+    ''' Sets owner, group, mode and SELinux context of everything below a
+    directory. The wanted values are resolved once, every entry is lstat'ed
+    once and only the attributes that differ are changed, through a file
+    descriptor for regular files and directories where os.fchown and
+    os.fchmod exist (python 2.6 and later). '''
+
+    def __init__(self, module, file_args, follow):
+        self.module = module
+        self.follow = follow
+        self.path = file_args['path']
+        self.uid = self._resolve_id(file_args['owner'], 'user')
+        self.gid = self._resolve_id(file_args['group'], 'group')
+
+        self.mode = None
+        self.symbolic_mode = None
+        mode = file_args['mode']
+        if isinstance(mode, int):
+            self.mode = mode
+        elif mode is not None:
+            try:
+                self.mode = int(mode, 8)
+            except ValueError:
+                # symbolic modes depend on the current mode of every entry
+                self.symbolic_mode = mode
+
+        self.context = None
+        context = file_args.get('secontext')
+        if HAVE_SELINUX and module.selinux_enabled() and context and [c for c in context if c is not None]:
+            self.context = context
+
+        # Linux has no symlink modes, lchmod there only fails with ENOTSUP
+        self.lchmod = hasattr(os, 'lchmod') and not sys.platform.startswith('linux')
+
+        self.lock = threading.Lock()
+        self.visited = set()
+        self.stats = dict(examined=0, changed=0, owner=0, group=0, mode=0, secontext=0)
+        self.errors = []
+
+    def _resolve_id(self, name, kind):
+        if name is None:
+            return -1
+        try:
+            return int(name)
+        except ValueError:
+            try:
+                if kind == 'user':
+                    return pwd.getpwnam(name).pw_uid
+                return grp.getgrnam(name).gr_gid
+            except KeyError:
+                self.module.fail_json(path=self.path, msg='chown failed: failed to look up %s %s' % (kind, name))
+
+    def _entries(self, path):
+        ''' returns the (path, lstat result) of the entries of path, skipping
+        the ones removed in the meantime '''
+        if scandir is not None:
+            names = [(entry.path, entry) for entry in scandir(path)]
+        else:
+            names = [(os.path.join(path, name), None) for name in os.listdir(path)]
+        entries = []
+        for fsname, entry in names:
+            try:
+                if entry is not None:
+                    st = entry.stat(follow_symlinks=False)
+                else:
+                    st = os.lstat(fsname)
+            except OSError, e:
+                if e.errno == errno.ENOENT:
+                    continue
+                raise
+            entries.append((fsname, st))
+        return entries
+
+    def _visit(self, st):
+        ''' with follow, a directory reached twice through links is only
+        walked once '''
+        if not self.follow:
+            return True
+        key = (st.st_dev, st.st_ino)
+        self.lock.acquire()
+        try:
+            if key in self.visited:
+                return False
+            self.visited.add(key)
+            return True
+        finally:
+            self.lock.release()
+
+    def _get_context(self, path):
+        return selinux.lgetfilecon_raw(path)[1].split(':', 3)
+
+    def apply(self, path, st, link=False):
+        ''' sets the attributes of path that differ from st; returns the
+        names of the changed attributes '''
+        changes = []
+        uid = gid = -1
+        if self.uid != -1 and st.st_uid != self.uid:
+            uid = self.uid
+            changes.append('owner')
+        if self.gid != -1 and st.st_gid != self.gid:
+            gid = self.gid
+            changes.append('group')
+
+        mode = None
+        if not link or self.lchmod:
+            if self.symbolic_mode is not None:
+                wanted = self.module._symbolic_mode_to_octal(st, self.symbolic_mode)
             else:
-                tmp_file_args = file_args.copy()
-                tmp_file_args['path']=fsname
-                changed |= module.set_fs_attributes_if_different(tmp_file_args, changed)
-                if follow:
-                    fsname = os.path.join(root, os.readlink(fsname))
-                    if os.path.isdir(fsname):
-                        changed |= recursive_set_attributes(module, fsname, follow, file_args)
-                    tmp_file_args = file_args.copy()
-                    tmp_file_args['path']=fsname
-                    changed |= module.set_fs_attributes_if_different(tmp_file_args, changed)
-    return changed
+                wanted = self.mode
+            if wanted is not None and stat.S_IMODE(st.st_mode) != wanted:
+                mode = wanted
+                changes.append('mode')
+
+        context = None
+        if self.context is not None:
+            current = self._get_context(path)
+            new_context = list(current)
+            for i in range(len(self.context)):
+                if self.context[i] is not None and i < len(current) and self.context[i] != current[i]:
+                    new_context[i] = self.context[i]
+            if new_context != current:
+                context = new_context
+                changes.append('secontext')
+
+        if not changes or self.module.check_mode:
+            return changes
+
+        fd = None
+        if not link and HAVE_FCHOWN and (stat.S_ISREG(st.st_mode) or stat.S_ISDIR(st.st_mode)):
+            try:
+                fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0) | getattr(os, 'O_NONBLOCK', 0))
+            except OSError:
+                # not readable, fall back to the path
+                fd = None
+        try:
+            # ownership first, chown may clear the setuid/setgid bits
+            if uid != -1 or gid != -1:
+                if fd is not None:
+                    os.fchown(fd, uid, gid)
+                else:
+                    os.lchown(path, uid, gid)
+            if mode is not None:
+                if fd is not None:
+                    os.fchmod(fd, mode)
+                elif link:
+                    os.lchmod(path, mode)
+                else:
+                    os.chmod(path, mode)
+        finally:
+            if fd is not None:
+                os.close(fd)
+        if context is not None:
+            selinux.lsetfilecon(path, str(':'.join(context)))
+        return changes
+
+    def process_dir(self, path):
+        ''' applies the attributes to the entries of path; returns the
+        subdirectories to walk next '''
+        stats = dict.fromkeys(self.stats, 0)
+        subdirs = []
+        errors = []
+        try:
+            entries = self._entries(path)
+        except OSError, e:
+            if e.errno != errno.ENOENT:
+                errors.append((path, str(e)))
+            entries = []
+        for fsname, st in entries:
+            link = stat.S_ISLNK(st.st_mode)
+            targets = [(fsname, st, link)]
+            if link and self.follow:
+                target = os.path.realpath(fsname)
+                try:
+                    targets.append((target, os.lstat(target), False))
+                except OSError:
+                    # dangling link
+                    pass
+            for target, target_st, is_link in targets:
+                stats['examined'] += 1
+                try:
+                    changes = self.apply(target, target_st, is_link)
+                except OSError, e:
+                    if e.errno != errno.ENOENT:
+                        errors.append((target, str(e)))
+                    continue
+                if changes:
+                    stats['changed'] += 1
+                    for name in changes:
+                        stats[name] += 1
+                if stat.S_ISDIR(target_st.st_mode) and self._visit(target_st):
+                    subdirs.append(target)
+
+        self.lock.acquire()
+        try:
+            for name, count in stats.items():
+                self.stats[name] += count
+            self.errors.extend(errors)
+        finally:
+            self.lock.release()
+        return subdirs
+
+    def run(self, threads=1):
+        self._visit(os.stat(self.path))
+        if threads <= 1:
+            pending = [self.path]
+            while pending:
+                pending.extend(self.process_dir(pending.pop()))
+        else:
+            # Queue.task_done() and Queue.join() need python 2.5, so count
+            # the directories that are queued or being processed instead
+            queue = Queue.Queue()
+            done = threading.Event()
+            self.outstanding = 1
+
+            def worker():
+                while True:
+                    path = queue.get()
+                    if path is None:
+                        return
+                    subdirs = []
+                    try:
+                        subdirs = self.process_dir(path)
+                    except Exception, e:
+                        self.lock.acquire()
+                        try:
+                            self.errors.append((path, str(e)))
+                        finally:
+                            self.lock.release()
+                    self.lock.acquire()
+                    try:
+                        self.outstanding += len(subdirs) - 1
+                        finished = self.outstanding == 0
+                    finally:
+                        self.lock.release()
+                    for subdir in subdirs:
+                        queue.put(subdir)
+                    if finished:
+                        done.set()
+
+            queue.put(self.path)
+            workers = []
+            for i in range(threads):
+                t = threading.Thread(target=worker)
+                t.setDaemon(True)
+                t.start()
+                workers.append(t)
+            done.wait()
+            for t in workers:
+                queue.put(None)
+            for t in workers:
+                t.join()
+
+        if self.errors:
+            path, msg = self.errors[0]
+            self.module.fail_json(path=path, msg='failed to set attributes of %d entries: %s' % (len(self.errors), msg),
+                                  failed_paths=[p for p, m in self.errors[:100]], recurse_stats=self.stats)
+        return self.stats
+
+def recursive_set_attributes(module, path, follow, file_args, threads=1):
+    file_args = file_args.copy()
+    file_args['path'] = path
+    return RecursiveAttributes(module, file_args, follow).run(threads)
 
 def main():
 
@@ -160,6 +426,7 @@ def main():
             diff_peek = dict(default=None), # Internal use only, for internal checks in the action plugins
             validate = dict(required=False, default=None), # Internal use only, for template and copy
             src = dict(required=False, default=None),
+            threads = dict(required=False, default=1, type='int'),
         ),
         add_file_common_args=True,
         supports_check_mode=True
@@ -317,7 +584,9 @@ def main():
         changed = module.set_fs_attributes_if_different(file_args, changed, diff)
 
         if recurse:
-            changed |= recursive_set_attributes(module, file_args['path'], follow, file_args)
+            recurse_stats = recursive_set_attributes(module, file_args['path'], follow, file_args, params['threads'])
+            changed |= recurse_stats['changed'] > 0
+            module.exit_json(path=path, changed=changed, diff=diff, recurse_stats=recurse_stats)
 
         module.exit_json(path=path, changed=changed, diff=diff)
 
@@ -21,7 +21,9 @@ version_added: "1.3"
 short_description: set/retrieve extended attributes
 description:
      - Manages filesystem user defined extended attributes, requires that they are enabled
-       on the target filesystem and that the setfattr/getfattr utilities are present.
+       on the target filesystem.
+     - The attributes are read and written in-process, through the C library;
+       the setfattr/getfattr utilities are only needed where it is not available.
 options:
   name:
     required: true
@@ -57,6 +59,22 @@ options:
     description:
       - if yes, dereferences symlinks and sets/gets attributes on symlink target,
         otherwise acts on symlink itself.
+  keys:
+    version_added: "2.1"
+    required: false
+    default: None
+    description:
+      - A dictionary of keys and values to set (C(state=present), the default when it is given) or keys
+        to remove (C(state=absent)) at once. The current attributes of every file are read once and only
+        the keys that differ are written. Incompatible with C(key) and C(value).
+  recurse:
+    version_added: "2.1"
+    required: false
+    default: no
+    choices: [ 'yes', 'no' ]
+    description:
+      - with C(state=present) or C(state=absent), also manage the attributes of everything below C(name).
+        Symlinks below C(name) are skipped.
 
 author: "Brian Coca (@bcoca)"
 '''
@@ -70,11 +88,111 @@ EXAMPLES = '''
 
 # Removes the key 'foo'
 - xattr: name=/etc/foo.conf key=user.foo state=absent
+
+# Sets several keys on a whole tree
+- xattr:
+    name: /srv/data
+    recurse: yes
+    keys:
+      user.owner: data-team
+      user.retention: 30d
 '''
 
+import base64
+import errno
 import operator
+import os
+import re
+import string
+
+# in-process access to the extended attributes, through the C library
+try:
+    import ctypes
+    import ctypes.util
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    for _name in ('getxattr', 'lgetxattr', 'listxattr', 'llistxattr'):
+        getattr(_libc, _name).restype = ctypes.c_ssize_t
+    HAVE_NATIVE_XATTR = True
+except Exception:
+    HAVE_NATIVE_XATTR = False
+
+PRINTABLE = set(string.printable) - set('\x0b\x0c')
+
+def _native_call(func, path, follow, *args):
+    ''' calls the (l)xattr function of the C library, raising OSError on failure '''
+    if isinstance(path, unicode):
+        path = path.encode('utf-8')
+    if not follow:
+        func = 'l' + func
+    result = getattr(_libc, func)(path, *args)
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), path)
+    return result
+
+def _native_read(func, path, follow, *args):
+    ''' calls a function of the C library that fills a buffer, retrying
+    while the value grows in between '''
+    while True:
+        size = _native_call(func, path, follow, *(args + (None, 0)))
+        buf = ctypes.create_string_buffer(size)
+        try:
+            size = _native_call(func, path, follow, *(args + (buf, size)))
+        except OSError, e:
+            if e.errno == errno.ERANGE:
+                continue
+            raise
+        return buf.raw[:size]
+
+def native_list(path, follow):
+    return [k for k in _native_read('listxattr', path, follow).split('\0') if k]
+
+def native_get(path, key, follow):
+    ''' returns the raw value of key, None if it is not set '''
+    try:
+        return _native_read('getxattr', path, follow, key)
+    except OSError, e:
+        if e.errno == errno.ENODATA:
+            return None
+        raise
+
+def native_set(path, key, value, follow):
+    _native_call('setxattr', path, follow, key, value, len(value), 0)
+
+def native_remove(path, key, follow):
+    try:
+        _native_call('removexattr', path, follow, key)
+    except OSError, e:
+        if e.errno != errno.ENODATA:
+            raise
+
+def encode_value(raw):
+    ''' text values are returned as is, others base64 encoded like getfattr does '''
+    for c in raw:
+        if c not in PRINTABLE:
+            return '0s' + base64.b64encode(raw)
+    return raw
+
+def decode_value(value):
+    ''' decodes a value the way setfattr does '''
+    if value.startswith('0x') or value.startswith('0X'):
+        try:
+            return value[2:].decode('hex')
+        except TypeError:
+            pass
+    elif value.startswith('0s') or value.startswith('0S'):
+        try:
+            return base64.b64decode(value[2:])
+        except TypeError:
+            pass
+    elif len(value) > 1 and value.startswith('"') and value.endswith('"'):
+        return value[1:-1]
+    return value
 
 def get_xattr_keys(module,path,follow):
+    if HAVE_NATIVE_XATTR:
+        return _run_native(module, path, lambda: dict([(k, '') for k in native_list(path, follow) if k.startswith('user.')]))
+
     cmd = [ module.get_bin_path('getfattr', True) ]
     # prevents warning and not sure why it's not default
     cmd.append('--absolute-names')
@@ -86,6 +204,20 @@ def get_xattr_keys(module,path,follow):
 
 def get_xattr(module,path,key,follow):
 
+    if HAVE_NATIVE_XATTR:
+        def read():
+            if key is None:
+                keys = [k for k in native_list(path, follow) if k.startswith('user.')]
+            else:
+                keys = [key]
+            result = {}
+            for k in keys:
+                raw = native_get(path, k, follow)
+                if raw is not None:
+                    result[k] = encode_value(raw)
+            return result
+        return _run_native(module, path, read)
+
     cmd = [ module.get_bin_path('getfattr', True) ]
     # prevents warning and not sure why it's not default
     cmd.append('--absolute-names')
@@ -101,6 +233,9 @@ def get_xattr(module,path,key,follow):
 
 def set_xattr(module,path,key,value,follow):
 
+    if HAVE_NATIVE_XATTR:
+        return _run_native(module, path, lambda: native_set(path, key, decode_value(value), follow))
+
     cmd = [ module.get_bin_path('setfattr', True) ]
     if not follow:
         cmd.append('-h')
@@ -112,6 +247,9 @@ def set_xattr(module,path,key,value,follow):
 
 def rm_xattr(module,path,key,follow):
 
+    if HAVE_NATIVE_XATTR:
+        return _run_native(module, path, lambda: native_remove(path, key, follow))
+
     cmd = [ module.get_bin_path('setfattr', True) ]
     if not follow:
         cmd.append('-h')
@@ -120,6 +258,42 @@ def rm_xattr(module,path,key,follow):
 
     return _run_xattr(module,cmd,False)
 
+def _run_native(module,path,func):
+
+    try:
+        return func()
+    except (OSError, IOError), e:
+        module.fail_json(msg="%s: %s!" % (path, e.strerror))
+
+def manage_xattrs(module,path,desired,state,follow):
+    ''' reads all the attributes of path once and sets (present) or removes
+    (absent) only the desired keys that differ; returns (changed, current) '''
+
+    current = get_xattr(module,path,None,follow)
+    changed = False
+    for key, value in desired.items():
+        if state == 'present':
+            if key in current and decode_value(current[key]) == decode_value(value):
+                continue
+            if not module.check_mode:
+                set_xattr(module,path,key,value,follow)
+        else:
+            if key not in current:
+                continue
+            if not module.check_mode:
+                rm_xattr(module,path,key,follow)
+        changed = True
+    return changed, current
+
+def walk(path):
+    ''' yields path and everything below it, except symlinks '''
+    yield path
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            fsname = os.path.join(root, name)
+            if not os.path.islink(fsname):
+                yield fsname
+
 def _run_xattr(module,cmd,check_rc=True):
 
     try:
@@ -147,14 +321,18 @@ def main():
             value = dict(required=False, default=None),
             state = dict(required=False, default='read', choices=[ 'read', 'present', 'all', 'keys', 'absent' ], type='str'),
             follow = dict(required=False, type='bool', default=True),
+            keys = dict(required=False, type='dict', default=None),
+            recurse = dict(required=False, type='bool', default=False),
         ),
         supports_check_mode=True,
     )
     path = module.params.get('name')
     key = module.params.get('key')
     value = module.params.get('value')
+    keys = module.params.get('keys')
     state = module.params.get('state')
     follow = module.params.get('follow')
+    recurse = module.params.get('recurse')
 
     if not os.path.exists(path):
         module.fail_json(msg="path not found or not accessible!")
@@ -164,30 +342,59 @@ def main():
     msg = ""
     res = {}
 
-    if key is None and state in ['present','absent']:
+    if keys is not None:
+        if key is not None or value is not None:
+            module.fail_json(msg="keys is incompatible with key and value")
+        if state == 'read':
+            state = 'present'
+        if state not in ['present','absent']:
+            module.fail_json(msg="keys requires state present or absent")
+    elif key is None and state in ['present','absent']:
         module.fail_json(msg="%s needs a key parameter" % state)
+    elif value is not None:
+        state = 'present'
+
+    if recurse and state not in ['present','absent']:
+        module.fail_json(msg="recurse requires state present or absent")
 
     # All xattr must begin in user namespace
     if key is not None and not re.match('^user\.',key):
         key = 'user.%s' % key
 
+    if state in ['present','absent']:
+        if keys is None:
+            if value is None:
+                value = ''
+            desired = {key: value}
+        else:
+            desired = {}
+            for k, v in keys.items():
+                if not re.match('^user\.',k):
+                    k = 'user.%s' % k
+                if v is None:
+                    v = ''
+                desired[k] = str(v)
+
+        if recurse:
+            paths = walk(path)
+        else:
+            paths = [path]
+        changed_paths = 0
+        for fsname in paths:
+            path_changed, current = manage_xattrs(module,fsname,desired,state,follow)
+            if path_changed:
+                changed_paths += 1
+            if fsname == path:
+                # the previous values of the managed keys of path
+                res = dict([(k, v) for k, v in current.items() if k in desired])
+        changed = changed_paths > 0
 
-    if (state == 'present' or value is not None):
-        current=get_xattr(module,path,key,follow)
-        if current is None or not key in current or value != current[key]:
-            if not module.check_mode:
-                res = set_xattr(module,path,key,value,follow)
-            changed=True
-        res=current
-        msg="%s set to %s" % (key, value)
-    elif state == 'absent':
-        current=get_xattr(module,path,key,follow)
-        if current is not None and key in current:
-            if not module.check_mode:
-                res = rm_xattr(module,path,key,follow)
-            changed=True
-        res=current
-        msg="%s removed" % (key)
+        if state == 'present':
+            msg = ', '.join(["%s set to %s" % (k, desired[k]) for k in sorted(desired)])
+        else:
+            msg = "%s removed" % ', '.join(sorted(desired))
+        if recurse:
+            msg += " on %d paths" % changed_paths
     elif state == 'keys':
         res=get_xattr_keys(module,path,follow)
         msg="returning all keys"
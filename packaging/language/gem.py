@@ -30,6 +30,9 @@ options:
   name:
     description:
       - The name of the gem to be managed.
+      - Since Ansible 2.1 this can be a list of gems, each optionally given as C(name:version). The local gems
+        are listed once for all of them and the missing ones are installed by a single C(gem install) run,
+        which requires RubyGems 2.0 or later when versions are given this way.
     required: true
   state:
     description:
@@ -84,6 +87,13 @@ options:
       - Allow adding build flags for gem compilation
     required: false
     version_added: "2.0"
+  gem_cache:
+    description:
+      - A directory of C(.gem) files to install from. The gems are installed with C(--local) from it when
+        it holds them all, otherwise from the repository, after which the installed C(.gem) files are
+        copied into it.
+    required: false
+    version_added: "2.1"
 author:
     - "Ansible Core Team"
     - "Johan Wiren"
@@ -98,9 +108,19 @@ EXAMPLES = '''
 
 # Installs rake version 1.0 from a local gem on disk.
 - gem: name=rake gem_source=/path/to/gems/rake-1.0.gem state=present
+
+# Installs several gems at once, using a local cache of .gem files.
+- gem:
+    name:
+      - rake
+      - bundler:1.10.6
+      - nokogiri
+    gem_cache: /var/cache/gems
+    user_install: no
 '''
 
 import re
+import shutil
 
 def get_rubygems_path(module):
     if module.params['executable']:
@@ -118,56 +138,114 @@ def get_rubygems_version(module):
 
     return tuple(int(x) for x in match.groups())
 
-def get_installed_versions(module, remote=False):
+def parse_gem_list(out):
+    """ parses gem list/query output into a dict of name: versions """
+    gems = {}
+    for line in out.splitlines():
+        match = re.match(r"(\S+)\s+\((.+)\)", line)
+        if match:
+            versions = []
+            for version in match.group(2).split(', '):
+                version = version.replace('default: ', '')
+                versions.append(version.split()[0])
+            gems[match.group(1)] = versions
+    return gems
+
+def get_installed_versions(module, remote=False, names=None):
+    """ returns a dict of name: versions. The local gems are all listed at
+    once; remote versions are queried for the given names in one call """
 
     cmd = get_rubygems_path(module)
-    cmd.append('query')
     if remote:
+        cmd.append('query')
         cmd.append('--remote')
         if module.params['repository']:
             cmd.extend([ '--source', module.params['repository'] ])
-    cmd.append('-n')
-    cmd.append('^%s$' % module.params['name'])
+        cmd.append('-n')
+        cmd.append('^(%s)$' % '|'.join([re.escape(name) for name in names]))
+    else:
+        cmd.append('list')
+        cmd.append('--local')
     (rc, out, err) = module.run_command(cmd, check_rc=True)
-    installed_versions = []
-    for line in out.splitlines():
-        match = re.match(r"\S+\s+\((.+)\)", line)
-        if match:
-            versions = match.group(1)
-            for version in versions.split(', '):
-                installed_versions.append(version.split()[0])
-    return installed_versions
+    return parse_gem_list(out)
 
-def exists(module):
+def get_gems(module):
+    """ returns the [name, version] of the gems to manage; gems of a list
+    can be given as name:version """
+    names = module.params['name']
+    if len(names) > 1 and module.params['version']:
+        module.fail_json(msg="Cannot specify version with multiple gems, use name:version instead")
+    if len(names) > 1 and module.params['gem_source']:
+        module.fail_json(msg="Cannot specify gem_source with multiple gems")
+    gems = []
+    for name in names:
+        version = module.params['version']
+        if ':' in name:
+            name, version = name.split(':', 1)
+        gems.append([name, version])
+    return gems
 
-    if module.params['state'] == 'latest':
-        remoteversions = get_installed_versions(module, remote=True)
-        if remoteversions:
-            module.params['version'] = remoteversions[0]
-    installed_versions = get_installed_versions(module)
-    if module.params['version']:
-        if module.params['version'] in installed_versions:
+def exists(installed, name, version):
+    installed_versions = installed.get(name, [])
+    if version:
+        if version in installed_versions:
             return True
     else:
         if installed_versions:
             return True
     return False
 
-def uninstall(module):
+def uninstall(module, gems):
 
     if module.check_mode:
         return
-    cmd = get_rubygems_path(module)
-    cmd.append('uninstall')
-    if module.params['version']:
-        cmd.extend([ '--version', module.params['version'] ])
-    else:
+    # gems removed altogether can be uninstalled in one go, a given version
+    # needs its own --version
+    names = [name for name, version in gems if not version]
+    if names:
+        cmd = get_rubygems_path(module)
+        cmd.append('uninstall')
         cmd.append('--all')
         cmd.append('--executable')
-    cmd.append(module.params['name'])
-    module.run_command(cmd, check_rc=True)
+        cmd.extend(names)
+        module.run_command(cmd, check_rc=True)
+    for name, version in gems:
+        if version:
+            cmd = get_rubygems_path(module)
+            cmd.append('uninstall')
+            cmd.extend([ '--version', version ])
+            cmd.append(name)
+            module.run_command(cmd, check_rc=True)
+
+def get_gem_dirs(module):
+    cmd = get_rubygems_path(module) + [ 'environment', 'gempath' ]
+    (rc, out, err) = module.run_command(cmd)
+    if rc != 0:
+        return []
+    return out.strip().split(os.pathsep)
+
+def update_gem_cache(module, out):
+    """ copies the .gem files of the gems reported as installed into the
+    gem_cache directory, so that they can be installed from there """
 
-def install(module):
+    installed = re.findall(r'^Successfully installed (\S+)', out, re.M)
+    if not installed:
+        return
+    gem_dirs = get_gem_dirs(module)
+    for gem in installed:
+        dest = os.path.join(module.params['gem_cache'], '%s.gem' % gem)
+        if os.path.exists(dest):
+            continue
+        for gem_dir in gem_dirs:
+            src = os.path.join(gem_dir, 'cache', '%s.gem' % gem)
+            if os.path.exists(src):
+                try:
+                    shutil.copyfile(src, dest)
+                except (IOError, OSError):
+                    pass
+                break
+
+def install(module, gems):
 
     if module.check_mode:
         return
@@ -180,8 +258,8 @@ def install(module):
 
     cmd = get_rubygems_path(module)
     cmd.append('install')
-    if module.params['version']:
-        cmd.extend([ '--version', module.params['version'] ])
+    if len(gems) == 1 and gems[0][1]:
+        cmd.extend([ '--version', gems[0][1] ])
     if module.params['repository']:
         cmd.extend([ '--source', module.params['repository'] ])
     if not module.params['include_dependencies']:
@@ -201,10 +279,31 @@ def install(module):
             cmd.append('--no-ri')
         else:
             cmd.append('--no-document')
-    cmd.append(module.params['gem_source'])
+    if len(gems) == 1:
+        if module.params['gem_source']:
+            cmd.append(module.params['gem_source'])
+        else:
+            cmd.append(gems[0][0])
+    else:
+        # all the missing gems are installed by a single gem run
+        for name, version in gems:
+            if version:
+                cmd.append('%s:%s' % (name, version))
+            else:
+                cmd.append(name)
+    build_flags = []
     if module.params['build_flags']:
-        cmd.extend([ '--', module.params['build_flags'] ])
-    module.run_command(cmd, check_rc=True)
+        build_flags = [ '--', module.params['build_flags'] ]
+
+    gem_cache = module.params['gem_cache']
+    if gem_cache and not module.params['gem_source']:
+        # try the .gem files of the cache directory first
+        (rc, out, err) = module.run_command(cmd + [ '--local' ] + build_flags, cwd=gem_cache)
+        if rc == 0:
+            return
+    (rc, out, err) = module.run_command(cmd + build_flags, check_rc=True)
+    if gem_cache:
+        update_gem_cache(module, out)
 
 def main():
 
@@ -212,8 +311,9 @@ def main():
         argument_spec = dict(
             executable           = dict(required=False, type='str'),
             gem_source           = dict(required=False, type='str'),
+            gem_cache            = dict(required=False, type='path'),
             include_dependencies = dict(required=False, default=True, type='bool'),
-            name                 = dict(required=True, type='str'),
+            name                 = dict(required=True, type='list'),
             repository           = dict(required=False, aliases=['source'], type='str'),
             state                = dict(required=False, default='present', choices=['present','absent','latest'], type='str'),
             user_install         = dict(required=False, default=True, type='bool'),
@@ -231,26 +331,45 @@ def main():
     if module.params['gem_source'] and module.params['state'] == 'latest':
         module.fail_json(msg="Cannot maintain state=latest when installing from local source")
 
-    if not module.params['gem_source']:
-        module.params['gem_source'] = module.params['name']
+    gem_cache = module.params['gem_cache']
+    if gem_cache and not os.path.isdir(gem_cache) and not module.check_mode:
+        try:
+            os.makedirs(gem_cache)
+        except OSError, e:
+            module.fail_json(msg="Could not create gem_cache %s: %s" % (gem_cache, str(e)))
 
-    changed = False
+    gems = get_gems(module)
+    if module.params['state'] == 'latest':
+        for name, version in gems:
+            if version:
+                module.fail_json(msg="Cannot specify version when state=latest")
+        remote = get_installed_versions(module, remote=True, names=[name for name, version in gems])
+        for gem in gems:
+            if remote.get(gem[0]):
+                gem[1] = remote[gem[0]][0]
+
+    # a single listing of the local gems answers for all the gems
+    installed = get_installed_versions(module)
 
     if module.params['state'] in [ 'present', 'latest']:
-        if not exists(module):
-            install(module)
-            changed = True
+        changes = [gem for gem in gems if not exists(installed, gem[0], gem[1])]
+        if changes:
+            install(module, changes)
     elif module.params['state'] == 'absent':
-        if exists(module):
-            uninstall(module)
-            changed = True
+        changes = [gem for gem in gems if exists(installed, gem[0], gem[1])]
+        if changes:
+            uninstall(module, changes)
 
     result = {}
-    result['name'] = module.params['name']
+    if len(gems) == 1:
+        result['name'] = gems[0][0]
+        if gems[0][1]:
+            result['version'] = gems[0][1]
+    else:
+        result['name'] = [name for name, version in gems]
+        result['changed_gems'] = [name for name, version in changes]
     result['state'] = module.params['state']
-    if module.params['version']:
-        result['version'] = module.params['version']
-    result['changed'] = changed
+    result['changed'] = len(changes) > 0
 
     module.exit_json(**result)
 
@@ -22,6 +22,7 @@
 import tempfile
 import re
 import os
+import pipes
 
 DOCUMENTATION = '''
 ---
@@ -114,8 +115,25 @@ options:
     version_added: "1.3"
     required: false
     default: null
+  wheelhouse:
+    description:
+      - A directory, possibly shared between hosts, holding wheels in a subdirectory per Python ABI
+        and platform (for example C(cpython-34m-linux_x86_64)).
+      - Packages are then installed with C(--no-index --find-links) from that subdirectory, so a
+        pre-seeded wheelhouse needs no network access. If pip finds no matching distribution there,
+        C(pip wheel) builds the missing wheels into it from the package index before installing again.
+      - With C(state=latest) the index is always asked for newer releases, by refreshing the wheels
+        with C(pip wheel) before installing.
+      - Not used with C(state=absent) or VCS urls. Building wheels requires the C(wheel) package.
+    version_added: "2.1"
+    required: false
+    default: null
 notes:
    - Please note that virtualenv (U(http://www.virtualenv.org/)) must be installed on the remote host if the virtualenv parameter is specified and the virtualenv needs to be initialized.
+   - Since Ansible 2.1, for C(state=present) and C(state=absent) the installed distributions are looked up in the
+     metadata of the target interpreter's site directories, and pip is not run when a plain C(name), C(name==version)
+     or a requirements file made only of those is already satisfied. Anything else is left to pip, as are
+     I(extra_args) other than index, proxy, cache and verbosity options.
 requirements: [ "virtualenv", "pip" ]
 author: "Matt Wright (@mattupstate)"
 '''
@@ -159,9 +177,55 @@ EXAMPLES = '''
 
 # Install (Bottle), forcing reinstallation if it's already installed
 - pip: name=bottle state=forcereinstall
+
+# Install requirements from wheels built once into a shared wheelhouse
+- pip: requirements=/my_app/requirements.txt virtualenv=/my_app/venv wheelhouse=/mnt/shared/wheelhouse
 '''
 
+# The options of a command only change with the binary, so they are kept
+# per binary path, size and mtime in a small cache file.
+CMD_OPTIONS_CACHE = os.path.join('~', '.ansible', 'cache', 'pip_cmd_options.json')
+
+def _load_cmd_options_cache():
+    try:
+        f = open(os.path.expanduser(CMD_OPTIONS_CACHE))
+        try:
+            cache = json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    return cache
+
+def _save_cmd_options_cache(cache):
+    path = os.path.expanduser(CMD_OPTIONS_CACHE)
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), 0700)
+        fd, tmp_path = tempfile.mkstemp('.json', '.pip_cmd_options', os.path.dirname(path))
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump(cache, f)
+        finally:
+            f.close()
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        # the cache is only an optimisation
+        pass
+
 def _get_cmd_options(module, cmd):
+    try:
+        st = os.stat(os.path.realpath(cmd))
+        key = '%s:%d:%d' % (os.path.realpath(cmd), st.st_size, int(st.st_mtime))
+    except OSError:
+        key = None
+    if key is not None:
+        cache = _load_cmd_options_cache()
+        if key in cache:
+            return cache[key]
+
     thiscmd = cmd + " --help"
     rc, stdout, stderr = module.run_command(thiscmd)
     if rc != 0:
@@ -169,6 +233,9 @@ def _get_cmd_options(module, cmd):
 
     words = stdout.strip().split()
     cmd_options = [ x for x in words if x.startswith('--') ]
+    if key is not None:
+        cache[key] = cmd_options
+        _save_cmd_options_cache(cache)
     return cmd_options
 
 
@@ -193,6 +260,211 @@ def _is_present(name, version, installed_pkgs):
 
 
 
+# pip options which only change where packages are fetched from or how much
+# pip says, so that the installed distributions can still answer whether
+# pip needs to run; any other extra_args leave that to pip. Those in the
+# first list take a value.
+_HARMLESS_VALUE_ARGS = ['-i', '--index-url', '--extra-index-url', '-f', '--find-links',
+                        '--trusted-host', '--timeout', '--retries', '--proxy', '--cert',
+                        '--client-cert', '--cache-dir', '--log']
+_HARMLESS_FLAG_ARGS = ['--no-index', '-q', '--quiet', '-v', '--verbose', '--no-cache-dir',
+                       '--disable-pip-version-check', '--isolated']
+
+_REQUIREMENT_RE = re.compile(r'^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:==\s*([A-Za-z0-9._+!-]+))?$')
+
+def _canonical_name(name):
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def _parse_requirement(line):
+    """ returns (name, version) for a plain "name" or "name==version"
+    requirement, None for anything else """
+    match = _REQUIREMENT_RE.match(line.strip())
+    if match is None:
+        return None
+    return (_canonical_name(match.group(1)), match.group(2))
+
+def _parse_requirements_file(path):
+    """ returns the list of (name, version) of a requirements file, or None
+    if it holds anything else than plain requirements (options, urls,
+    ranges, markers...) """
+    try:
+        f = open(path)
+        try:
+            data = f.read()
+        finally:
+            f.close()
+    except IOError:
+        return None
+
+    requirements = []
+    for line in data.replace('\\\n', '').splitlines():
+        line = re.sub(r'(^|\s)#.*$', '', line).strip()
+        if not line:
+            continue
+        requirement = _parse_requirement(line)
+        if requirement is None:
+            return None
+        requirements.append(requirement)
+    return requirements
+
+def _has_only_harmless_args(extra_args):
+    if not extra_args:
+        return True
+    args = extra_args.split()
+    while args:
+        arg = args.pop(0)
+        if arg in _HARMLESS_FLAG_ARGS:
+            continue
+        if arg.split('=', 1)[0] not in _HARMLESS_VALUE_ARGS:
+            return False
+        if '=' not in arg:
+            if not args:
+                return False
+            args.pop(0)
+    return True
+
+# pip output telling that a requirement could not be found, as opposed to
+# failing for any other reason
+_NOT_FOUND_MSGS = ['No matching distribution found', 'Could not find a version that satisfies',
+                   'No distributions at all found', 'Could not find any downloads that satisfy']
+
+def _is_not_found(out):
+    for msg in _NOT_FOUND_MSGS:
+        if msg in out:
+            return True
+    return False
+
+def _build_wheels(module, pip, wheel_dir, packages, path_prefix, chdir):
+    """ builds the wheels of packages missing from wheel_dir (or newer on the
+    package index) into it; returns pip's output """
+    if not os.path.isdir(wheel_dir):
+        os.makedirs(wheel_dir)
+    cmd = '%s wheel --wheel-dir %s --find-links %s%s' % (pip, pipes.quote(wheel_dir),
+                                                      pipes.quote(wheel_dir), packages)
+    rc, out, err = module.run_command(cmd, path_prefix=path_prefix, cwd=chdir)
+    if rc != 0:
+        _fail(module, cmd, out, err)
+    return out, err
+
+def _get_python(module, env, pip):
+    """ the argv of the interpreter pip runs with, from its #! line """
+    if env:
+        python = os.path.join(env, 'bin', 'python')
+        if os.path.exists(python):
+            return [python]
+    try:
+        f = open(pip)
+        try:
+            line = f.readline(256)
+        finally:
+            f.close()
+    except IOError:
+        return None
+    if not line.startswith('#!'):
+        return None
+    return line[2:].strip().split()
+
+def _read_metadata(path):
+    """ Name and Version from a METADATA or PKG-INFO file """
+    name = version = None
+    try:
+        f = open(path)
+        try:
+            for line in f:
+                if not line.strip():
+                    break
+                if line.startswith('Name:'):
+                    name = line[5:].strip()
+                elif line.startswith('Version:'):
+                    version = line[8:].strip()
+                if name and version:
+                    break
+        finally:
+            f.close()
+    except IOError:
+        pass
+    return name, version
+
+# Prints a tag naming the interpreter ABI and platform, which wheels built
+# by it are compatible with, followed by the interpreter's sys.path.
+_QUERY_PYTHON = """import sys, platform
+try:
+    from sysconfig import get_platform, get_config_var
+except ImportError:
+    from distutils.util import get_platform
+    from distutils.sysconfig import get_config_var
+abi = get_config_var('SOABI')
+if not abi:
+    abi = '%s%d%d' % (platform.python_implementation().lower(), sys.version_info[0], sys.version_info[1])
+    if sys.version_info[0] < 3 and sys.maxunicode > 0xffff:
+        abi += 'u'
+print('%s-%s' % (abi, get_platform().replace('-', '_').replace('.', '_')))
+print('\\n'.join(sys.path))
+"""
+
+def _query_python(module, python, chdir):
+    """ returns the (abi tag, sys.path) of the python interpreter, or
+    (None, None) when it cannot be queried """
+    if not python:
+        return (None, None)
+    rc, out, err = module.run_command(python + ['-c', _QUERY_PYTHON], cwd=chdir)
+    if rc != 0 or not out.strip():
+        return (None, None)
+    lines = out.splitlines()
+    return (lines[0].strip(), lines[1:])
+
+def _get_installed(paths):
+    """ index of the distributions installed in the paths of an interpreter's
+    sys.path, as a dict of canonical name: version. It is built from the
+    *.dist-info, *.egg-info and *.egg metadata, which is much cheaper than
+    running pip freeze. Returns None when the paths are not known. """
+    if paths is None:
+        return None
+
+    installed = {}
+    for path in paths:
+        if not path or not os.path.isdir(path):
+            continue
+        try:
+            entries = os.listdir(path)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.endswith('.dist-info'):
+                metadata = os.path.join(path, entry, 'METADATA')
+            elif entry.endswith('.egg-info'):
+                metadata = os.path.join(path, entry)
+                if os.path.isdir(metadata):
+                    metadata = os.path.join(metadata, 'PKG-INFO')
+            elif entry.endswith('.egg'):
+                metadata = os.path.join(path, entry, 'EGG-INFO', 'PKG-INFO')
+            else:
+                continue
+            name, version = _read_metadata(metadata)
+            if not name or not version:
+                # fall back on the Name-Version[-pyX.Y].ext directory name
+                parts = os.path.splitext(entry)[0].split('-')
+                if len(parts) < 2:
+                    continue
+                name, version = parts[0], parts[1]
+            # the first one found in sys.path is the one that is imported
+            name = _canonical_name(name)
+            if name not in installed:
+                installed[name] = version
+    return installed
+
+def _is_satisfied(state, requested, installed):
+    """ whether all the requested (name, version) are already as state wants
+    them, for the present and absent states """
+    for name, version in requested:
+        present = name in installed and (version is None or installed[name] == version)
+        if state == 'present' and not present:
+            return False
+        if state == 'absent' and name in installed:
+            return False
+    return True
+
+
 def _get_pip(module, env=None, executable=None):
     # On Debian and Ubuntu, pip is pip.
     # On Fedora18 and up, pip is python-pip.
@@ -258,6 +530,7 @@ def main():
             editable=dict(default='yes', type='bool', required=False),
             chdir=dict(default=None, required=False, type='path'),
             executable=dict(default=None, required=False),
+            wheelhouse=dict(default=None, required=False, type='path'),
         ),
         required_one_of=[['name', 'requirements']],
         mutually_exclusive=[['name', 'requirements']],
@@ -338,15 +611,50 @@ def main():
             # Ok, we will reconstruct the option string
             extra_args = ' '.join(args_list)
 
+    # Install from wheels kept in a directory per interpreter ABI: packages
+    # are only built from source once for all the hosts sharing it.
+    wheel_dir = None
+    wheelhouse = module.params['wheelhouse']
+    use_wheelhouse = wheelhouse and state != 'absent' and not has_vcs
+    use_installed = not has_vcs and _has_only_harmless_args(extra_args)
+    abi, python_paths = (None, None)
+    if use_wheelhouse or use_installed:
+        abi, python_paths = _query_python(module, _get_python(module, env, pip), chdir)
+    if use_wheelhouse:
+        if abi is None:
+            module.fail_json(msg="Could not determine the ABI of the python interpreter used by %s for the wheelhouse" % pip)
+        wheel_dir = os.path.join(wheelhouse, abi)
+        cmd += ' --no-index --find-links %s' % pipes.quote(wheel_dir)
+
+    packages = ''
     if extra_args:
-        cmd += ' %s' % extra_args
+        packages += ' %s' % extra_args
     if name:
-        cmd += ' %s' % _get_full_name(name, version)
+        packages += ' %s' % _get_full_name(name, version)
     elif requirements:
-        cmd += ' -r %s' % requirements
-
+        packages += ' -r %s' % requirements
+    cmd += packages
+
+
+    # Look the requested packages up among the installed distributions to
+    # find out whether pip needs to run at all.
+    installed = None
+    satisfied = None
+    if use_installed:
+        installed = _get_installed(python_paths)
+    if installed is not None and state in ['present', 'absent']:
+        if name:
+            requested = _parse_requirement(_get_full_name(name, version))
+            if requested is not None:
+                requested = [requested]
+        else:
+            requested = _parse_requirements_file(os.path.join(chdir, requirements))
+        if requested is not None:
+            satisfied = _is_satisfied(state, requested, installed)
 
     if module.check_mode:
+        if satisfied is not None:
+            module.exit_json(changed=not satisfied)
         if extra_args or requirements or state == 'latest' or not name:
             module.exit_json(changed=True)
         elif has_vcs:
@@ -367,13 +675,32 @@ def main():
         changed = (state == 'present' and not is_present) or (state == 'absent' and is_present) or (state == 'forcereinstall' and is_present)
         module.exit_json(changed=changed, cmd=freeze_cmd, stdout=out, stderr=err)
 
-    if requirements or has_vcs:
+    if satisfied:
+        module.exit_json(changed=False, cmd=cmd, name=name, version=version,
+                         state=state, requirements=requirements, virtualenv=env,
+                         stdout=out, stderr=err)
+
+    if (requirements and installed is None) or has_vcs:
         freeze_cmd = '%s freeze' % pip
         out_freeze_before = module.run_command(freeze_cmd, cwd=chdir)[1]
     else:
         out_freeze_before = None
 
+    if wheel_dir is not None and state == 'latest':
+        # the install itself cannot see the index, so pick newer releases
+        # up into the wheelhouse first
+        out_wheel, err_wheel = _build_wheels(module, pip, wheel_dir, packages, path_prefix, chdir)
+        out += out_wheel
+        err += err_wheel
+
     rc, out_pip, err_pip = module.run_command(cmd, path_prefix=path_prefix, cwd=chdir)
+    if rc != 0 and wheel_dir is not None and state != 'latest' and _is_not_found(out_pip + err_pip):
+        # some wheels are missing: build them into the wheelhouse from the
+        # package index and install again
+        out_wheel, err_wheel = _build_wheels(module, pip, wheel_dir, packages, path_prefix, chdir)
+        out += out_wheel
+        err += err_wheel
+        rc, out_pip, err_pip = module.run_command(cmd, path_prefix=path_prefix, cwd=chdir)
     out += out_pip
     err += err_pip
     if rc == 1 and state == 'absent' and \
@@ -384,6 +711,8 @@ def main():
 
     if state == 'absent':
         changed = 'Successfully uninstalled' in out_pip
+    elif requirements and installed is not None:
+        changed = installed != _get_installed(_query_python(module, _get_python(module, env, pip), chdir)[1])
     else:
         if out_freeze_before is None:
             changed = 'Successfully installed' in out_pip
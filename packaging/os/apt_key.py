@@ -77,6 +77,17 @@ options:
         required: false
         default: 'yes'
         choices: ['yes', 'no']
+    keys:
+        version_added: "2.1"
+        required: false
+        default: none
+        description:
+            - list of keys to add or remove at once, instead of I(id), I(url), I(data), I(file) and I(keyserver).
+            - each item is a dictionary with the I(id), I(url), I(data), I(file) and I(keyserver) keys, or a
+              string, which is a url (if it contains C(://)), a key id (if it is 8 to 40 hex digits and no such
+              file exists) or a keyfile path.
+            - the keyring is listed once, missing keys are downloaded concurrently and imported with a single
+              C(apt-key add) (and one C(apt-key adv --recv) per keyserver).
 
 '''
 
@@ -101,6 +112,15 @@ EXAMPLES = '''
 
 # Add an Apt signing key to a specific keyring file
 - apt_key: id=473041FA url=https://ftp-master.debian.org/keys/archive-key-6.0.asc keyring=/etc/apt/trusted.gpg.d/debian.gpg state=present
+
+# Add several Apt signing keys at once
+- apt_key:
+    keys:
+      - id: 473041FA
+        url: https://ftp-master.debian.org/keys/archive-key-6.0.asc
+      - https://www.postgresql.org/media/keys/ACCC4CF8.asc
+      - id: 36A1D7869245C8950F966E92D8576A8BA88D21E9
+        keyserver: keyserver.ubuntu.com
 '''
 
 
@@ -110,35 +130,51 @@ from re import compile as re_compile
 # FIXME: standardize into module_common
 from distutils.spawn import find_executable
 from os import environ
+from os.path import isfile
 from sys import exc_info
 import traceback
+import threading
+import Queue
 
 match_key = re_compile("^gpg:.*key ([0-9a-fA-F]+):.*$")
+match_key_id = re_compile("^(0x)?[0-9a-fA-F]{8,40}$")
 
 REQUIRED_EXECUTABLES=['gpg', 'grep', 'apt-key']
 
+# number of keys downloaded at the same time
+DOWNLOAD_THREADS = 4
+
+KEY_PARAMS = ['id', 'url', 'data', 'file', 'keyserver']
+
 
 def check_missing_binaries(module):
     missing = [e for e in REQUIRED_EXECUTABLES if not find_executable(e)]
     if len(missing):
         module.fail_json(msg="binaries are missing", names=missing)
 
-def all_keys(module, keyring, short_format):
+def all_keys(module, keyring):
+    """
+    Lists the keyring once and returns the set of the fingerprints, long
+    and short ids of its public keys, so that a key id of any of these
+    lengths can be looked up in it.
+    """
     if keyring:
-        cmd = "apt-key --keyring %s adv --list-public-keys --keyid-format=long" % keyring
+        cmd = "apt-key --keyring %s adv --list-public-keys --with-colons --fingerprint" % keyring
     else:
-        cmd = "apt-key adv --list-public-keys --keyid-format=long"
+        cmd = "apt-key adv --list-public-keys --with-colons --fingerprint"
     (rc, out, err) = module.run_command(cmd)
-    results = []
-    lines = out.split('\n')
-    for line in lines:
-        if line.startswith("pub"):
-            tokens = line.split()
-            code = tokens[1]
-            (len_type, real_code) = code.split("/")
-            results.append(real_code)
-    if short_format:
-        results = shorten_key_ids(results)
+    results = set()
+    record = None
+    for line in out.split('\n'):
+        fields = line.split(':')
+        if fields[0] in ('pub', 'sub'):
+            record = fields[0]
+            if record == 'pub' and len(fields) > 4 and fields[4]:
+                long_id = fields[4].upper()
+                results.add(long_id)
+                results.update(shorten_key_ids([long_id]))
+        elif fields[0] == 'fpr' and record == 'pub' and len(fields) > 9:
+            results.add(fields[9].upper())
     return results
 
 def shorten_key_ids(key_id_list):
@@ -151,22 +187,75 @@ def shorten_key_ids(key_id_list):
         short.append(key[-8:])
     return short
 
-def download_key(module, url):
-    # FIXME: move get_url code to common, allow for in-memory D/L, support proxies
-    # and reuse here
-    if url is None:
-        module.fail_json(msg="needed a URL but was not specified")
+class DownloadError(Exception):
+    pass
 
-    try:
-        rsp, info = fetch_url(module, url)
-        if info['status'] != 200:
-            module.fail_json(msg="Failed to download key at %s: %s" % (url, info['msg']))
+class DownloadModule(object):
+    """
+    Stands in for the module in fetch_url from the download threads:
+    fail_json raises DownloadError there instead of printing a result and
+    exiting from a thread.
+    """
+    def __init__(self, module):
+        self.module = module
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+    def fail_json(self, msg='', **kwargs):
+        raise DownloadError(msg)
 
-        return rsp.read()
-    except Exception:
-        module.fail_json(msg="error getting key id from url: %s" % url, traceback=format_exc())
+def download_keys(module, urls):
+    """
+    Downloads the keys at urls from at most DOWNLOAD_THREADS threads.
+    Returns a dict of url to key data; fails if any download failed.
+    """
+    results = {}
+    failed = []
+    lock = threading.Lock()
+    download_module = DownloadModule(module)
+
+    def worker(queue):
+        while True:
+            try:
+                url = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                rsp, info = fetch_url(download_module, url)
+                if info['status'] != 200:
+                    result, error = None, "Failed to download key at %s: %s" % (url, info['msg'])
+                else:
+                    result, error = rsp.read(), None
+            except Exception, e:
+                result, error = None, "error getting key id from url: %s: %s" % (url, str(e))
+            lock.acquire()
+            try:
+                if error:
+                    failed.append(error)
+                else:
+                    results[url] = result
+            finally:
+                lock.release()
+
+    queue = Queue.Queue()
+    for url in urls:
+        queue.put(url)
+    workers = []
+    for i in range(min(DOWNLOAD_THREADS, len(urls))):
+        t = threading.Thread(target=worker, args=(queue,))
+        t.start()
+        workers.append(t)
+    for t in workers:
+        t.join()
+
+    if failed:
+        module.fail_json(msg="; ".join(failed))
+    return results
 
 def import_key(module, keyserver, key_id):
+    if isinstance(key_id, list):
+        key_id = " ".join(key_id)
     cmd = "apt-key adv --keyserver %s --recv %s" % (keyserver, key_id)
     (rc, out, err) = module.run_command(cmd, check_rc=True)
     return True
@@ -195,6 +284,102 @@ def remove_key(module, key_id, keyring):
     (rc, out, err) = module.run_command(cmd, check_rc=True)
     return True
 
+def normalize_key_id(module, key_id):
+    # we use the "short" id: key_id[-8:]
+    # it's a workaround for https://bugs.launchpad.net/ubuntu/+source/apt/+bug/1481871
+    try:
+        _ = int(key_id, 16)
+        if key_id.startswith('0x'):
+            key_id = key_id[2:]
+        return key_id.upper()[-8:]
+    except ValueError:
+        module.fail_json(msg="Invalid key_id", id=key_id)
+
+def get_keys_params(module):
+    """
+    Returns the list of keys to manage, each a dict of KEY_PARAMS, from
+    the keys option or from the single key options.
+    """
+    if module.params['keys'] is None:
+        items = [dict((param, module.params[param]) for param in KEY_PARAMS)]
+    else:
+        items = module.params['keys']
+
+    keys = []
+    for item in items:
+        if isinstance(item, dict):
+            unsupported = set(item) - set(KEY_PARAMS)
+            if unsupported:
+                module.fail_json(msg="unsupported key parameters: %s" % ", ".join(sorted(unsupported)))
+            key = dict((param, item.get(param)) for param in KEY_PARAMS)
+        else:
+            key = dict.fromkeys(KEY_PARAMS)
+            if '://' in item:
+                key['url'] = item
+            elif match_key_id.match(item) and not isfile(item):
+                key['id'] = item
+            else:
+                key['file'] = item
+        if key['id']:
+            key['id'] = normalize_key_id(module, str(key['id']))
+        keys.append(key)
+    return keys
+
+def key_name(key):
+    for param in ('id', 'url', 'file'):
+        if key[param]:
+            return key[param]
+    return 'data'
+
+def add_keys(module, keys, keyring):
+    """
+    Imports keys with a single apt-key add per key format (armored or
+    binary) and a single apt-key adv --recv per keyserver; the keys at
+    urls are downloaded concurrently first.
+    """
+    urls = []
+    for key in keys:
+        if not key['file'] and key['data'] is None and not key['keyserver']:
+            if not key['url']:
+                module.fail_json(msg="needed a URL but was not specified")
+            if key['url'] not in urls:
+                urls.append(key['url'])
+        if key['keyserver'] and not key['id']:
+            module.fail_json(msg="key id is required to import from a keyserver", keyserver=key['keyserver'])
+    downloaded = download_keys(module, urls)
+
+    armored = []
+    binary = []
+    keyservers = {}
+    for key in keys:
+        if key['keyserver']:
+            keyservers.setdefault(key['keyserver'], []).append(key['id'])
+            continue
+        if key['file']:
+            try:
+                f = open(key['file'], 'rb')
+                try:
+                    data = f.read()
+                finally:
+                    f.close()
+            except IOError, e:
+                module.fail_json(msg="error reading keyfile %s: %s" % (key['file'], str(e)))
+        elif key['data'] is not None:
+            data = key['data']
+        else:
+            data = downloaded[key['url']]
+        if data.lstrip().startswith('-----BEGIN'):
+            armored.append(data.strip())
+        else:
+            binary.append(data)
+
+    if armored:
+        add_key(module, "-", keyring, '\n'.join(armored) + '\n')
+    if binary:
+        add_key(module, "-", keyring, ''.join(binary))
+    for keyserver, key_ids in sorted(keyservers.items()):
+        import_key(module, keyserver, key_ids)
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -203,77 +388,60 @@ def main():
             data=dict(required=False),
             file=dict(required=False),
             key=dict(required=False),
+            keys=dict(required=False, type='list'),
             keyring=dict(required=False),
             validate_certs=dict(default='yes', type='bool'),
             keyserver=dict(required=False),
             state=dict(required=False, choices=['present', 'absent'], default='present')
         ),
+        mutually_exclusive=[['keys', param] for param in KEY_PARAMS],
         supports_check_mode=True
     )
 
-    key_id          = module.params['id']
-    url             = module.params['url']
-    data            = module.params['data']
-    filename        = module.params['file']
     keyring         = module.params['keyring']
     state           = module.params['state']
-    keyserver       = module.params['keyserver']
+    batch           = module.params['keys'] is not None
     changed         = False
 
-    # we use the "short" id: key_id[-8:], short_format=True
-    # it's a workaround for https://bugs.launchpad.net/ubuntu/+source/apt/+bug/1481871
-
-    if key_id:
-        try:
-            _ = int(key_id, 16)
-            if key_id.startswith('0x'):
-                key_id = key_id[2:]
-            key_id = key_id.upper()[-8:]
-        except ValueError:
-            module.fail_json(msg="Invalid key_id", id=key_id)
+    keys = get_keys_params(module)
 
     # FIXME: I think we have a common facility for this, if not, want
     check_missing_binaries(module)
 
-    short_format = True
-    keys = all_keys(module, keyring, short_format)
+    index = all_keys(module, keyring)
     return_values = {}
 
     if state == 'present':
-        if key_id and key_id in keys:
-            module.exit_json(changed=False)
-        else:
-            if not filename and not data and not keyserver:
-                data = download_key(module, url)
-            if key_id and key_id in keys:
-                module.exit_json(changed=False)
-            else:
-                if module.check_mode:
-                    module.exit_json(changed=True)
-                if filename:
-                    add_key(module, filename, keyring)
-                elif keyserver:
-                    import_key(module, keyserver, key_id)
-                else:
-                    add_key(module, "-", keyring, data)
-                changed=False
-                keys2 = all_keys(module, keyring, short_format)
-                if len(keys) != len(keys2):
-                    changed=True
-                if key_id and not key_id in keys2:
-                    module.fail_json(msg="key does not seem to have been added", id=key_id)
-                module.exit_json(changed=changed)
+        missing = [key for key in keys if not (key['id'] and key['id'] in index)]
+        if batch:
+            return_values['changed_keys'] = [key_name(key) for key in missing]
+        if not missing:
+            module.exit_json(changed=False, **return_values)
+        if module.check_mode:
+            module.exit_json(changed=True, **return_values)
+        add_keys(module, missing, keyring)
+        index2 = all_keys(module, keyring)
+        changed = index != index2
+        not_added = [key['id'] for key in missing if key['id'] and key['id'] not in index2]
+        if not_added:
+            if batch:
+                module.fail_json(msg="keys do not seem to have been added", ids=not_added)
+            module.fail_json(msg="key does not seem to have been added", id=not_added[0])
     elif state == 'absent':
-        if not key_id:
+        if [key for key in keys if not key['id']]:
             module.fail_json(msg="key is required")
-        if key_id in keys:
+        present = [key['id'] for key in keys if key['id'] in index]
+        if batch:
+            return_values['changed_keys'] = present
+        if present:
             if module.check_mode:
-                module.exit_json(changed=True)
-            if remove_key(module, key_id, keyring):
-                changed=True
-            else:
-                # FIXME: module.fail_json  or exit-json immediately at point of failure
-                module.fail_json(msg="error removing key_id", **return_values)
+                module.exit_json(changed=True, **return_values)
+            for key_id in present:
+                if remove_key(module, key_id, keyring):
+                    changed=True
+                else:
+                    # FIXME: module.fail_json  or exit-json immediately at point of failure
+                    module.fail_json(msg="error removing key_id", **return_values)
 
     module.exit_json(changed=changed, **return_values)
 
@@ -52,6 +52,9 @@ options:
     update_cache:
         description:
             - Run the equivalent of C(apt-get update) when a change occurs.  Cache updates are run after making changes.
+            - When sources were added, only the indexes of the sources in the modified files are fetched and the
+              indexes of the other sources are kept. When a source was removed, all indexes are updated, so
+              that apt drops those of the removed source.
         required: false
         default: "yes"
         choices: [ "yes", "no" ]
@@ -137,6 +140,8 @@ class SourcesList(object):
     def __init__(self, module):
         self.module = module
         self.files = {}  # group sources by file
+        self.dirty = set()  # files modified since they were loaded
+        self.removed = False  # whether any source was removed
         # Repositories that we're adding -- used to implement mode param
         self.new_repos = set()
         self.default_file = self._apt_cfg_file('Dir::Etc::sourcelist')
@@ -229,6 +234,27 @@ class SourcesList(object):
             result = apt_pkg.Config.FindFile(filespec)
         return result
 
+    @staticmethod
+    def _apt_cfg_find(key):
+        '''
+        Wrapper for `apt_pkg` module for running with Python 2.5
+        '''
+        try:
+            result = apt_pkg.config.find(key)
+        except AttributeError:
+            result = apt_pkg.Config.Find(key)
+        return result
+
+    @staticmethod
+    def _apt_cfg_set(key, value):
+        '''
+        Wrapper for `apt_pkg` module for running with Python 2.5
+        '''
+        try:
+            apt_pkg.config.set(key, value)
+        except AttributeError:
+            apt_pkg.Config.Set(key, value)
+
     @staticmethod
     def _apt_cfg_dir(dirspec):
         '''
@@ -249,7 +275,10 @@ class SourcesList(object):
         self.files[file] = group
 
     def save(self):
+        # only the files that were modified are written back
         for filename, sources in self.files.items():
+            if filename not in self.dirty:
+                continue
             if sources:
                 d, fn = os.path.split(filename)
                 fd, tmp_path = tempfile.mkstemp(prefix=".%s-" % fn, dir=d)
@@ -281,6 +310,48 @@ class SourcesList(object):
                 if os.path.exists(filename):
                     os.remove(filename)
 
+    def update_cache(self):
+        '''
+        Fetch the indexes of the sources of the modified files only, by
+        pointing Dir::Etc::sourcelist and Dir::Etc::sourceparts at them, and
+        merge them into the existing cache: list cleanup is disabled so the
+        indexes of the other sources are kept.
+
+        After a removal the whole cache is updated instead, as only a full
+        update with list cleanup drops the indexes of the removed sources.
+        '''
+        if self.removed:
+            apt.Cache().update()
+            return
+        changed = [f for f in self.dirty if self.files.get(f) and os.path.exists(f)]
+        if not changed:
+            return
+
+        overrides = {
+            'Dir::Etc::sourcelist': os.devnull,
+            'APT::List-Cleanup': '0',
+        }
+        parts_dir = tempfile.mkdtemp(prefix='.ansible_apt_repository-')
+        try:
+            for n, filename in enumerate(sorted(changed)):
+                os.symlink(os.path.abspath(filename), os.path.join(parts_dir, '%02d-%s' % (n, os.path.basename(filename))))
+            overrides['Dir::Etc::sourceparts'] = parts_dir
+
+            saved = {}
+            for key, value in overrides.items():
+                saved[key] = self._apt_cfg_find(key)
+                self._apt_cfg_set(key, value)
+            try:
+                cache = apt.Cache()
+                cache.update()
+            finally:
+                for key, value in saved.items():
+                    self._apt_cfg_set(key, value)
+        finally:
+            for link in os.listdir(parts_dir):
+                os.remove(os.path.join(parts_dir, link))
+            os.rmdir(parts_dir)
+
     def dump(self):
         return '\n'.join([str(i) for i in self])
 
@@ -295,7 +366,10 @@ class SourcesList(object):
         If source, enabled, or comment is None, original value from line ``n`` will be preserved.
         '''
         valid, enabled_old, source_old, comment_old = self.files[file][n][1:]
-        self.files[file][n] = (n, valid, self._choice(enabled, enabled_old), self._choice(source, source_old), self._choice(comment, comment_old))
+        new = (n, valid, self._choice(enabled, enabled_old), self._choice(source, source_old), self._choice(comment, comment_old))
+        if new != self.files[file][n]:
+            self.files[file][n] = new
+            self.dirty.add(file)
 
     def _add_valid_source(self, source_new, comment_new, file):
         # We'll try to reuse disabled source if we have it.
@@ -318,6 +392,7 @@ class SourcesList(object):
             files = self.files[file]
             files.append((len(files), True, True, source_new, comment_new))
             self.new_repos.add(file)
+            self.dirty.add(file)
 
     def add_source(self, line, comment='', file=None):
         source = self._parse(line, raise_if_invalid_or_disabled=True)[2]
@@ -330,6 +405,8 @@ class SourcesList(object):
         for filename, n, enabled, src, comment in self:
             if source == src and enabled:
                 self.files[filename].pop(n)
+                self.dirty.add(filename)
+                self.removed = True
 
     def remove_source(self, line):
         source = self._parse(line, raise_if_invalid_or_disabled=True)[2]
@@ -478,8 +555,7 @@ def main():
         try:
             sourceslist.save()
             if update_cache:
-                cache = apt.Cache()
-                cache.update()
+                sourceslist.update_cache()
         except OSError, err:
             module.fail_json(msg=unicode(err))
 
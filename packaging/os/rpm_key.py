@@ -34,6 +34,8 @@ options:
       aliases: []
       description:
           - Key that will be modified. Can be a url, a file, or a keyid if the key already exists in the database.
+          - Since 2.1 this can be a list of keys; the rpm db is queried once, the keys at urls are downloaded
+            concurrently and all missing keys are imported (or removed) with a single rpm invocation.
     state:
       required: false
       default: "present"
@@ -59,74 +61,161 @@ EXAMPLES = '''
 
 # Example action to ensure a key is not present in the db
 - rpm_key: state=absent key=DEADB33F
+
+# Example action to import several keys at once
+- rpm_key:
+    state: present
+    key:
+      - http://apt.sw.be/RPM-GPG-KEY.dag.txt
+      - https://dl.fedoraproject.org/pub/epel/RPM-GPG-KEY-EPEL-7
+      - /path/to/key.gpg
 '''
 import re
 import os.path
 import urllib2
 import tempfile
+import threading
+import Queue
+
+# number of keys downloaded at the same time
+DOWNLOAD_THREADS = 4
 
 def is_pubkey(string):
     """Verifies if string is a pubkey"""
     pgp_regex = ".*?(-----BEGIN PGP PUBLIC KEY BLOCK-----.*?-----END PGP PUBLIC KEY BLOCK-----).*"
     return re.match(pgp_regex, string, re.DOTALL)
 
+class DownloadError(Exception):
+    pass
+
+class DownloadModule(object):
+    """Stands in for the module in fetch_url from the download threads:
+    fail_json raises DownloadError there instead of printing a result and
+    exiting from a thread"""
+
+    def __init__(self, module):
+        self.module = module
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+    def fail_json(self, msg='', **kwargs):
+        raise DownloadError(msg)
+
+
 class RpmKey:
 
     def __init__(self, module):
         # If the key is a url, we need to check if it's present to be idempotent,
         # to do that, we need to check the keyid, which we can get from the armor.
-        keyfile = None
-        should_cleanup_keyfile = False
         self.module = module
         self.rpm = self.module.get_bin_path('rpm', True)
         state = module.params['state']
-        key = module.params['key']
-
-        if '://' in key:
-            keyfile = self.fetch_key(key)
-            keyid = self.getkeyid(keyfile)
-            should_cleanup_keyfile = True
-        elif self.is_keyid(key):
-            keyid = key
-        elif os.path.isfile(key):
-            keyfile = key
-            keyid = self.getkeyid(keyfile)
-        else:
-            self.module.fail_json(msg="Not a valid key %s" % key)
-        keyid = self.normalize_keyid(keyid)
+        keys = module.params['key']
 
-        if state == 'present':
-            if self.is_key_imported(keyid):
-                module.exit_json(changed=False)
+        urls = [key for key in keys if '://' in key]
+        keyfiles = self.fetch_keys(urls)
+        cleanup = list(keyfiles.values())
+
+        keyids = []
+        for key in keys:
+            keyfile = None
+            if '://' in key:
+                keyfile = keyfiles[key]
+                keyid = self.getkeyid(keyfile)
+            elif self.is_keyid(key):
+                keyid = key
+            elif os.path.isfile(key):
+                keyfile = key
+                keyid = self.getkeyid(keyfile)
             else:
+                self.cleanup(cleanup)
+                self.module.fail_json(msg="Not a valid key %s" % key)
+            keyids.append((self.normalize_keyid(keyid), keyfile))
+
+        imported = self.imported_keys()
+        changed = []
+        if state == 'present':
+            keyfiles = []
+            for keyid, keyfile in keyids:
+                if keyid in imported or keyid in changed:
+                    continue
                 if not keyfile:
+                    self.cleanup(cleanup)
                     self.module.fail_json(msg="When importing a key, a valid file must be given")
-                self.import_key(keyfile, dryrun=module.check_mode)
-                if should_cleanup_keyfile:
-                    self.module.cleanup(keyfile)
-                module.exit_json(changed=True)
+                changed.append(keyid)
+                keyfiles.append(keyfile)
+            if keyfiles:
+                self.import_key(keyfiles, dryrun=module.check_mode)
         else:
-            if self.is_key_imported(keyid):
-                self.drop_key(keyid, dryrun=module.check_mode)
-                module.exit_json(changed=True)
-            else:
-                module.exit_json(changed=False)
-
-
-    def fetch_key(self, url):
-        """Downloads a key from url, returns a valid path to a gpg key"""
-        try:
-            rsp, info = fetch_url(self.module, url)
-            key = rsp.read()
-            if not is_pubkey(key):
-                self.module.fail_json(msg="Not a public key: %s" % url)
-            tmpfd, tmpname = tempfile.mkstemp()
-            tmpfile = os.fdopen(tmpfd, "w+b")
-            tmpfile.write(key)
-            tmpfile.close()
-            return tmpname
-        except urllib2.URLError, e:
-            self.module.fail_json(msg=str(e))
+            for keyid, keyfile in keyids:
+                if keyid in imported and keyid not in changed:
+                    changed.append(keyid)
+            if changed:
+                self.drop_key(changed, dryrun=module.check_mode)
+        self.cleanup(cleanup)
+        module.exit_json(changed=bool(changed), changed_keys=changed)
+
+    def cleanup(self, keyfiles):
+        for keyfile in keyfiles:
+            self.module.cleanup(keyfile)
+
+    def fetch_keys(self, urls):
+        """Downloads the keys at urls from at most DOWNLOAD_THREADS threads,
+        returns a dict of url to a valid path to a gpg key"""
+        results = {}
+        failed = []
+        lock = threading.Lock()
+
+        def worker(queue):
+            while True:
+                try:
+                    url = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    result, error = self.download_key(url), None
+                except Exception, e:
+                    result, error = None, str(e)
+                lock.acquire()
+                try:
+                    if error:
+                        failed.append(error)
+                    else:
+                        results[url] = result
+                finally:
+                    lock.release()
+
+        queue = Queue.Queue()
+        for url in set(urls):
+            queue.put(url)
+        workers = []
+        for i in range(min(DOWNLOAD_THREADS, queue.qsize())):
+            t = threading.Thread(target=worker, args=(queue,))
+            t.start()
+            workers.append(t)
+        for t in workers:
+            t.join()
+
+        if failed:
+            self.cleanup(results.values())
+            self.module.fail_json(msg="; ".join(failed))
+        return results
+
+    def download_key(self, url):
+        """Downloads a key from url, returns a valid path to a gpg key;
+        raises an exception instead of failing as it runs in a worker thread"""
+        rsp, info = fetch_url(DownloadModule(self.module), url)
+        if rsp is None:
+            raise urllib2.URLError("Failed to download key at %s: %s" % (url, info['msg']))
+        key = rsp.read()
+        if not is_pubkey(key):
+            raise ValueError("Not a public key: %s" % url)
+        tmpfd, tmpname = tempfile.mkstemp()
+        tmpfile = os.fdopen(tmpfd, "w+b")
+        tmpfile.write(key)
+        tmpfile.close()
+        return tmpname
 
     def normalize_keyid(self, keyid):
         """Ensure a keyid doesn't have a leading 0x, has leading or trailing whitespace, and make sure is lowercase"""
@@ -166,8 +255,10 @@ class RpmKey:
             self.module.fail_json(msg=stderr)
         return stdout, stderr
 
-    def is_key_imported(self, keyid):
+    def imported_keys(self):
+        """Returns the set of the keyids imported in the rpm db"""
         stdout, stderr = self.execute_command([self.rpm, '-qa', 'gpg-pubkey'])
+        keyids = set()
         for line in stdout.splitlines():
             line = line.strip()
             if not line:
@@ -176,24 +267,27 @@ class RpmKey:
             if not match:
                 self.module.fail_json(msg="rpm returned unexpected output [%s]" % line)
             else:
-                if keyid == match.group(1):
-                    return True
-        return False
+                keyids.add(match.group(1))
+        return keyids
 
-    def import_key(self, keyfile, dryrun=False):
+    def import_key(self, keyfiles, dryrun=False):
+        if isinstance(keyfiles, basestring):
+            keyfiles = [keyfiles]
         if not dryrun:
-            self.execute_command([self.rpm, '--import', keyfile])
+            self.execute_command([self.rpm, '--import'] + keyfiles)
 
-    def drop_key(self, key, dryrun=False):
+    def drop_key(self, keys, dryrun=False):
+        if isinstance(keys, basestring):
+            keys = [keys]
         if not dryrun:
-            self.execute_command([self.rpm, '--erase', '--allmatches', "gpg-pubkey-%s" % key])
+            self.execute_command([self.rpm, '--erase', '--allmatches'] + ["gpg-pubkey-%s" % key for key in keys])
 
 
 def main():
     module = AnsibleModule(
             argument_spec = dict(
                 state=dict(default='present', choices=['present', 'absent'], type='str'),
-                key=dict(required=True, type='str'),
+                key=dict(required=True, type='list'),
                 validate_certs=dict(default='yes', type='bool'),
                 ),
             supports_check_mode=True
@@ -32,13 +32,34 @@ options:
   user:
     description:
       - The username on the remote host whose authorized_keys file will be modified
-    required: true
+      - Required unless I(key_dir) is given.
+    required: false
     default: null
   key:
     description:
       - The SSH public key(s), as a string or (since 1.9) url (https://github.com/username.keys)
-    required: true
+      - Since 2.1 this may also be a list of keys.
+      - Required unless I(key_file) or I(key_dir) is given.
+    required: false
+    default: null
+  key_file:
+    description:
+      - Path to a file on the remote host holding SSH public keys, one per line, to add or remove
+        in addition to those in I(key).
+      - The authorized_keys file is read once and written at most once for all the keys, so this is
+        much faster than looping over the keys with C(with_items).
+    required: false
+    default: null
+    version_added: "2.1"
+  key_dir:
+    description:
+      - Path to a directory on the remote host with one file of SSH public keys per user, named after the
+        user (optionally with a C(.pub) suffix). The keys of every user in the directory are managed in
+        one pass, using the other options of the task.
+      - Mutually exclusive with I(user), I(key), I(key_file) and I(path).
+    required: false
     default: null
+    version_added: "2.1"
   path:
     description:
       - Alternate path to the authorized_keys file
@@ -128,6 +149,12 @@ EXAMPLES = '''
 - authorized_key: user=root key="{{ item }}" state=present exclusive=yes
   with_file:
     - public_keys/doe-jane
+
+# Set up authorized_keys exclusively with a whole team's keys in one pass
+- authorized_key: user=deploy key_file=/etc/ssh/team_keys exclusive=yes
+
+# Give every user with a file in /srv/keys exactly the keys in that file
+- authorized_key: key_dir=/srv/keys exclusive=yes
 '''
 
 # Makes sure the public key line is present or absent in the user's .ssh/authorized_keys.
@@ -160,8 +187,12 @@ class keydict(dict):
         super(keydict,self).__init__(*args, **kw)
         self.itemlist = super(keydict,self).keys()
     def __setitem__(self, key, value):
-        self.itemlist.append(key)
+        if key not in self:
+            self.itemlist.append(key)
         super(keydict,self).__setitem__(key, value)
+    def __delitem__(self, key):
+        self.itemlist.remove(key)
+        super(keydict,self).__delitem__(key)
     def __iter__(self):
         return iter(self.itemlist)
     def keys(self):
@@ -170,6 +201,8 @@ class keydict(dict):
         return [self[key] for key in self]
     def itervalues(self):
         return (self[key] for key in self)
+    def items(self):
+        return [(key, self[key]) for key in self]
 
 def keyfile(module, user, write=False, path=None, manage_dir=True):
     """
@@ -312,11 +345,16 @@ def parsekey(module, raw_key):
     return (key, key_type, options, comment)
 
 def readkeys(module, filename):
+    """
+    Parse an authorized_keys file into a map indexed by the key itself,
+    keeping the order of the lines so that rewriting the file does not
+    shuffle them
+    """
 
     if not os.path.isfile(filename):
-        return {}
+        return keydict()
 
-    keys = {}
+    keys = keydict()
     f = open(filename)
     for line in f.readlines():
         key_data = parsekey(module, line)
@@ -358,21 +396,16 @@ def writekeys(module, filename, keys):
     f.close()
     module.atomic_move(tmp_path, filename)
 
-def enforce_state(module, params):
+def getkeys(module, key):
     """
-    Add or remove key.
+    Return the list of key lines in key, which may be a string of
+    newline separated keys, a list of keys or a url to fetch them from.
     """
-
-    user        = params["user"]
-    key         = params["key"]
-    path        = params.get("path", None)
-    manage_dir  = params.get("manage_dir", True)
-    state       = params.get("state", "present")
-    key_options = params.get("key_options", None)
-    exclusive   = params.get("exclusive", False)
-    validate_certs = params.get("validate_certs", True)
     error_msg   = "Error getting key from: %s"
 
+    if isinstance(key, list):
+        key = "\n".join(key)
+
     # if the key is a url, request it and use it as key source
     if key.startswith("http"):
         try:
@@ -385,17 +418,41 @@ def enforce_state(module, params):
             module.fail_json(msg=error_msg % key)
 
     # extract individual keys into an array, skipping blank lines and comments
-    key = [s for s in key.splitlines() if s and not s.startswith('#')]
+    return [s for s in key.splitlines() if s and not s.startswith('#')]
+
+def readkeyfile(module, filename):
+    """ Return the key lines of a file of keys on the remote host """
+    try:
+        f = open(filename)
+        try:
+            return getkeys(module, f.read())
+        finally:
+            f.close()
+    except IOError, e:
+        module.fail_json(msg="Failed to read key file %s: %s" % (filename, str(e)))
+
+def enforce_keys(module, user, key, path, manage_dir, state, key_options, exclusive):
+    """
+    Add or remove all the keys in the list key for user. The authorized_keys
+    file is parsed once into a map indexed by the key itself, all additions
+    and removals are applied to that map and the file is written at most
+    once. Returns the path of the file and whether it changed (or would
+    have, in check mode).
+    """
 
     # check current state -- just get the filename, don't create file
     do_write = False
-    params["keyfile"] = keyfile(module, user, do_write, path, manage_dir)
-    existing_keys = readkeys(module, params["keyfile"])
+    filename = keyfile(module, user, do_write, path, manage_dir)
+    existing_keys = readkeys(module, filename)
 
     # Add a place holder for keys that should exist in the state=present and
     # exclusive=true case
     keys_to_exist = []
 
+    parsed_options = None
+    if key_options is not None:
+        parsed_options = parseoptions(module, key_options)
+
     # Check our new keys, if any of them exist we'll continue.
     for new_key in key:
         parsed_new_key = parsekey(module, new_key)
@@ -403,8 +460,7 @@ def enforce_state(module, params):
         if not parsed_new_key:
             module.fail_json(msg="invalid key specified: %s" % new_key)
 
-        if key_options is not None:
-            parsed_options = parseoptions(module, key_options)
+        if parsed_options is not None:
             parsed_new_key = (parsed_new_key[0], parsed_new_key[1], parsed_options, parsed_new_key[3])
 
         present = False
@@ -450,23 +506,71 @@ def enforce_state(module, params):
             del existing_keys[key]
             do_write = True
 
-    if do_write:
-        if module.check_mode:
-            module.exit_json(changed=True)
-        writekeys(module, keyfile(module, user, do_write, path, manage_dir), existing_keys)
-        params['changed'] = True
-    else:
-        if module.check_mode:
-            module.exit_json(changed=False)
+    if do_write and not module.check_mode:
+        filename = keyfile(module, user, do_write, path, manage_dir)
+        writekeys(module, filename, existing_keys)
+    return filename, do_write
+
+def enforce_state(module, params):
+    """
+    Add or remove key.
+    """
+
+    user        = params["user"]
+    key         = params["key"]
+    key_file    = params.get("key_file", None)
+    path        = params.get("path", None)
+    manage_dir  = params.get("manage_dir", True)
+    state       = params.get("state", "present")
+    key_options = params.get("key_options", None)
+    exclusive   = params.get("exclusive", False)
 
+    keys = []
+    if key:
+        keys.extend(getkeys(module, key))
+    if key_file:
+        keys.extend(readkeyfile(module, os.path.expanduser(key_file)))
+
+    params["keyfile"], params["changed"] = enforce_keys(module, user, keys, path, manage_dir,
+                                                        state, key_options, exclusive)
     return params
 
+def enforce_key_dir(module, params):
+    """
+    Manage the authorized keys of every user that has a file of keys in
+    key_dir, named after the user (optionally with a .pub suffix).
+    """
+
+    key_dir = os.path.expanduser(params["key_dir"])
+    if not os.path.isdir(key_dir):
+        module.fail_json(msg="key_dir %s is not a directory" % key_dir)
+
+    results = {}
+    for name in sorted(os.listdir(key_dir)):
+        filename = os.path.join(key_dir, name)
+        if name.startswith('.') or not os.path.isfile(filename):
+            continue
+        user = name
+        if user.endswith('.pub'):
+            user = user[:-len('.pub')]
+        keys = readkeyfile(module, filename)
+        results[user] = enforce_keys(module, user, keys, None,
+                                     params["manage_dir"], params["state"],
+                                     params["key_options"], params["exclusive"])[1]
+
+    changed = False
+    for user_changed in results.values():
+        changed = changed or user_changed
+    return dict(changed=changed, key_dir=key_dir, results=results)
+
 def main():
 
     module = AnsibleModule(
         argument_spec = dict(
-           user        = dict(required=True, type='str'),
-           key         = dict(required=True, type='str'),
+           user        = dict(required=False, type='str'),
+           key         = dict(required=False),
+           key_file    = dict(required=False, type='str'),
+           key_dir     = dict(required=False, type='str'),
            path        = dict(required=False, type='str'),
            manage_dir  = dict(required=False, type='bool', default=True),
            state       = dict(default='present', choices=['absent','present']),
@@ -475,10 +579,18 @@ def main():
            exclusive   = dict(default=False, type='bool'),
            validate_certs = dict(default=True, type='bool'),
         ),
+        required_one_of=[['key', 'key_file', 'key_dir']],
+        mutually_exclusive=[['key_dir', 'user'], ['key_dir', 'key'],
+                            ['key_dir', 'key_file'], ['key_dir', 'path']],
         supports_check_mode=True
     )
 
-    results = enforce_state(module, module.params)
+    if module.params['key_dir']:
+        results = enforce_key_dir(module, module.params)
+    else:
+        if not module.params['user']:
+            module.fail_json(msg="user is required unless key_dir is given")
+        results = enforce_state(module, module.params)
     module.exit_json(**results)
 
 # import module snippets
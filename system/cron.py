@@ -126,6 +126,17 @@ options:
     version_added: "2.0"
     required: false
     default: false
+  jobs:
+    description:
+      - A list of jobs to manage in one task, each a dictionary that takes the C(name), C(job), C(state),
+        C(minute), C(hour), C(day), C(month), C(weekday), C(reboot), C(special_time) and C(disabled)
+        options. Options not given in an entry default to the value of the module option.
+      - The crontab is read and written only once for all the jobs. The names of the jobs that were
+        added, updated or removed are returned in C(changed_jobs).
+      - Mutually exclusive with C(name) and C(job).
+    version_added: "2.1"
+    required: false
+    default: null
 requirements:
   - cron
 author:
@@ -154,10 +165,21 @@ EXAMPLES = '''
 
 # Removes a cron file from under /etc/cron.d
 - cron: name="yum autoupdate" cron_file=ansible_yum-autoupdate state=absent
+
+# Manages several jobs of a user's crontab at once
+- cron:
+    user: backup
+    hour: 3
+    jobs:
+      - { name: "dump db", minute: 0, job: "/usr/local/bin/dump-db" }
+      - { name: "sync files", minute: 30, job: "/usr/local/bin/sync-files" }
+      - { name: "old cleanup", state: absent }
 '''
 
 import os
 import re
+import sys
+import pwd
 import tempfile
 import platform
 import pipes
@@ -179,6 +201,7 @@ class CronTab(object):
         self.user      = user
         self.root      = (os.getuid() == 0)
         self.lines     = None
+        self.index     = {}
         self.ansible   = "#Ansible: "
 
         if cron_file:
@@ -194,6 +217,7 @@ class CronTab(object):
     def read(self):
         # Read in the crontab from the system
         self.lines = []
+        self.index = {}
         if self.cron_file:
             # read the cronfile
             try:
@@ -206,8 +230,7 @@ class CronTab(object):
             except:
                 raise CronTabError("Unexpected error:", sys.exc_info()[0])
         else:
-            # using safely quoted shell for now, but this really should be two non-shell calls instead.  FIXME
-            (rc, out, err) = self.module.run_command(self._read_user_execute(), use_unsafe_shell=True)
+            (rc, out, err) = self.module.run_command(self._read_user_execute())
 
             if rc != 0 and rc != 1: # 1 can mean that there are no jobs.
                 raise CronTabError("Unable to read crontab")
@@ -221,11 +244,27 @@ class CronTab(object):
                     self.lines.append(l)
                 count += 1
 
+        self._build_index()
+
+    def _build_index(self):
+        """
+        Map each job name to the positions of its job lines, so that jobs
+        can be looked up and changed without scanning the whole crontab.
+        """
+        self.index = {}
+        comment = None
+        for i, l in enumerate(self.lines):
+            if comment is not None:
+                self.index.setdefault(comment, []).append(i)
+                comment = None
+            elif l.startswith(self.ansible):
+                comment = l[len(self.ansible):]
+
     def is_empty(self):
-        if len(self.lines) == 0:
-            return True
-        else:
-            return False
+        for l in self.lines:
+            if l is not None:
+                return False
+        return True
 
     def write(self, backup_file=None):
         """
@@ -249,8 +288,14 @@ class CronTab(object):
 
         # Add the entire crontab back to the user crontab
         if not self.cron_file:
-            # quoting shell args for now but really this should be two non-shell calls.  FIXME
-            (rc, out, err) = self.module.run_command(self._write_execute(path), use_unsafe_shell=True)
+            if self.user and platform.system() in ['SunOS', 'HP-UX', 'AIX']:
+                # the crontab is installed as the user, who must be able to read it
+                try:
+                    os.chown(path, pwd.getpwnam(self.user).pw_uid, -1)
+                except (KeyError, OSError), e:
+                    os.unlink(path)
+                    self.module.fail_json(msg="Unable to chown %s to %s: %s" % (path, self.user, str(e)))
+            (rc, out, err) = self.module.run_command(self._write_execute(path))
             os.unlink(path)
 
             if rc != 0:
@@ -262,20 +307,20 @@ class CronTab(object):
 
         # Add the job
         self.lines.append("%s" % (job))
+        self.index.setdefault(name, []).append(len(self.lines) - 1)
 
     def update_job(self, name, job):
-        return self._update_job(name, job, self.do_add_job)
-
-    def do_add_job(self, lines, comment, job):
-        lines.append(comment)
-
-        lines.append("%s" % (job))
+        for i in self.index.get(name, []):
+            self.lines[i] = "%s" % (job)
+        return self.is_empty()
 
     def remove_job(self, name):
-        return self._update_job(name, "", self.do_remove_job)
-
-    def do_remove_job(self, lines, comment, job):
-        return None
+        # removed lines are blanked out rather than deleted so that the
+        # positions kept in the index stay valid; render() skips them
+        for i in self.index.pop(name, []):
+            self.lines[i - 1] = None
+            self.lines[i] = None
+        return self.is_empty()
 
     def remove_job_file(self):
         try:
@@ -288,15 +333,9 @@ class CronTab(object):
             raise CronTabError("Unexpected error:", sys.exc_info()[0])
 
     def find_job(self, name):
-        comment = None
-        for l in self.lines:
-            if comment is not None:
-                if comment == name:
-                    return [comment, l]
-                else:
-                    comment = None
-            elif re.match( r'%s' % self.ansible, l):
-                comment = re.sub( r'%s' % self.ansible, '', l)
+        positions = self.index.get(name)
+        if positions:
+            return [name, self.lines[positions[0]]]
 
         return []
 
@@ -323,39 +362,19 @@ class CronTab(object):
         jobnames = []
 
         for l in self.lines:
-            if re.match( r'%s' % self.ansible, l):
-                jobnames.append(re.sub( r'%s' % self.ansible, '', l))
+            if l is not None and l.startswith(self.ansible):
+                jobnames.append(l[len(self.ansible):])
 
         return jobnames
 
-    def _update_job(self, name, job, addlinesfunction):
-        ansiblename = "%s%s" % (self.ansible, name)
-        newlines = []
-        comment = None
-
-        for l in self.lines:
-            if comment is not None:
-                addlinesfunction(newlines, comment, job)
-                comment = None
-            elif l == ansiblename:
-                comment = l
-            else:
-                newlines.append(l)
-
-        self.lines = newlines
-
-        if len(newlines) == 0:
-            return True
-        else:
-            return False # TODO add some more error testing
-
     def render(self):
         """
         Render this crontab as it would be in the crontab.
         """
         crons = []
         for cron in self.lines:
-            crons.append(cron)
+            if cron is not None:
+                crons.append(cron)
 
         result = '\n'.join(crons)
         if result and result[-1] not in ['\n', '\r']:
@@ -364,36 +383,127 @@ class CronTab(object):
 
     def _read_user_execute(self):
         """
-        Returns the command line for reading a crontab
+        Returns the argument list for reading a crontab
         """
-        user = ''
         if self.user:
             if platform.system() == 'SunOS':
-                return "su %s -c '%s -l'" % (pipes.quote(self.user), pipes.quote(CRONCMD))
-            elif platform.system() == 'AIX':
-                return "%s -l %s" % (pipes.quote(CRONCMD), pipes.quote(self.user))
-            elif platform.system() == 'HP-UX':
-                return "%s %s %s" % (CRONCMD , '-l', pipes.quote(self.user))
+                return ['su', self.user, '-c', '%s -l' % pipes.quote(CRONCMD)]
+            elif platform.system() in ['AIX', 'HP-UX']:
+                return [CRONCMD, '-l', self.user]
             else:
-                user = '-u %s' % pipes.quote(self.user)
-        return "%s %s %s" % (CRONCMD , user, '-l')
+                return [CRONCMD, '-u', self.user, '-l']
+        return [CRONCMD, '-l']
 
     def _write_execute(self, path):
         """
-        Return the command line for writing a crontab
+        Return the argument list for writing a crontab
         """
-        user = ''
         if self.user:
             if platform.system() in ['SunOS', 'HP-UX', 'AIX']:
-                return "chown %s %s ; su '%s' -c '%s %s'" % (pipes.quote(self.user), pipes.quote(path), pipes.quote(self.user), CRONCMD, pipes.quote(path))
+                return ['su', self.user, '-c', '%s %s' % (pipes.quote(CRONCMD), pipes.quote(path))]
             else:
-                user = '-u %s' % pipes.quote(self.user)
-        return "%s %s %s" % (CRONCMD , pipes.quote(path), user)
+                return [CRONCMD, '-u', self.user, path]
+        return [CRONCMD, path]
 
 
 
 #==================================================
 
+JOB_KEYS = ['name', 'job', 'state', 'minute', 'hour', 'day', 'month', 'weekday',
+            'reboot', 'special_time', 'disabled']
+JOB_ALIASES = {'dom': 'day', 'dow': 'weekday'}
+
+def get_jobs_params(module):
+    """
+    Expand the jobs list into per job parameters; options not given in an
+    entry are taken from the module arguments.
+    """
+    jobs = []
+    for entry in module.params['jobs']:
+        if not isinstance(entry, dict):
+            module.fail_json(msg="jobs entries must be dictionaries, got: %s" % entry)
+        params = {}
+        for key, value in entry.items():
+            key = JOB_ALIASES.get(key, key)
+            if key not in JOB_KEYS:
+                module.fail_json(msg="unsupported option %s in jobs entry %s" % (key, entry))
+            params[key] = value
+        for key in JOB_KEYS:
+            if key not in params:
+                params[key] = module.params[key]
+        for key in ['reboot', 'disabled']:
+            params[key] = module.boolean(params[key])
+        if params['state'] not in ['present', 'absent']:
+            module.fail_json(msg="state must be present or absent in jobs entry %s" % entry)
+        if params['name'] is None:
+            module.fail_json(msg="You must specify 'name' for every entry of jobs")
+        for key in ['minute', 'hour', 'day', 'month', 'weekday']:
+            params[key] = str(params[key])
+        jobs.append(params)
+    return jobs
+
+def check_job(module, crontab, params):
+    """
+    Validate the parameters of one job and return the crontab line it
+    should have, or None if it is to be removed.
+    """
+    name         = params['name']
+    job          = params['job']
+    minute       = params['minute']
+    hour         = params['hour']
+    day          = params['day']
+    month        = params['month']
+    weekday      = params['weekday']
+    reboot       = params['reboot']
+    special_time = params['special_time']
+    do_install   = params['state'] == 'present'
+
+    if (special_time or reboot) and \
+       (True in [(x != '*') for x in [minute, hour, day, month, weekday]]):
+        module.fail_json(msg="You must specify time and date fields or special time.")
+
+    if crontab.cron_file and do_install:
+        if not crontab.user:
+            module.fail_json(msg="To use cron_file=... parameter you must specify user=... as well")
+
+    if reboot and special_time:
+        module.fail_json(msg="reboot and special_time are mutually exclusive")
+
+    if name is None and do_install:
+        module.fail_json(msg="You must specify 'name' to install a new cron job")
+
+    if job is None and do_install:
+        module.fail_json(msg="You must specify 'job' to install a new cron job")
+
+    if job and name is None and not do_install:
+        module.fail_json(msg="You must specify 'name' to remove a cron job")
+
+    if reboot:
+        special_time = "reboot"
+
+    if not do_install:
+        return None
+    return crontab.get_cron_job(minute, hour, day, month, weekday, job, special_time, params['disabled'])
+
+def apply_job(crontab, name, job):
+    """
+    Add, update or remove (when job is None) the named job in the crontab
+    lines, returning whether anything changed.
+    """
+    old_job = crontab.find_job(name)
+
+    if job is not None:
+        if len(old_job) == 0:
+            crontab.add_job(name, job)
+            return True
+        if old_job[1] != job:
+            crontab.update_job(name, job)
+            return True
+    elif len(old_job) > 0:
+        crontab.remove_job(name)
+        return True
+    return False
+
 def main():
     # The following example playbooks:
     #
@@ -416,6 +526,7 @@ def main():
             name=dict(required=False),
             user=dict(required=False),
             job=dict(required=False),
+            jobs=dict(required=False, type='list'),
             cron_file=dict(required=False),
             state=dict(default='present', choices=['present', 'absent']),
             backup=dict(default=False, type='bool'),
@@ -431,23 +542,15 @@ def main():
                               type='str'),
             disabled=dict(default=False, type='bool')
         ),
+        mutually_exclusive = [['jobs', 'name'], ['jobs', 'job']],
         supports_check_mode = False,
     )
 
     name         = module.params['name']
     user         = module.params['user']
-    job          = module.params['job']
     cron_file    = module.params['cron_file']
     state        = module.params['state']
     backup       = module.params['backup']
-    minute       = module.params['minute']
-    hour         = module.params['hour']
-    day          = module.params['day']
-    month        = module.params['month']
-    weekday      = module.params['weekday']
-    reboot       = module.params['reboot']
-    special_time = module.params['special_time']
-    disabled     = module.params['disabled']
     do_install   = state == 'present'
 
     changed      = False
@@ -461,31 +564,14 @@ def main():
 
     # --- user input validation ---
 
-    if (special_time or reboot) and \
-       (True in [(x != '*') for x in [minute, hour, day, month, weekday]]):
-        module.fail_json(msg="You must specify time and date fields or special time.")
-
-    if cron_file and do_install:
-        if not user:
-            module.fail_json(msg="To use cron_file=... parameter you must specify user=... as well")
-
-    if reboot and special_time:
-        module.fail_json(msg="reboot and special_time are mutually exclusive")
-
-    if name is None and do_install:
-        module.fail_json(msg="You must specify 'name' to install a new cron job")
-
-    if job is None and do_install:
-        module.fail_json(msg="You must specify 'job' to install a new cron job")
-
-    if job and name is None and not do_install:
-        module.fail_json(msg="You must specify 'name' to remove a cron job")
+    if module.params['jobs'] is not None:
+        jobs = get_jobs_params(module)
+    else:
+        jobs = [module.params]
 
-    if reboot:
-        if special_time:
-            module.fail_json(msg="reboot and special_time are mutually exclusive")
-        else:
-            special_time = "reboot"
+    lines = []
+    for params in jobs:
+        lines.append((params['name'], check_job(module, crontab, params)))
 
     # if requested make a backup before making a change
     if backup:
@@ -493,28 +579,23 @@ def main():
         crontab.write(backup_file)
 
 
-    if crontab.cron_file and not name and not do_install:
+    if crontab.cron_file and not name and not do_install and module.params['jobs'] is None:
         changed = crontab.remove_job_file()
         module.exit_json(changed=changed,cron_file=cron_file,state=state)
 
-    job = crontab.get_cron_job(minute, hour, day, month, weekday, job, special_time, disabled)
-    old_job = crontab.find_job(name)
-
-    if do_install:
-        if len(old_job) == 0:
-            crontab.add_job(name, job)
-            changed = True
-        if len(old_job) > 0 and old_job[1] != job:
-            crontab.update_job(name, job)
-            changed = True
-    else:
-        if len(old_job) > 0:
-            crontab.remove_job(name)
-            changed = True
+    # all the jobs are applied to the lines read above and the crontab is
+    # written back once
+    changed_jobs = []
+    for job_name, job in lines:
+        if apply_job(crontab, job_name, job):
+            changed_jobs.append(job_name)
+    changed = len(changed_jobs) > 0
 
     res_args = dict(
         jobs = crontab.get_jobnames(), changed = changed
     )
+    if module.params['jobs'] is not None:
+        res_args['changed_jobs'] = changed_jobs
 
     if changed:
         crontab.write()
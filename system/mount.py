@@ -31,18 +31,21 @@ options:
   name:
     description:
       - "path to the mount point, eg: C(/mnt/files)"
-    required: true
+      - Required unless I(mounts) is given.
+    required: false
     default: null
     aliases: []
   src:
     description:
       - device to be mounted on I(name).
-    required: true
+      - Required unless I(mounts) is given.
+    required: false
     default: null
   fstype:
     description:
       - file-system type
-    required: true
+      - Required unless I(mounts) is given.
+    required: false
     default: null
   opts:
     description:
@@ -76,8 +79,29 @@ options:
         you need to configure mountpoints in a chroot environment.
     required: false
     default: /etc/fstab
-
-notes: []
+  mounts:
+    description:
+      - A list of mount points to manage in one task, each a dictionary that takes the I(name), I(src),
+        I(fstype), I(opts), I(dump), I(passno) and I(state) options. Options not given in an entry
+        default to the value of the module option.
+      - The fstab is read once and, if anything changed, written back once. Mounts that are
+        needed are then done concurrently, mount points below another one being mounted after it.
+      - The result of every entry is returned in C(mounts).
+    required: false
+    default: null
+    version_added: "2.1"
+  threads:
+    description:
+      - The number of mounts to run concurrently when using I(mounts).
+    required: false
+    default: 4
+    version_added: "2.1"
+
+notes:
+   - Where C(/proc/self/mountinfo) is available it is used to find what is mounted, so a mounted
+     filesystem is only remounted when the options it is mounted with differ from I(opts).
+     Options the kernel does not report are not compared.
+   - The fstab is replaced atomically.
 requirements: []
 author: 
     - Ansible Core Team
@@ -92,140 +116,208 @@ EXAMPLES = '''
 
 # Mount up device by UUID
 - mount: name=/home src='UUID=b3e48f45-f933-4c8e-a700-22a159ec9077' fstype=xfs opts=noatime state=present
+
+# Mount several NFS exports at once
+- mount:
+    state: mounted
+    fstype: nfs
+    opts: ro,hard
+    mounts:
+      - { name: /srv/share, src: "nas:/export/share" }
+      - { name: /srv/share/media, src: "nas:/export/media" }
+      - { name: /srv/archive, src: "nas:/export/archive", opts: "ro,soft" }
+      - { name: /srv/old, state: absent }
 '''
 
 
-def write_fstab(lines, dest):
+import re
+import subprocess
+import tempfile
+import threading
+import Queue
 
-    fs_w = open(dest, 'w')
-    for l in lines:
-        fs_w.write(l)
+MOUNT_KEYS = ['name', 'src', 'fstype', 'opts', 'dump', 'passno', 'state']
 
-    fs_w.flush()
-    fs_w.close()
+# options of which the kernel always reports one in /proc/self/mountinfo,
+# so a desired option is known to differ when another of its group is set
+OPTION_GROUPS = [
+    ['ro', 'rw'],
+    ['nosuid', 'suid'],
+    ['nodev', 'dev'],
+    ['noexec', 'exec'],
+    ['sync', 'async'],
+    ['noatime', 'relatime', 'strictatime'],
+    ['nodiratime', 'diratime'],
+]
 
 def _escape_fstab(v):
     """ escape space (040), ampersand (046) and backslash (134) which are invalid in fstab fields """
     return v.replace('\\', '\\134').replace(' ', '\\040').replace('&', '\\046')
 
-def set_mount(module, **kwargs):
-    """ set/change a mount point location in fstab """
+def _unescape_mountinfo(v):
+    """ undo the octal escapes (eg: \\040) used in /proc/self/mountinfo """
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), v)
 
-    # kwargs: name, src, fstype, opts, dump, passno, state, fstab=/etc/fstab
-    args = dict(
-        opts   = 'defaults',
-        dump   = '0',
-        passno = '0',
-        fstab  = '/etc/fstab'
-    )
-    args.update(kwargs)
 
-    # save the mount name before space replacement
-    origname =  args['name']
-    # replace any space in mount name with '\040' to make it fstab compatible (man fstab)
-    args['name'] = args['name'].replace(' ', r'\040')
+class Fstab(object):
+    """ fstab parsed once and indexed by mount point, so that any number of
+    entries can be set or removed before it is written back """
 
-    new_line = '%(src)s %(name)s %(fstype)s %(opts)s %(dump)s %(passno)s\n'
+    def __init__(self, module, path):
+        self.module = module
+        self.path = path
+        self.lines = []
+        self.index = {}
+        self.changed = False
+        for line in open(path, 'r').readlines():
+            self._append(line)
 
-    to_write = []
-    exists = False
-    changed = False
-    escaped_args = dict([(k, _escape_fstab(v)) for k, v in args.iteritems()])
-    for line in open(args['fstab'], 'r').readlines():
-        if not line.strip():
-            to_write.append(line)
-            continue
-        if line.strip().startswith('#'):
-            to_write.append(line)
-            continue
-        if len(line.split()) != 6:
+    def _append(self, line):
+        self.lines.append(line)
+        fields = line.split()
+        if line.strip().startswith('#') or len(fields) != 6:
             # not sure what this is or why it is here
             # but it is not our fault so leave it be
-            to_write.append(line)
-            continue
-
-        ld = {}
-        ld['src'], ld['name'], ld['fstype'], ld['opts'], ld['dump'], ld['passno']  = line.split()
-
-        if ld['name'] != escaped_args['name']:
-            to_write.append(line)
-            continue
-
-        # it exists - now see if what we have is different
-        exists = True
-        for t in ('src', 'fstype','opts', 'dump', 'passno'):
-            if ld[t] != escaped_args[t]:
-                changed = True
-                ld[t] = escaped_args[t]
-
-        if changed:
-            to_write.append(new_line % ld)
-        else:
-            to_write.append(line)
-
-    if not exists:
-        to_write.append(new_line % args)
-        changed = True
+            return
+        self.index.setdefault(fields[1], []).append(len(self.lines) - 1)
+
+    def set_mount(self, args):
+        """ set/change a mount point location """
+
+        # save the mount name before space replacement
+        origname =  args['name']
+        # replace any space in mount name with '\040' to make it fstab compatible (man fstab)
+        args = args.copy()
+        args['name'] = args['name'].replace(' ', r'\040')
+
+        new_line = '%(src)s %(name)s %(fstype)s %(opts)s %(dump)s %(passno)s\n'
+
+        changed = False
+        escaped_args = dict([(k, _escape_fstab(v)) for k, v in args.iteritems()])
+        positions = self.index.get(escaped_args['name'], [])
+        for i in positions:
+            ld = {}
+            ld['src'], ld['name'], ld['fstype'], ld['opts'], ld['dump'], ld['passno']  = self.lines[i].split()
+
+            # it exists - now see if what we have is different
+            for t in ('src', 'fstype','opts', 'dump', 'passno'):
+                if ld[t] != escaped_args[t]:
+                    changed = True
+                    ld[t] = escaped_args[t]
+
+            if changed:
+                self.lines[i] = new_line % ld
+
+        if not positions:
+            self._append(new_line % args)
+            changed = True
 
-    if changed and not module.check_mode:
-        write_fstab(to_write, args['fstab'])
+        self.changed = self.changed or changed
 
-    # mount function needs origname
-    return (origname, changed)
+        # mount function needs origname
+        return (origname, changed)
 
+    def unset_mount(self, args):
+        """ remove a mount point """
 
-def unset_mount(module, **kwargs):
-    """ remove a mount point from fstab """
+        # save the mount name before space replacement
+        origname =  args['name']
+        # replace any space in mount name with '\040' to make it fstab compatible (man fstab)
+        escaped_name = _escape_fstab(args['name'].replace(' ', r'\040'))
 
-    # kwargs: name, src, fstype, opts, dump, passno, state, fstab=/etc/fstab
-    args = dict(
-        opts   = 'default',
-        dump   = '0',
-        passno = '0',
-        fstab  = '/etc/fstab'
-    )
-    args.update(kwargs)
-
-    # save the mount name before space replacement
-    origname =  args['name']
-    # replace any space in mount name with '\040' to make it fstab compatible (man fstab)
-    args['name'] = args['name'].replace(' ', r'\040')
+        changed = False
+        for i in self.index.pop(escaped_name, []):
+            # removed lines are blanked out so the index stays valid
+            self.lines[i] = None
+            changed = True
 
-    to_write = []
-    changed = False
-    escaped_name = _escape_fstab(args['name'])
-    for line in open(args['fstab'], 'r').readlines():
-        if not line.strip():
-            to_write.append(line)
+        self.changed = self.changed or changed
+
+        # umount needs origname
+        return (origname, changed)
+
+    def write(self):
+        """ replace the file atomically with the current lines """
+
+        fd, tmp_path = tempfile.mkstemp('', '.ansible_m_fstab_', os.path.dirname(self.path) or '.')
+        fs_w = os.fdopen(fd, 'w')
+        try:
+            for l in self.lines:
+                if l is not None:
+                    fs_w.write(l)
+            fs_w.flush()
+        finally:
+            fs_w.close()
+        self.module.atomic_move(tmp_path, self.path)
+
+
+def get_mountinfo():
+    """ returns the mount points from /proc/self/mountinfo as a dict of
+    path: (src, fstype, options), or None where it is not available """
+
+    try:
+        f = open('/proc/self/mountinfo', 'r')
+        try:
+            lines = f.readlines()
+        finally:
+            f.close()
+    except IOError:
+        return None
+
+    mounts = {}
+    for line in lines:
+        fields = line.split()
+        try:
+            sep = fields.index('-', 6)
+        except ValueError:
             continue
-        if line.strip().startswith('#'):
-            to_write.append(line)
+        if len(fields) < sep + 3:
             continue
-        if len(line.split()) != 6:
-            # not sure what this is or why it is here
-            # but it is not our fault so leave it be
-            to_write.append(line)
+        options = fields[5].split(',')
+        if len(fields) > sep + 3:
+            options += fields[sep + 3].split(',')
+        # later entries are mounted over earlier ones
+        mounts[_unescape_mountinfo(fields[4])] = (_unescape_mountinfo(fields[sep + 2]), fields[sep + 1], options)
+    return mounts
+
+def get_mounted(mountinfo, name):
+    """ returns the mountinfo entry of a path, True/False whether it is
+    mounted when mountinfo is not available or None if it is not mounted """
+
+    if mountinfo is None:
+        return os.path.ismount(name)
+    name = os.path.normpath(name)
+    if name in mountinfo:
+        return mountinfo[name]
+    # the parent may be a symlink; resolving it does not touch the mount itself
+    name = os.path.join(os.path.realpath(os.path.dirname(name)), os.path.basename(name))
+    return mountinfo.get(name)
+
+def options_differ(current, opts):
+    """ whether the options of a mounted filesystem differ from the desired
+    ones; options the kernel does not report are not taken into account """
+
+    values = {}
+    for opt in current:
+        if '=' in opt:
+            key, value = opt.split('=', 1)
+            values[key] = value
+
+    for opt in opts.split(','):
+        if '=' in opt:
+            key, value = opt.split('=', 1)
+            if key in values and values[key] != value:
+                return True
             continue
-
-        ld = {}
-        ld['src'], ld['name'], ld['fstype'], ld['opts'], ld['dump'], ld['passno']  = line.split()
-
-        if ld['name'] != escaped_name:
-            to_write.append(line)
+        if opt in current:
             continue
+        for group in OPTION_GROUPS:
+            if opt in group and [o for o in group if o in current]:
+                return True
+    return False
 
-        # if we got here we found a match - continue and mark changed
-        changed = True
-
-    if changed and not module.check_mode:
-        write_fstab(to_write, args['fstab'])
-
-    # umount needs origname
-    return (origname, changed)
-
-
-def mount(module, **kwargs):
-    """ mount up a path or remount if needed """
+def mount_command(module, remount=None, **kwargs):
+    """ returns the command to mount up a path or remount it if needed """
 
     # kwargs: name, src, fstype, opts, dump, passno, state, fstab=/etc/fstab
     args = dict(
@@ -242,14 +334,21 @@ def mount(module, **kwargs):
     
     cmd = [ mount_bin, ]
     
-    if os.path.ismount(name):
+    if remount is None:
+        remount = os.path.ismount(name)
+    if remount:
         cmd += [ '-o', 'remount', ]
 
     if get_platform().lower() == 'freebsd':
         cmd += [ '-F', args['fstab'], ]
 
     cmd += [ name, ]
+    return cmd
+
+def mount(module, remount=None, **kwargs):
+    """ mount up a path or remount if needed """
 
+    cmd = mount_command(module, remount=remount, **kwargs)
     rc, out, err = module.run_command(cmd)
     if rc == 0:
         return 0, ''
@@ -269,57 +368,79 @@ def umount(module, **kwargs):
     else:
         return rc, out+err
 
-def main():
-
-    module = AnsibleModule(
-        argument_spec = dict(
-            state  = dict(required=True, choices=['present', 'absent', 'mounted', 'unmounted']),
-            name   = dict(required=True),
-            opts   = dict(default=None),
-            passno = dict(default=None),
-            dump   = dict(default=None),
-            src    = dict(required=True),
-            fstype = dict(required=True),
-            fstab  = dict(default='/etc/fstab')
-        ),
-        supports_check_mode=True
-    )
-
-
-    changed = False
-    rc = 0
-    args = {
-        'name': module.params['name'],
-        'src': module.params['src'],
-        'fstype': module.params['fstype']
-    }
-    if module.params['passno'] is not None:
-        args['passno'] = module.params['passno']
-    if module.params['opts'] is not None:
-        args['opts'] = module.params['opts']
-    if module.params['dump'] is not None:
-        args['dump'] = module.params['dump']
-    if module.params['fstab'] is not None:
-        args['fstab'] = module.params['fstab']
-
-    # if fstab file does not exist, we first need to create it. This mainly
-    # happens when fstab optin is passed to the module.
-    if not os.path.exists(args['fstab']):
-        if not os.path.exists(os.path.dirname(args['fstab'])):
-            os.makedirs(os.path.dirname(args['fstab']))
-        open(args['fstab'],'a').close()
+def mount_all(module, pending, threads):
+    """ runs the pending (args, remount) mounts from at most threads threads;
+    a mount point below another pending one waits until that one is mounted.
+    Returns a list of (name, msg) for the failed mounts """
+
+    failed = []
+    lock = threading.Lock()
+
+    # The workers run mount with subprocess rather than module.run_command,
+    # which is not thread safe and may exit the module from a thread
+    def worker(queue):
+        while True:
+            try:
+                name, cmd = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                p = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE, close_fds=True)
+                out, err = p.communicate()
+                res, msg = p.returncode, out + err
+            except Exception, e:
+                res, msg = 1, str(e)
+            if res:
+                lock.acquire()
+                try:
+                    failed.append((name, msg))
+                finally:
+                    lock.release()
+
+    while pending:
+        names = [os.path.normpath(args['name']) for args, remount in pending]
+        wave = []
+        rest = []
+        for entry, name in zip(pending, names):
+            for other in names:
+                if name != other and name.startswith(other.rstrip('/') + '/'):
+                    rest.append(entry)
+                    break
+            else:
+                wave.append(entry)
+
+        queue = Queue.Queue()
+        for args, remount in wave:
+            queue.put((args['name'],
+                       mount_command(module, remount=remount, **args)))
+        workers = []
+        for i in range(min(threads, len(wave))):
+            t = threading.Thread(target=worker, args=(queue,))
+            t.start()
+            workers.append(t)
+        for t in workers:
+            t.join()
+        pending = rest
+
+    return failed
+
+def manage_mount(module, fstab, mountinfo, args, state):
+    """ applies state to one mount point; fstab is only changed in memory.
+    Returns (changed, pending) where pending is the (args, remount) mount
+    still to be done or None """
 
     # absent == remove from fstab and unmounted
     # unmounted == do not change fstab state, but unmount
     # present == add to fstab, do not change mount state
     # mounted == add to fstab if not there and make sure it is mounted, if it has changed in fstab then remount it
 
-    state = module.params['state']
-    name  = module.params['name']
+    changed = False
+    name = args['name']
     if state == 'absent':
-        name, changed = unset_mount(module, **args)
+        name, changed = fstab.unset_mount(args)
         if changed and not module.check_mode:
-            if os.path.ismount(name):
+            if get_mounted(mountinfo, name):
                 res,msg  = umount(module, **args)
                 if res:
                     module.fail_json(msg="Error unmounting %s: %s" % (name, msg))
@@ -330,57 +451,155 @@ def main():
                 except (OSError, IOError), e:
                     module.fail_json(msg="Error rmdir %s: %s" % (name, str(e)))
 
-        module.exit_json(changed=changed, **args)
+        return changed, None
 
     if state == 'unmounted':
-        if os.path.ismount(name):
+        if get_mounted(mountinfo, name):
             if not module.check_mode:
                 res,msg  = umount(module, **args)
                 if res:
                     module.fail_json(msg="Error unmounting %s: %s" % (name, msg))
             changed = True
 
-        module.exit_json(changed=changed, **args)
-
-    if state in ['mounted', 'present']:
-        if state == 'mounted':
-            if not os.path.exists(name) and not module.check_mode:
-                try:
-                    os.makedirs(name)
-                except (OSError, IOError), e:
-                    module.fail_json(msg="Error making dir %s: %s" % (name, str(e)))
-
-        name, changed = set_mount(module, **args)
-        if state == 'mounted':
-            res = 0
-            if os.path.ismount(name):
-                if changed and not module.check_mode:
-                    res,msg = mount(module, **args)
-            elif 'bind' in args.get('opts', []):
-                changed = True
-                cmd = 'mount -l'
-                rc, out, err = module.run_command(cmd)
-                allmounts = out.split('\n')
-                for mounts in allmounts[:-1]:
-                    arguments = mounts.split()
-                    if arguments[0] == args['src'] and arguments[2] == args['name'] and arguments[4] == args['fstype']:
-                        changed = False
-                if changed:
-                    res,msg = mount(module, **args)
-            else:
-                changed = True
-                if not module.check_mode:
-                    res,msg = mount(module, **args)
+        return changed, None
+
+    if state == 'mounted':
+        if not os.path.exists(name) and not module.check_mode:
+            try:
+                os.makedirs(name)
+            except (OSError, IOError), e:
+                module.fail_json(msg="Error making dir %s: %s" % (name, str(e)))
+
+    name, changed = fstab.set_mount(args)
+    if state != 'mounted':
+        return changed, None
+
+    mounted = get_mounted(mountinfo, name)
+    if mounted:
+        if mounted is not True:
+            # only remount when the options in use actually differ
+            remount = options_differ(mounted[2], args.get('opts', 'defaults'))
+            changed = changed or remount
+        else:
+            remount = changed
+        if remount:
+            return changed, (args, True)
+    elif mountinfo is None and 'bind' in args.get('opts', []):
+        changed = True
+        cmd = 'mount -l'
+        rc, out, err = module.run_command(cmd)
+        allmounts = out.split('\n')
+        for mounts in allmounts[:-1]:
+            arguments = mounts.split()
+            if arguments[0] == args['src'] and arguments[2] == args['name'] and arguments[4] == args['fstype']:
+                changed = False
+        if changed:
+            return changed, (args, False)
+    else:
+        return True, (args, False)
+
+    return changed, None
+
+def get_mounts_params(module):
+    """ expands the mounts list into per mount point arguments and states;
+    options not given in an entry are taken from the module arguments """
+
+    entries = []
+    for entry in module.params['mounts']:
+        if not isinstance(entry, dict):
+            module.fail_json(msg="mounts entries must be dictionaries, got: %s" % entry)
+        for key in entry:
+            if key not in MOUNT_KEYS:
+                module.fail_json(msg="unsupported option %s in mounts entry %s" % (key, entry))
+        params = {}
+        for key in MOUNT_KEYS:
+            params[key] = entry.get(key, module.params[key])
+        if params['state'] not in ['present', 'absent', 'mounted', 'unmounted']:
+            module.fail_json(msg="invalid state in mounts entry %s" % entry)
+        if params['name'] is None:
+            module.fail_json(msg="name is required in mounts entry %s" % entry)
+        if params['state'] in ['present', 'mounted'] and (params['src'] is None or params['fstype'] is None):
+            module.fail_json(msg="src and fstype are required in mounts entry %s" % entry)
+        entries.append(params)
+    return entries
+
+def get_mount_args(module, params):
+    args = {'name': params['name']}
+    for key in ['src', 'fstype', 'passno', 'opts', 'dump']:
+        if params[key] is not None:
+            args[key] = str(params[key])
+    args['fstab'] = module.params['fstab']
+    # defaults used in fstab entries
+    for key, value in [('opts', 'defaults'), ('dump', '0'), ('passno', '0')]:
+        args.setdefault(key, value)
+    return args
 
+def main():
 
-            if res:
-                module.fail_json(msg="Error mounting %s: %s" % (name, msg))
+    module = AnsibleModule(
+        argument_spec = dict(
+            state  = dict(required=True, choices=['present', 'absent', 'mounted', 'unmounted']),
+            name   = dict(required=False),
+            opts   = dict(default=None),
+            passno = dict(default=None),
+            dump   = dict(default=None),
+            src    = dict(required=False),
+            fstype = dict(required=False),
+            fstab  = dict(default='/etc/fstab'),
+            mounts = dict(required=False, type='list'),
+            threads = dict(default=4, type='int'),
+        ),
+        required_one_of=[['name', 'mounts']],
+        mutually_exclusive=[['name', 'mounts']],
+        supports_check_mode=True
+    )
 
+    if module.params['mounts'] is not None:
+        entries = get_mounts_params(module)
+    else:
+        for key in ['src', 'fstype']:
+            if module.params[key] is None:
+                module.fail_json(msg="missing required arguments: %s" % key)
+        entries = [module.params]
 
-        module.exit_json(changed=changed, **args)
+    fstab_path = module.params['fstab']
 
-    module.fail_json(msg='Unexpected position reached')
-    sys.exit(0)
+    # if fstab file does not exist, we first need to create it. This mainly
+    # happens when fstab optin is passed to the module.
+    if not os.path.exists(fstab_path):
+        if not os.path.exists(os.path.dirname(fstab_path)):
+            os.makedirs(os.path.dirname(fstab_path))
+        open(fstab_path,'a').close()
+
+    # fstab and the mount table are read once for all the mount points
+    fstab = Fstab(module, fstab_path)
+    mountinfo = get_mountinfo()
+
+    results = []
+    pending = []
+    for params in entries:
+        args = get_mount_args(module, params)
+        changed, mount_args = manage_mount(module, fstab, mountinfo, args, params['state'])
+        results.append(dict(name=args['name'], state=params['state'], changed=changed))
+        if mount_args is not None:
+            pending = [p for p in pending if p[0]['name'] != args['name']]
+            pending.append(mount_args)
+
+    if fstab.changed and not module.check_mode:
+        fstab.write()
+
+    if pending and not module.check_mode:
+        failed = mount_all(module, pending, max(1, module.params['threads']))
+        if failed:
+            module.fail_json(msg="Error mounting %s" % ', '.join(["%s: %s" % f for f in failed]),
+                             failed_mounts=[f[0] for f in failed])
+
+    changed = len([r for r in results if r['changed']]) > 0
+    if module.params['mounts'] is not None:
+        module.exit_json(changed=changed, mounts=results)
+
+    args = get_mount_args(module, module.params)
+    module.exit_json(changed=changed, **args)
 
 # import module snippets
 from ansible.module_utils.basic import *
@@ -28,8 +28,19 @@ options:
   name:
     description:
       - Name of the boolean to configure
-    required: true
+      - Required unless I(booleans) is given.
+    required: false
+    default: null
+  booleans:
+    description:
+      - A dictionary of booleans and their desired values, to configure many booleans in one task
+        instead of using I(name) and I(state).
+      - The boolean names are read once, and with I(persistent) all the booleans are changed in a
+        single semanage transaction. The names of the booleans that changed are returned in
+        C(changed_booleans).
+    required: false
     default: null
+    version_added: "2.1"
   persistent:
     description:
       - Set to C(yes) if the boolean setting should survive a reboot
@@ -39,7 +50,8 @@ options:
   state:
     description:
       - Desired boolean value
-    required: true
+      - Required with I(name).
+    required: false
     default: null
     choices: [ 'yes', 'no' ]
 notes:
@@ -51,6 +63,14 @@ author: "Stephen Fromm (@sfromm)"
 EXAMPLES = '''
 # Set (httpd_can_network_connect) flag on and keep it persistent across reboots
 - seboolean: name=httpd_can_network_connect state=yes persistent=yes
+
+# Set several booleans at once in a single policy transaction
+- seboolean:
+    persistent: yes
+    booleans:
+      httpd_can_network_connect: yes
+      httpd_can_sendmail: yes
+      ftpd_full_access: no
 '''
 
 try:
@@ -65,13 +85,18 @@ try:
 except ImportError:
     HAVE_SEMANAGE=False
 
-def has_boolean_value(module, name):
+def get_boolean_names(module):
     bools = []
     try:
         rc, bools = selinux.security_get_boolean_names()
     except OSError, e:
         module.fail_json(msg="Failed to get list of boolean names")
-    if name in bools:
+    return set(bools)
+
+def has_boolean_value(module, name, names=None):
+    if names is None:
+        names = get_boolean_names(module)
+    if name in names:
         return True
     else:
         return False
@@ -90,13 +115,16 @@ def get_boolean_value(module, name):
 # The following method implements what setsebool.c does to change
 # a boolean and make it persist after reboot..
 def semanage_boolean_value(module, name, state):
+    return semanage_boolean_values(module, {name: state})
+
+# All the booleans are modified with one semanage handle in a single
+# transaction, so the policy store is only committed once.
+def semanage_boolean_values(module, values):
     rc = 0
-    value = 0
-    if state:
-        value = 1
     handle = semanage.semanage_handle_create()
     if handle is None:
         module.fail_json(msg="Failed to create semanage library handle")
+    name = None
     try:
         managed = semanage.semanage_is_managed(handle)
         if managed < 0:
@@ -112,25 +140,31 @@ def semanage_boolean_value(module, name, state):
         if semanage.semanage_begin_transaction(handle) < 0:
             module.fail_json(msg="Failed to begin semanage transaction")
 
-        rc, sebool = semanage.semanage_bool_create(handle)
-        if rc < 0:
-            module.fail_json(msg="Failed to create seboolean with semanage")
-        if semanage.semanage_bool_set_name(handle, sebool, name) < 0:
-            module.fail_json(msg="Failed to set seboolean name with semanage")
-        semanage.semanage_bool_set_value(sebool, value)
+        for name in sorted(values.keys()):
+            value = 0
+            if values[name]:
+                value = 1
+
+            rc, sebool = semanage.semanage_bool_create(handle)
+            if rc < 0:
+                module.fail_json(msg="Failed to create seboolean with semanage")
+            if semanage.semanage_bool_set_name(handle, sebool, name) < 0:
+                module.fail_json(msg="Failed to set seboolean name with semanage")
+            semanage.semanage_bool_set_value(sebool, value)
 
-        rc, boolkey = semanage.semanage_bool_key_extract(handle, sebool)
-        if rc < 0:
-            module.fail_json(msg="Failed to extract boolean key with semanage")
+            rc, boolkey = semanage.semanage_bool_key_extract(handle, sebool)
+            if rc < 0:
+                module.fail_json(msg="Failed to extract boolean key with semanage")
 
-        if semanage.semanage_bool_modify_local(handle, boolkey, sebool) < 0:
-            module.fail_json(msg="Failed to modify boolean key with semanage")
+            if semanage.semanage_bool_modify_local(handle, boolkey, sebool) < 0:
+                module.fail_json(msg="Failed to modify boolean key with semanage")
 
-        if semanage.semanage_bool_set_active(handle, boolkey, sebool) < 0:
-            module.fail_json(msg="Failed to set boolean key active with semanage")
+            if semanage.semanage_bool_set_active(handle, boolkey, sebool) < 0:
+                module.fail_json(msg="Failed to set boolean key active with semanage")
 
-        semanage.semanage_bool_key_free(boolkey)
-        semanage.semanage_bool_free(sebool)
+            semanage.semanage_bool_key_free(boolkey)
+            semanage.semanage_bool_free(sebool)
+        name = None
 
         semanage.semanage_set_reload(handle, 0)
         if semanage.semanage_commit(handle) < 0:
@@ -139,6 +173,8 @@ def semanage_boolean_value(module, name, state):
         semanage.semanage_disconnect(handle)
         semanage.semanage_handle_destroy(handle)
     except Exception, e:
+        if name is None:
+            name = ', '.join(sorted(values.keys()))
         module.fail_json(msg="Failed to manage policy for boolean %s: %s" % (name, str(e)))
     return True
 
@@ -156,13 +192,28 @@ def set_boolean_value(module, name, state):
     else:
         return False
 
+def get_desired_booleans(module):
+    """ returns the booleans to manage as a dict of name: state """
+    if module.params['booleans'] is None:
+        return {module.params['name']: module.params['state']}
+    desired = {}
+    for name, state in module.params['booleans'].items():
+        if isinstance(state, basestring):
+            if state.lower() not in BOOLEANS:
+                module.fail_json(msg="Invalid value %s for boolean %s" % (state, name))
+        desired[name] = module.boolean(state)
+    return desired
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
-            name=dict(required=True),
+            name=dict(required=False),
+            booleans=dict(required=False, type='dict'),
             persistent=dict(default='no', type='bool'),
-            state=dict(required=True, type='bool')
+            state=dict(required=False, type='bool')
         ),
+        required_one_of=[['name', 'booleans']],
+        mutually_exclusive=[['name', 'booleans'], ['state', 'booleans']],
         supports_check_mode=True
     )
 
@@ -175,36 +226,49 @@ def main():
     if not selinux.is_selinux_enabled():
         module.fail_json(msg="SELinux is disabled on this host.")
 
+    if module.params['name'] is not None and module.params['state'] is None:
+        module.fail_json(msg="missing required arguments: state")
+
     name = module.params['name']
     persistent = module.params['persistent']
-    state = module.params['state']
+    desired = get_desired_booleans(module)
     result = {}
-    result['name'] = name
+    if name is not None:
+        result['name'] = name
 
-    if not has_boolean_value(module, name):
-        module.fail_json(msg="SELinux boolean %s does not exist." % name)
+    # the boolean names are only read once, whatever the number of booleans
+    names = get_boolean_names(module)
+    changes = {}
+    for bool_name in sorted(desired.keys()):
+        if not has_boolean_value(module, bool_name, names):
+            module.fail_json(msg="SELinux boolean %s does not exist." % bool_name)
+        if get_boolean_value(module, bool_name) != desired[bool_name]:
+            changes[bool_name] = desired[bool_name]
 
-    cur_value = get_boolean_value(module, name)
+    if module.params['booleans'] is not None:
+        result['booleans'] = desired
+        result['changed_booleans'] = sorted(changes.keys())
 
-    if cur_value == state:
-        result['state'] = cur_value
+    if not changes:
+        if name is not None:
+            result['state'] = desired[name]
         result['changed'] = False
         module.exit_json(**result)
 
     if module.check_mode:
         module.exit_json(changed=True)
     if persistent:
-        r = semanage_boolean_value(module, name, state)
+        semanage_boolean_values(module, changes)
     else:
-        r = set_boolean_value(module, name, state)
+        for bool_name in sorted(changes.keys()):
+            if not set_boolean_value(module, bool_name, changes[bool_name]):
+                module.fail_json(msg="Failed to set boolean %s to %s" % (bool_name, changes[bool_name]))
 
-    result['changed'] = r
-    if not r:
-        module.fail_json(msg="Failed to set boolean %s to %s" % (name, value))
+    result['changed'] = True
     try:
         selinux.security_commit_booleans()
     except:
-        module.fail_json(msg="Failed to commit pending boolean %s value" % name)
+        module.fail_json(msg="Failed to commit pending boolean %s value" % ', '.join(sorted(changes.keys())))
     module.exit_json(**result)
 
 # import module snippets
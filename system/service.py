@@ -31,9 +31,19 @@ description:
       OpenRC, SysV, Solaris SMF, systemd, upstart.
 options:
     name:
-        required: true
+        required: false
+        description:
+        - Name of the service. Required unless I(names) is given.
+    names:
+        required: false
+        version_added: "2.1"
         description:
-        - Name of the service.
+        - A list of services to bring to the same I(state) and I(enabled) in one task.
+        - The init system tools are looked up once. On systemd hosts the state of all the
+          services is queried with a single C(systemctl show), and the services needing the
+          same change are passed to a single C(systemctl) command. Elsewhere the services
+          are handled one after the other.
+        - The result of every service is returned in C(services).
     state:
         required: false
         choices: [ started, stopped, restarted, reloaded ]
@@ -98,6 +108,9 @@ EXAMPLES = '''
 # Example action to restart network service for interface eth0
 - service: name=network state=restarted args=eth0
 
+# Example action to enable and start several services at once
+- service: names=nginx,php-fpm,memcached state=started enabled=yes
+
 '''
 
 import platform
@@ -387,47 +400,59 @@ class LinuxService(Service):
     platform = 'Linux'
     distribution = None
 
-    def get_service_tools(self):
+    # the tools are the same for all the services of a names list, so they
+    # are only looked up once
+    _tool_locations = None
 
-        paths = [ '/sbin', '/usr/sbin', '/bin', '/usr/bin' ]
-        binaries = [ 'service', 'chkconfig', 'update-rc.d', 'rc-service', 'rc-update', 'initctl', 'systemctl', 'start', 'stop', 'restart', 'insserv' ]
-        initpaths = [ '/etc/init.d' ]
-        location = dict()
+    @classmethod
+    def get_tool_locations(cls, module):
+        if cls._tool_locations is None:
+            paths = [ '/sbin', '/usr/sbin', '/bin', '/usr/bin' ]
+            binaries = [ 'service', 'chkconfig', 'update-rc.d', 'rc-service', 'rc-update', 'initctl', 'systemctl', 'start', 'stop', 'restart', 'insserv' ]
+            location = dict()
 
-        for binary in binaries:
-            location[binary] = self.module.get_bin_path(binary, opt_dirs=paths)
+            for binary in binaries:
+                location[binary] = module.get_bin_path(binary, opt_dirs=paths)
+            cls._tool_locations = location
+        return cls._tool_locations
 
-        for initdir in initpaths:
-            initscript = "%s/%s" % (initdir,self.name)
-            if os.path.isfile(initscript):
-                self.svc_initscript = initscript
+    @staticmethod
+    def check_systemd(location):
 
-        def check_systemd():
+        # tools must be installed
+        if location.get('systemctl',False):
 
-            # tools must be installed
-            if location.get('systemctl',False):
+            # this should show if systemd is the boot init system
+            # these mirror systemd's own sd_boot test http://www.freedesktop.org/software/systemd/man/sd_booted.html
+            for canary in ["/run/systemd/system/", "/dev/.run/systemd/", "/dev/.systemd/"]:
+                if os.path.exists(canary):
+                    return True
 
-                # this should show if systemd is the boot init system
-                # these mirror systemd's own sd_boot test http://www.freedesktop.org/software/systemd/man/sd_booted.html
-                for canary in ["/run/systemd/system/", "/dev/.run/systemd/", "/dev/.systemd/"]:
-                    if os.path.exists(canary):
-                        return True
+            # If all else fails, check if init is the systemd command, using comm as cmdline could be symlink
+            try:
+                f = open('/proc/1/comm', 'r')
+            except IOError:
+                # If comm doesn't exist, old kernel, no systemd
+                return False
 
-                # If all else fails, check if init is the systemd command, using comm as cmdline could be symlink
-                try:
-                    f = open('/proc/1/comm', 'r')
-                except IOError:
-                    # If comm doesn't exist, old kernel, no systemd
-                    return False
+            for line in f:
+                if 'systemd' in line:
+                    return True
 
-                for line in f:
-                    if 'systemd' in line:
-                        return True
+        return False
 
-            return False
+    def get_service_tools(self):
+
+        initpaths = [ '/etc/init.d' ]
+        location = self.get_tool_locations(self.module)
+
+        for initdir in initpaths:
+            initscript = "%s/%s" % (initdir,self.name)
+            if os.path.isfile(initscript):
+                self.svc_initscript = initscript
 
         # Locate a tool to enable/disable a service
-        if check_systemd():
+        if self.check_systemd(location):
             # service is managed by systemd
             self.__systemd_unit = self.name
             self.svc_cmd = location['systemctl']
@@ -1412,24 +1437,174 @@ class AIX(Service):
 
 
 # ===========================================
-# Main control flow
+# Services of a names list
 
-def main():
-    module = AnsibleModule(
-        argument_spec = dict(
-            name = dict(required=True),
-            state = dict(choices=['running', 'started', 'stopped', 'restarted', 'reloaded']),
-            sleep = dict(required=False, type='int', default=None),
-            pattern = dict(required=False, default=None),
-            enabled = dict(type='bool'),
-            runlevel = dict(required=False, default='default'),
-            arguments = dict(aliases=['args'], default=''),
-        ),
-        supports_check_mode=True
-    )
-    if module.params['state'] is None and module.params['enabled'] is None:
-        module.fail_json(msg="Neither 'state' nor 'enabled' set")
+class ServiceExit(Exception):
+    """ raised instead of exiting when one service of a list is done early """
+    def __init__(self, result):
+        Exception.__init__(self)
+        self.result = result
+
+class ServiceModule(object):
+    """
+    Stands in for the module when managing one service of a names list: the
+    parameters carry the name of that service, and exit_json returns to the
+    caller so that the next services can be handled.
+    """
+    def __init__(self, module, name):
+        self.module = module
+        self.params = dict(module.params)
+        self.params['name'] = name
+
+    def __getattr__(self, attr):
+        return getattr(self.module, attr)
+
+    def exit_json(self, **kwargs):
+        raise ServiceExit(kwargs)
+
+# systemctl is-enabled succeeds for these unit file states
+SYSTEMD_ENABLED_STATES = [ 'enabled', 'enabled-runtime', 'static', 'indirect', 'generated', 'transient', 'alias' ]
+
+def parse_systemd_show(out):
+    """ splits the output of systemctl show for several units into a list of
+    property dicts, one per unit in the order they were given """
+    units = []
+    current = {}
+    for line in out.splitlines():
+        if not line.strip():
+            if current:
+                units.append(current)
+                current = {}
+            continue
+        if '=' in line:
+            key, value = line.split('=', 1)
+            current[key] = value
+    if current:
+        units.append(current)
+    return units
+
+def manage_systemd_services(module, systemctl):
+    """
+    Manages all the services of a names list with systemctl: their state is
+    queried with a single systemctl show and the services needing the same
+    action are passed to a single systemctl command.
+    """
+    names = module.params['names']
+    state = module.params['state']
+    enable = module.params['enabled']
+    arguments = module.params.get('arguments', '')
+    service = Service(ServiceModule(module, names[0]))
+
+    (rc, out, err) = service.execute_command("%s show -p LoadState,ActiveState,UnitFileState %s" % (systemctl, ' '.join(names)))
+    if rc != 0:
+        module.fail_json(msg='failure %d running systemctl show for %r: %s' % (rc, names, err))
+    units = parse_systemd_show(out)
+    if len(units) != len(names):
+        module.fail_json(msg='unexpected systemctl show output for %r: %s' % (names, out))
+
+    actions = {}
+    results = []
+    for (name, unit) in zip(names, units):
+        if unit.get('LoadState') == 'not-found':
+            module.fail_json(msg='systemd could not find the requested service "%r": %s' % (name, err))
+        result = dict(name=name, changed=False)
+
+        if enable is not None:
+            unit_file_state = unit.get('UnitFileState', '')
+            if unit_file_state:
+                enabled = unit_file_state in SYSTEMD_ENABLED_STATES
+            elif os.access('/etc/init.d/' + name, os.X_OK):
+                enabled = bool(glob.glob('/etc/rc?.d/S??' + name))
+            else:
+                enabled = False
+            if enabled != enable:
+                if enable:
+                    actions.setdefault('enable', []).append(name)
+                else:
+                    actions.setdefault('disable', []).append(name)
+                result['changed'] = True
+            result['enabled'] = enable
+
+        if state is not None:
+            active_state = unit.get('ActiveState')
+            if active_state is None:
+                module.fail_json(msg='No ActiveState value in systemctl show output for %r' % (name,))
+            running = active_state == 'active'
+            action = None
+            if state in ['started', 'running'] and not running:
+                action = 'start'
+            elif state == 'reloaded':
+                if running:
+                    action = 'reload'
+                else:
+                    action = 'start'
+            elif state == 'stopped' and running:
+                action = 'stop'
+            elif state == 'restarted':
+                action = 'restart'
+            if action:
+                actions.setdefault(action, []).append(name)
+                result['changed'] = True
+            if state in ['started','restarted','running','reloaded']:
+                result['state'] = 'started'
+            else:
+                result['state'] = 'stopped'
+
+        results.append(result)
+
+    changed = len([r for r in results if r['changed']]) > 0
+    if module.check_mode or not changed:
+        module.exit_json(changed=changed, services=results)
+
+    def run(action, units, daemonize=True, args=''):
+        (rc, out, err) = service.execute_command("%s %s %s %s" % (systemctl, action, ' '.join(units), args), daemonize=daemonize)
+        if rc != 0:
+            module.fail_json(msg="Error when trying to %s %s: rc=%s %s" % (action, ' '.join(units), rc, err or out))
+
+    # like service_enable, enable and disable get no arguments
+    for action in ['enable', 'disable']:
+        if action in actions:
+            run(action, actions[action], daemonize=False)
+    for action in ['stop', 'start', 'reload']:
+        if action in actions:
+            run(action, actions[action], args=arguments)
+    if 'restart' in actions:
+        # not all services support restart, so do it the hard way
+        run('stop', actions['restart'], args=arguments)
+        if module.params['sleep']:
+            time.sleep(module.params['sleep'])
+        run('start', actions['restart'], args=arguments)
+
+    module.exit_json(changed=changed, services=results)
+
+def manage_services(module):
+    """
+    Manages the services of a names list. The init system tools are looked
+    up once; on systemd hosts all the services are handled together,
+    elsewhere they are handled one after the other.
+    """
+    if platform.system() == 'Linux':
+        location = LinuxService.get_tool_locations(module)
+        if LinuxService.check_systemd(location):
+            manage_systemd_services(module, location['systemctl'])
+
+    results = []
+    for name in module.params['names']:
+        try:
+            result = manage_service(ServiceModule(module, name))
+        except ServiceExit, e:
+            result = e.result
+        result['name'] = name
+        results.append(result)
+
+    changed = len([r for r in results if r.get('changed')]) > 0
+    module.exit_json(changed=changed, services=results)
+
+# ===========================================
+# Main control flow
 
+def manage_service(module):
+    """ brings one service to the requested state and returns the result """
     service = Service(module)
 
     module.debug('Service instantiated - platform %s' % service.platform)
@@ -1455,7 +1630,7 @@ def main():
     if module.params['state'] is None:
         # Not changing the running state, so bail out now.
         result['changed'] = service.changed
-        module.exit_json(**result)
+        return result
 
     result['state'] = service.state
 
@@ -1503,6 +1678,31 @@ def main():
         else:
             result['state'] = 'stopped'
 
+    return result
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            name = dict(required=False),
+            names = dict(required=False, type='list'),
+            state = dict(choices=['running', 'started', 'stopped', 'restarted', 'reloaded']),
+            sleep = dict(required=False, type='int', default=None),
+            pattern = dict(required=False, default=None),
+            enabled = dict(type='bool'),
+            runlevel = dict(required=False, default='default'),
+            arguments = dict(aliases=['args'], default=''),
+        ),
+        required_one_of=[['name', 'names']],
+        mutually_exclusive=[['name', 'names'], ['pattern', 'names']],
+        supports_check_mode=True
+    )
+    if module.params['state'] is None and module.params['enabled'] is None:
+        module.fail_json(msg="Neither 'state' nor 'enabled' set")
+
+    if module.params['names'] is not None:
+        manage_services(module)
+
+    result = manage_service(module)
     module.exit_json(**result)
 
 from ansible.module_utils.basic import *
@@ -39,6 +39,59 @@ options:
               File/results format can be json or ini-format
         required: false
         default: '/etc/ansible/facts.d'
+    gather_subset:
+        version_added: "2.1"
+        description:
+            - "if supplied, restrict the additional facts collected to the given subset.
+              Possible values: all, min, hardware, network, virtual, facter, ohai.
+              Can specify a list of values to specify a larger subset.
+              Values can also be used with an initial C(!) to specify that
+              that specific subset should not be collected.  For instance:
+              !hardware, !network, !virtual, !ohai, !facter.  The minimal set of
+              facts is always gathered."
+            - Subsets whose facts cannot match I(filter) are not collected, and I(facter)
+              and I(ohai) run concurrently with the other collectors.
+        required: false
+        default: 'all'
+    fact_cache:
+        version_added: "2.1"
+        description:
+            - directory of the on-host cache of gathered facts, see I(fact_cache_ttl).
+              It is not written in check mode.
+        required: false
+        default: '~/.ansible/fact_cache'
+    fact_cache_ttl:
+        version_added: "2.1"
+        description:
+            - a dictionary of subsets (including C(min)) and the number of seconds their facts are
+              kept in I(fact_cache) and reused instead of being gathered again. Subsets not listed
+              are not cached.
+        required: false
+        default: {}
+    fact_providers:
+        version_added: "2.1"
+        description:
+            - a list of extra executables, with their arguments, which print a JSON dictionary of facts.
+              The facts are prefixed with the name of the executable, for instance
+              C(/usr/local/bin/rack-facts) gives C(rack_facts_*) facts.
+            - The name may not be one of the subsets of I(gather_subset), nor start with C(ansible).
+        required: false
+        default: null
+    provider_timeout:
+        version_added: "2.1"
+        description:
+            - the number of seconds each external provider (facter, ohai and I(fact_providers)) may run.
+              The providers run concurrently; one still running after this time is killed and its
+              facts are left out. C(0) means no limit.
+        required: false
+        default: 0
+    slow_provider_skip:
+        version_added: "2.1"
+        description:
+            - the number of seconds an external provider which timed out is skipped for on the following
+              runs, recorded in I(fact_cache). C(0) never skips providers.
+        required: false
+        default: 0
 description:
      - This module is automatically called by playbooks to gather useful
        variables about remote hosts that can be used in playbooks. It can also be
@@ -54,6 +107,8 @@ notes:
       install I(facter) and I(ohai) means you can avoid Ruby-dependencies on your
       remote systems. (See also M(facter) and M(ohai).)
     - The filter option filters only the first level subkey below ansible_facts.
+    - The C(ansible_gather_timing) fact gives the status (ok, failed, timeout, cached or skipped) and the
+      number of seconds taken by each subset and external provider.
     - If the target host is Windows, you will not currently have the ability to use
       C(fact_path) or C(filter) as this is provided by a simpler implementation of the module.
       Different facts are returned for Windows hosts.
@@ -74,52 +129,313 @@ ansible all -m setup -a 'filter=facter_*'
 
 # Display only facts about certain interfaces.
 ansible all -m setup -a 'filter=ansible_eth[0-2]'
+
+# Collect only the minimal facts and the network ones, without facter or ohai.
+ansible all -m setup -a 'gather_subset=network'
+
+# Reuse hardware facts for an hour and facter facts for a day.
+- setup:
+    fact_cache_ttl:
+      hardware: 3600
+      facter: 86400
 """
 
 
-def run_setup(module):
+import re
+import time
+import shlex
+import signal
+import tempfile
+import threading
+import subprocess
 
-    setup_options = dict(module_setup=True)
-    facts = ansible_facts(module)
+# the subsets of facts gather_subset can choose from, besides the minimal
+# facts that are always gathered
+FACT_SUBSETS = ['hardware', 'network', 'virtual', 'facter', 'ohai']
+
+
+def get_gather_subset(module):
+    """ returns the set of subsets requested with gather_subset """
+    subset = set()
+    exclude = set()
+    for name in module.params['gather_subset']:
+        target = subset
+        if name.startswith('!'):
+            name = name[1:]
+            target = exclude
+        if name == 'all':
+            target.update(FACT_SUBSETS)
+        elif name == 'min':
+            continue
+        elif name in FACT_SUBSETS:
+            target.add(name)
+        else:
+            module.fail_json(msg="Bad subset '%s' given to Ansible. gather_subset options allowed: all, min, %s"
+                                 % (name, ', '.join(FACT_SUBSETS)))
+    return subset - exclude
+
+def filter_may_match(pattern, prefix):
+    """ whether facts starting with prefix can match the filter pattern """
+    literal = re.split(r'[*?\[]', pattern, 1)[0]
+    return literal.startswith(prefix) or prefix.startswith(literal)
 
-    for (k, v) in facts.items():
-        setup_options["ansible_%s" % k.replace('-', '_')] = v
 
-    # Look for the path to the facter and ohai binary and set
-    # the variable to that path.
-    facter_path = module.get_bin_path('facter')
-    ohai_path = module.get_bin_path('ohai')
+class FactCache(object):
+    """ on-host cache of the facts of each subset, kept for a time to live
+    given per subset. It also remembers the external providers which timed
+    out, so that they can be skipped for a while. """
+
+    SLOW_PROVIDERS = '.slow_providers'
+
+    def __init__(self, module, path, ttls):
+        self.module = module
+        self.path = path
+        self.ttls = {}
+        for (name, ttl) in (ttls or {}).items():
+            try:
+                self.ttls[name] = int(ttl)
+            except ValueError:
+                module.fail_json(msg="fact_cache_ttl for %s must be a number of seconds" % name)
+
+    def _file(self, name):
+        return os.path.join(self.path, '%s.json' % name)
+
+    def _load(self, name):
+        try:
+            f = open(self._file(name))
+            try:
+                return json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+
+    def _save(self, name, data):
+        if self.module.check_mode:
+            return
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path, 0700)
+            fd, tmp_path = tempfile.mkstemp('.json', '.%s' % name, self.path)
+            f = os.fdopen(fd, 'w')
+            try:
+                json.dump(data, f)
+            finally:
+                f.close()
+            os.rename(tmp_path, self._file(name))
+        except (IOError, OSError):
+            # the cache is only an optimisation
+            pass
 
-    # if facter is installed, and we can use --json because
-    # ruby-json is ALSO installed, include facter data in the JSON
-    if facter_path is not None:
-        rc, out, err = module.run_command(facter_path + " --puppet --json")
-        facter = True
+    def get(self, name):
+        if self.ttls.get(name, 0) <= 0:
+            return None
+        data = self._load(name)
         try:
-            facter_ds = json.loads(out)
-        except:
-            facter = False
-        if facter:
-            for (k,v) in facter_ds.items():
-                setup_options["facter_%s" % k] = v
+            if time.time() - data['time'] < self.ttls[name]:
+                return data['facts']
+        except (KeyError, TypeError):
+            pass
+        return None
+
+    def set(self, name, facts):
+        if self.ttls.get(name, 0) <= 0:
+            return
+        self._save(name, dict(time=time.time(), facts=facts))
+
+    def get_slow(self):
+        """ returns a dict of provider name: time it last timed out """
+        data = self._load(self.SLOW_PROVIDERS)
+        if not isinstance(data, dict):
+            return {}
+        return data
+
+    def set_slow(self, slow):
+        self._save(self.SLOW_PROVIDERS, slow)
+
+
+def get_python_facts(module, name):
+    # only the network collectors run commands through the module
+    if name == 'min':
+        collector = Facts()
+    elif name == 'hardware':
+        collector = Hardware()
+    elif name == 'network':
+        collector = Network(module)
+    else:
+        collector = Virtual()
+    facts = {}
+    for (k, v) in collector.populate().items():
+        facts["ansible_%s" % k.replace('-', '_')] = v
+    return facts
+
+def get_providers(module, subset, pattern):
+    """ returns the external fact providers to run, as a list of
+    (name, argv, prefix) """
+    providers = []
+
+    # Look for the path to the facter and ohai binary
+    if 'facter' in subset and filter_may_match(pattern, 'facter_'):
+        facter_path = module.get_bin_path('facter')
+        # if facter is installed, and we can use --json because
+        # ruby-json is ALSO installed, include facter data in the JSON
+        if facter_path is not None:
+            providers.append(('facter', [facter_path, '--puppet', '--json'], 'facter_'))
 
     # ditto for ohai
-    if ohai_path is not None:
-        rc, out, err = module.run_command(ohai_path)
-        ohai = True
+    if 'ohai' in subset and filter_may_match(pattern, 'ohai_'):
+        ohai_path = module.get_bin_path('ohai')
+        if ohai_path is not None:
+            providers.append(('ohai', [ohai_path], 'ohai_'))
+
+    # any other executable printing a JSON dictionary of facts
+    for provider in module.params['fact_providers'] or []:
+        argv = shlex.split(provider)
+        if not argv:
+            continue
+        name = re.sub(r'\W', '_', os.path.splitext(os.path.basename(argv[0]))[0]).lower()
+        # the name prefixes the facts and names the cache entry, so it must
+        # not clash with the built-in subsets or facts
+        if name == 'min' or name in FACT_SUBSETS or name.startswith('ansible'):
+            module.fail_json(msg="fact provider %s would be named %s, which is reserved" % (argv[0], name))
+        if filter_may_match(pattern, '%s_' % name):
+            providers.append((name, argv, '%s_' % name))
+
+    return providers
+
+def run_provider(argv, timeout):
+    """ runs an external fact provider and returns (status, output), where
+    status is ok, failed or timeout. The provider and any process it started
+    are killed once it has run for timeout seconds (0 for no limit). """
+    spool = tempfile.TemporaryFile()
+    devnull = open(os.devnull, 'r+')
+    try:
         try:
-            ohai_ds = json.loads(out)
-        except:
-            ohai = False
-        if ohai:
-            for (k,v) in ohai_ds.items():
-                k2 = "ohai_%s" % k.replace('-', '_')
-                setup_options[k2] = v
+            p = subprocess.Popen(argv, stdin=devnull, stdout=spool, stderr=devnull,
+                                 close_fds=True, preexec_fn=os.setsid)
+        except OSError:
+            return ('failed', '')
+
+        deadline = time.time() + timeout
+        while p.poll() is None:
+            if timeout > 0 and time.time() >= deadline:
+                try:
+                    os.killpg(p.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                p.wait()
+                return ('timeout', '')
+            time.sleep(0.05)
+
+        spool.seek(0)
+        return ('ok', spool.read())
+    finally:
+        spool.close()
+        devnull.close()
+
+def get_provider_facts(module, provider):
+    """ returns (status, facts) for an external fact provider """
+    (name, argv, prefix) = provider
+    status, out = run_provider(argv, module.params['provider_timeout'])
+    facts = {}
+    if status != 'ok':
+        return (status, facts)
+    try:
+        ds = json.loads(out)
+    except:
+        return ('failed', facts)
+    if not isinstance(ds, dict):
+        return ('failed', facts)
+    for (k,v) in ds.items():
+        if name != 'facter':
+            k = k.replace('-', '_')
+        facts["%s%s" % (prefix, k)] = v
+    return (status, facts)
+
+def run_setup(module):
+
+    setup_options = dict(module_setup=True)
+    pattern = module.params['filter']
+    subset = get_gather_subset(module)
+    cache = FactCache(module, module.params['fact_cache'], module.params['fact_cache_ttl'])
+
+    # only the subsets whose facts can match the filter are gathered
+    providers = get_providers(module, subset, pattern)
+    internal = ['min']
+    for name in ['hardware', 'network', 'virtual']:
+        if name in subset and filter_may_match(pattern, 'ansible_'):
+            internal.append(name)
+
+    results = {}
+    timing = {}
+
+    def gather(name, provider=None):
+        start = time.time()
+        if provider is None:
+            results[name] = get_python_facts(module, name)
+            status = 'ok'
+        else:
+            status, results[name] = get_provider_facts(module, provider)
+        timing[name] = dict(status=status, seconds=round(time.time() - start, 3))
+
+    # The external providers are slow programs: they run concurrently,
+    # alongside the facts gathered here, each within provider_timeout.
+    # Those which timed out recently are skipped.
+    slow = cache.get_slow()
+    skip_for = module.params['slow_provider_skip']
+    threads = []
+    for provider in providers:
+        name = provider[0]
+        facts = cache.get(name)
+        if facts is not None:
+            results[name] = facts
+            timing[name] = dict(status='cached', seconds=0)
+        elif skip_for > 0 and time.time() - slow.get(name, 0) < skip_for:
+            timing[name] = dict(status='skipped', seconds=0)
+        else:
+            t = threading.Thread(target=gather, args=(name, provider))
+            t.start()
+            threads.append(t)
+
+    for name in internal:
+        facts = cache.get(name)
+        if facts is not None:
+            results[name] = facts
+            timing[name] = dict(status='cached', seconds=0)
+        else:
+            gather(name)
+    for t in threads:
+        t.join()
+
+    slow_changed = False
+    for (name, stats) in timing.items():
+        if stats['status'] == 'ok':
+            cache.set(name, results[name])
+            if name in slow:
+                del slow[name]
+                slow_changed = True
+        elif stats['status'] == 'timeout':
+            slow[name] = time.time()
+            slow_changed = True
+    if slow_changed:
+        cache.set_slow(slow)
+
+    # cached facts go first, so that freshly gathered ones, and above all
+    # the minimal facts, win where they overlap
+    names = internal + [provider[0] for provider in providers]
+    cached = [name for name in names if timing.get(name, {}).get('status') == 'cached']
+    fresh = [name for name in names if name not in cached and name != 'min']
+    if 'min' not in cached:
+        fresh.append('min')
+    for name in cached + fresh:
+        setup_options.update(results.get(name, {}))
+    setup_options['ansible_gather_subset'] = ['min'] + sorted(subset)
+    setup_options['ansible_gather_timing'] = timing
 
     setup_result = { 'ansible_facts': {} }
 
     for (k,v) in setup_options.items():
-        if module.params['filter'] == '*' or fnmatch.fnmatch(k, module.params['filter']):
+        if pattern == '*' or fnmatch.fnmatch(k, pattern):
             setup_result['ansible_facts'][k] = v
 
     # hack to keep --verbose from showing all the setup module results
@@ -133,6 +449,12 @@ def main():
         argument_spec = dict(
             filter=dict(default="*", required=False),
             fact_path=dict(default='/etc/ansible/facts.d', required=False),
+            gather_subset=dict(default=['all'], required=False, type='list'),
+            fact_cache=dict(default='~/.ansible/fact_cache', required=False, type='path'),
+            fact_cache_ttl=dict(default={}, required=False, type='dict'),
+            fact_providers=dict(default=None, required=False, type='list'),
+            provider_timeout=dict(default=0, required=False, type='int'),
+            slow_provider_skip=dict(default=0, required=False, type='int'),
         ),
         supports_check_mode = True,
     )
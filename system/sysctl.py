@@ -31,9 +31,22 @@ options:
     name:
         description:
             - The dot-separated path (aka I(key)) specifying the sysctl variable.
-        required: true
+            - Required unless I(settings) is given.
+        required: false
         default: null
         aliases: [ 'key' ]
+    settings:
+        description:
+            - A dictionary of sysctl variables and their desired values, to manage many variables in one
+              task instead of using I(name) and I(value).
+            - The C(sysctl_file) is read and written only once. On Linux the current values are read
+              from and written to C(/proc/sys) directly, and instead of reloading the whole
+              C(sysctl_file), only the variables whose running value differs are set, when I(reload) or
+              I(sysctl_set) ask for it.
+            - The result lists the variables that were set in I(updated).
+        required: false
+        default: null
+        version_added: "2.1"
     value:
         description:
             - Desired value of the sysctl key.
@@ -89,6 +102,14 @@ EXAMPLES = '''
 
 # Set ip forwarding on in /proc and in the sysctl file and reload if necessary
 - sysctl: name="net.ipv4.ip_forward" value=1 sysctl_set=yes state=present reload=yes
+
+# Tune several variables at once, setting only those that differ
+- sysctl:
+    settings:
+      vm.swappiness: 10
+      net.core.somaxconn: 4096
+      net.ipv4.tcp_rmem: "4096 87380 16777216"
+    sysctl_set: yes
 '''
 
 # ==============================================================
@@ -114,6 +135,7 @@ class SysctlModule(object):
         self.changed = False    # will change occur
         self.set_proc = False   # does sysctl need to set value
         self.write_file = False # does the sysctl file need to be reloaded
+        self.updated = []       # tokens set in proc fs (settings mode)
 
         self.process()
 
@@ -125,6 +147,9 @@ class SysctlModule(object):
 
         self.platform = get_platform().lower()
 
+        if self.args['settings'] is not None:
+            return self.process_settings()
+
         # Whitespace is bad
         self.args['name'] = self.args['name'].strip()
         self.args['value'] = self._parse_value(self.args['value'])
@@ -132,7 +157,7 @@ class SysctlModule(object):
         thisname = self.args['name']
 
         # get the current proc fs value
-        self.proc_value = self.get_token_curr_value(thisname)
+        self.proc_value = self.get_proc_value(thisname)
 
         # get the currect sysctl file value
         self.read_sysctl_file()
@@ -140,7 +165,7 @@ class SysctlModule(object):
             self.file_values[thisname] = None
 
         # update file contents with desired token/value
-        self.fix_lines()
+        self.fix_lines({thisname: self.args['value']})
 
         # what do we need to do now?
         if self.file_values[thisname] is None and self.args['state'] == "present":
@@ -169,6 +194,46 @@ class SysctlModule(object):
             if self.set_proc:
                 self.set_token_value(self.args['name'], self.args['value'])
 
+    def process_settings(self):
+        """Handle a dict of tokens at once: the sysctl file is read and
+        written once, and instead of reloading the whole file only the
+        tokens whose current value differs are set."""
+
+        desired = {}
+        for name, value in self.args['settings'].items():
+            desired[name.strip()] = str(self._parse_value(value))
+
+        self.read_sysctl_file()
+        self.fix_lines(desired)
+
+        for name, value in desired.items():
+            if self.args['state'] == "present":
+                if self.file_values.get(name) != value:
+                    self.write_file = True
+            elif name in self.file_values:
+                self.write_file = True
+
+        to_set = {}
+        if self.args['state'] == "present" and (self.args['sysctl_set'] or
+                                              (self.write_file and self.args['reload'])):
+            for name, value in desired.items():
+                proc_value = self.get_proc_value(name)
+                if proc_value is None:
+                    if not self.args['ignoreerrors']:
+                        self.module.fail_json(msg="unknown sysctl key: %s" % name)
+                elif not self._values_is_equal(proc_value, value):
+                    to_set[name] = value
+
+        self.updated = sorted(to_set.keys())
+        self.changed = self.write_file or len(self.updated) > 0
+
+        # Do the work
+        if not self.module.check_mode:
+            if self.write_file:
+                self.write_sysctl()
+            for name in self.updated:
+                self.set_proc_value(name, to_set[name])
+
     def _values_is_equal(self, a, b):
         """Expects two string values. It will split the string by whitespace
         and compare each value. It will return True if both lists are the same,
@@ -202,6 +267,48 @@ class SysctlModule(object):
         else:
             return value
 
+    # ==============================================================
+    #   PROC FS MANAGEMENT
+    # ==============================================================
+
+    def _proc_path(self, token):
+        # in sysctl names '.' separates the path components and '/' stands
+        # for a '.' within one (e.g. net.ipv4.conf.eth0/100.forwarding),
+        # unless the name has no '.' at all, in which case it is a path
+        # (e.g. net/ipv4/ip_forward), as with sysctl(8)
+        if '/' in token and '.' not in token:
+            return os.path.join('/proc/sys', token.lstrip('/'))
+        parts = [p.replace('/', '.') for p in token.split('.')]
+        return os.path.join('/proc/sys', *parts)
+
+    # Read the current value straight from /proc/sys on Linux rather than
+    # forking sysctl, which matters when many tokens are checked
+    def get_proc_value(self, token):
+        if self.platform != 'linux':
+            return self.get_token_curr_value(token)
+        try:
+            f = open(self._proc_path(token))
+            try:
+                return f.read().strip()
+            finally:
+                f.close()
+        except IOError:
+            # e.g. a write-only entry, or a name sysctl resolves differently
+            return self.get_token_curr_value(token)
+
+    def set_proc_value(self, token, value):
+        if self.platform != 'linux':
+            return self.set_token_value(token, value)
+        try:
+            f = open(self._proc_path(token), 'w')
+            try:
+                f.write(value)
+            finally:
+                f.close()
+        except IOError, e:
+            if not self.args['ignoreerrors']:
+                self.module.fail_json(msg='setting %s failed: %s' % (token, str(e)))
+
     # ==============================================================
     #   SYSCTL COMMAND MANAGEMENT
     # ==============================================================
@@ -291,9 +398,9 @@ class SysctlModule(object):
             v = v.strip()
             self.file_values[k] = v.strip()
 
-    # Fix the value in the sysctl file content
-    def fix_lines(self):
-        checked = []
+    # Fix the values of the desired tokens in the sysctl file content
+    def fix_lines(self, desired):
+        checked = {}
         self.fixed_lines = []
         for line in self.file_lines:
             if not line.strip() or line.strip().startswith("#"):
@@ -304,18 +411,20 @@ class SysctlModule(object):
             k = k.strip()
             v = v.strip()
             if k not in checked:
-                checked.append(k)
-                if k == self.args['name']:
+                checked[k] = True
+                if k in desired:
                     if self.args['state'] == "present":
-                        new_line = "%s=%s\n" % (k, self.args['value'])
+                        new_line = "%s=%s\n" % (k, desired[k])
                         self.fixed_lines.append(new_line)                    
                 else:
                     new_line = "%s=%s\n" % (k, v)
                     self.fixed_lines.append(new_line)                    
 
-        if self.args['name'] not in checked and self.args['state'] == "present":
-            new_line = "%s=%s\n" % (self.args['name'], self.args['value'])
-            self.fixed_lines.append(new_line)                    
+        if self.args['state'] == "present":
+            for k in sorted(desired.keys()):
+                if k not in checked:
+                    new_line = "%s=%s\n" % (k, desired[k])
+                    self.fixed_lines.append(new_line)
 
     # Completely rewrite the sysctl file
     def write_sysctl(self):
@@ -342,19 +451,24 @@ def main():
     # defining module
     module = AnsibleModule(
         argument_spec = dict(
-            name = dict(aliases=['key'], required=True),
+            name = dict(aliases=['key'], required=False),
             value = dict(aliases=['val'], required=False, type='str'),
+            settings = dict(required=False, type='dict'),
             state = dict(default='present', choices=['present', 'absent']),
             reload = dict(default=True, type='bool'),
             sysctl_set = dict(default=False, type='bool'),
             ignoreerrors = dict(default=False, type='bool'),
             sysctl_file = dict(default='/etc/sysctl.conf')
         ),
+        required_one_of=[['name', 'settings']],
+        mutually_exclusive=[['name', 'settings'], ['value', 'settings']],
         supports_check_mode=True
     )
 
     result = SysctlModule(module)    
 
+    if module.params['settings'] is not None:
+        module.exit_json(changed=result.changed, updated=result.updated)
     module.exit_json(changed=result.changed)
     sys.exit(0)
 
@@ -29,10 +29,30 @@ description:
     - Manage user accounts and user attributes.
 options:
     name:
-        required: true
+        required: false
         aliases: [ "user" ]
         description:
             - Name of the user to create, remove or modify.
+            - Required unless I(users) is given.
+    users:
+        required: false
+        version_added: "2.1"
+        description:
+            - A list of accounts to manage in one task, each a dictionary of
+              the options of this module (C(name) is required in each). Options
+              given at the top level of the task apply to every entry unless
+              overridden.
+            - The passwd, group and shadow databases are read once for the
+              whole list, and each account is then created, modified or
+              removed with at most one command. Where C(gpasswd) is available,
+              supplementary group changes of existing accounts are applied
+              with a single C(gpasswd -M) per group.
+            - The result holds a I(results) list with the outcome for each
+              account.
+            - The list is not logged, as it may hold passwords; only the
+              C(password) and C(ssh_key_passphrase) values of the entries are
+              masked in the result.
+            - Mutually exclusive with I(name).
     comment:
         required: false
         description:
@@ -212,6 +232,21 @@ EXAMPLES = '''
 
 # added a consultant whose account you want to expire
 - user: name=james18 shell=/bin/zsh groups=developers expires=1422403387
+
+# Manage several accounts in one task, all with a bash shell
+- user:
+    shell: /bin/bash
+    users:
+      - name: alice
+        uid: 2001
+        groups: developers,docker
+        append: yes
+      - name: bob
+        uid: 2002
+        groups: developers
+      - name: mallory
+        state: absent
+        remove: yes
 '''
 
 import os
@@ -228,6 +263,116 @@ except:
     HAVE_SPWD=False
 
 
+class AccountSnapshot(object):
+    """
+    A single read of the passwd, group and shadow databases.
+
+    Used by the users list mode so that each account does not repeat its own
+    pwd, grp and spwd lookups (and grp.getgrall() enumeration, which is
+    expensive with SSSD/LDAP). Names that were not enumerated, e.g. because
+    the directory service does not allow enumeration, are looked up once on
+    demand and cached.
+    """
+
+    def __init__(self, shadowfile=None):
+        self.users = {}
+        for entry in pwd.getpwall():
+            self.users.setdefault(entry[0], list(entry))
+        self.groups = {}
+        self.gids = {}
+        self.memberships = {}
+        for entry in grp.getgrall():
+            self._add_group(list(entry))
+
+        self.shadow = {}
+        if HAVE_SPWD:
+            try:
+                for entry in spwd.getspall():
+                    self.shadow[entry[0]] = entry[1]
+            except (KeyError, OSError):
+                pass
+        elif shadowfile and os.path.exists(shadowfile) and os.access(shadowfile, os.R_OK):
+            for line in open(shadowfile).readlines():
+                fields = line.split(':')
+                if len(fields) > 1:
+                    self.shadow[fields[0]] = fields[1]
+
+    def _add_group(self, entry):
+        if entry[0] in self.groups:
+            return
+        self.groups[entry[0]] = entry
+        self.gids.setdefault(entry[2], entry)
+        for member in entry[3]:
+            self.memberships.setdefault(member, set()).add(entry[0])
+
+    def get_user(self, name):
+        if name not in self.users:
+            try:
+                self.users[name] = list(pwd.getpwnam(name))
+            except KeyError:
+                self.users[name] = None
+        return self.users[name]
+
+    def refresh_user(self, name):
+        """ Re-read a single account after it was created, changed or removed """
+        self.users.pop(name, None)
+        self.shadow.pop(name, None)
+        if HAVE_SPWD:
+            try:
+                self.shadow[name] = spwd.getspnam(name)[1]
+            except KeyError:
+                pass
+        return self.get_user(name)
+
+    def get_group(self, group):
+        """ Look up a group by gid or name, like User.group_info() """
+        try:
+            gid = int(group)
+        except ValueError:
+            gid = None
+        if gid is not None:
+            if gid not in self.gids:
+                try:
+                    self._add_group(list(grp.getgrgid(gid)))
+                except KeyError:
+                    pass
+            if gid in self.gids:
+                return self.gids[gid]
+        if group not in self.groups:
+            try:
+                self._add_group(list(grp.getgrnam(group)))
+            except KeyError:
+                self.groups[group] = None
+        return self.groups[group]
+
+    def refresh_groups(self, groups):
+        """ Re-read the members of groups after an account was created or removed """
+        for group in groups:
+            entry = self.get_group(group)
+            if entry is None:
+                continue
+            try:
+                members = grp.getgrnam(entry[0])[3]
+            except KeyError:
+                continue
+            self.set_members(entry[0], members)
+
+    def get_memberships(self, name):
+        """ Names of the groups listing name as a member """
+        return self.memberships.get(name, set())
+
+    def set_members(self, group, members):
+        entry = self.get_group(group)
+        for member in entry[3]:
+            self.memberships.get(member, set()).discard(group)
+        entry[3] = list(members)
+        for member in members:
+            self.memberships.setdefault(member, set()).add(group)
+
+    def get_password(self, name):
+        return self.shadow.get(name)
+
+
 class User(object):
     """
     This is a generic User manipulation class that is subclassed
@@ -248,50 +393,55 @@ class User(object):
     distribution = None
     SHADOWFILE = '/etc/shadow'
     DATE_FORMAT = '%Y-%m-%d'
+    # cached result of _check_usermod_append()
+    _usermod_has_append = None
 
     def __new__(cls, *args, **kwargs):
         return load_platform_subclass(User, args, kwargs)
 
-    def __init__(self, module):
+    def __init__(self, module, params=None, accounts=None):
+        if params is None:
+            params = module.params
         self.module     = module
-        self.state      = module.params['state']
-        self.name       = module.params['name']
-        self.uid        = module.params['uid']
-        self.non_unique  = module.params['non_unique']
-        self.seuser     = module.params['seuser']
-        self.group      = module.params['group']
-        self.groups     = module.params['groups']
-        self.comment    = module.params['comment']
-        self.shell      = module.params['shell']
-        self.password   = module.params['password']
-        self.force      = module.params['force']
-        self.remove     = module.params['remove']
-        self.createhome = module.params['createhome']
-        self.move_home  = module.params['move_home']
-        self.skeleton   = module.params['skeleton']
-        self.system     = module.params['system']
-        self.login_class = module.params['login_class']
-        self.append     = module.params['append']
-        self.sshkeygen  = module.params['generate_ssh_key']
-        self.ssh_bits   = module.params['ssh_key_bits']
-        self.ssh_type   = module.params['ssh_key_type']
-        self.ssh_comment = module.params['ssh_key_comment']
-        self.ssh_passphrase = module.params['ssh_key_passphrase']
-        self.update_password = module.params['update_password']
+        self.accounts   = accounts
+        self.state      = params['state']
+        self.name       = params['name']
+        self.uid        = params['uid']
+        self.non_unique  = params['non_unique']
+        self.seuser     = params['seuser']
+        self.group      = params['group']
+        self.groups     = params['groups']
+        self.comment    = params['comment']
+        self.shell      = params['shell']
+        self.password   = params['password']
+        self.force      = params['force']
+        self.remove     = params['remove']
+        self.createhome = params['createhome']
+        self.move_home  = params['move_home']
+        self.skeleton   = params['skeleton']
+        self.system     = params['system']
+        self.login_class = params['login_class']
+        self.append     = params['append']
+        self.sshkeygen  = params['generate_ssh_key']
+        self.ssh_bits   = params['ssh_key_bits']
+        self.ssh_type   = params['ssh_key_type']
+        self.ssh_comment = params['ssh_key_comment']
+        self.ssh_passphrase = params['ssh_key_passphrase']
+        self.update_password = params['update_password']
         self.home    = None
         self.expires = None
 
-        if module.params['home'] is not None:
-            self.home = os.path.expanduser(module.params['home'])
+        if params['home'] is not None:
+            self.home = os.path.expanduser(params['home'])
 
-        if module.params['expires']:
+        if params['expires']:
             try:
-                self.expires = time.gmtime(module.params['expires'])
+                self.expires = time.gmtime(params['expires'])
             except Exception,e:
                 module.fail_json("Invalid expires time %s: %s" %(self.expires, str(e)))
 
-        if module.params['ssh_key_file'] is not None:
-            self.ssh_file = module.params['ssh_key_file']
+        if params['ssh_key_file'] is not None:
+            self.ssh_file = params['ssh_key_file']
         else:
             self.ssh_file = os.path.join('.ssh', 'id_%s' % self.ssh_type)
 
@@ -384,6 +534,11 @@ class User(object):
 
 
     def _check_usermod_append(self):
+        if User._usermod_has_append is None:
+            User._usermod_has_append = self._probe_usermod_append()
+        return User._usermod_has_append
+
+    def _probe_usermod_append(self):
         # check if this version of usermod can append groups
         usermod_path = self.module.get_bin_path('usermod', True)
 
@@ -491,6 +646,8 @@ class User(object):
         return self.execute_command(cmd)
 
     def group_exists(self,group):
+        if self.accounts is not None:
+            return self.accounts.get_group(group) is not None
         try:
             # Try group as a gid first
             grp.getgrgid(int(group))
@@ -505,6 +662,8 @@ class User(object):
     def group_info(self, group):
         if not self.group_exists(group):
             return False
+        if self.accounts is not None:
+            return list(self.accounts.get_group(group))
         try:
             # Try group as a gid first
             return list(grp.getgrgid(int(group)))
@@ -526,12 +685,19 @@ class User(object):
     def user_group_membership(self):
         groups = []
         info = self.get_pwd_info()
+        if self.accounts is not None:
+            for group in self.accounts.get_memberships(self.name):
+                if not info[3] == self.accounts.get_group(group)[2]:
+                    groups.append(group)
+            return groups
         for group in grp.getgrall():
             if self.name in group.gr_mem and not info[3] == group.gr_gid:
                 groups.append(group[0])
         return groups
 
     def user_exists(self):
+        if self.accounts is not None:
+            return self.accounts.get_user(self.name) is not None
         try:
             if pwd.getpwnam(self.name):
                 return True
@@ -541,6 +707,8 @@ class User(object):
     def get_pwd_info(self):
         if not self.user_exists():
             return False
+        if self.accounts is not None:
+            return list(self.accounts.get_user(self.name))
         return list(pwd.getpwnam(self.name))
 
     def user_info(self):
@@ -553,6 +721,11 @@ class User(object):
 
     def user_password(self):
         passwd = ''
+        if self.accounts is not None and self.user_exists():
+            passwd = self.accounts.get_password(self.name)
+            if passwd is not None:
+                return passwd
+            passwd = ''
         if HAVE_SPWD:
             try:
                 passwd = spwd.getspnam(self.name)[1]
@@ -2039,57 +2212,13 @@ class HPUX(User):
 
 # ===========================================
 
-def main():
-    ssh_defaults = {
-            'bits': '2048',
-            'type': 'rsa',
-            'passphrase': None,
-            'comment': 'ansible-generated on %s' % socket.gethostname()
-    }
-    module = AnsibleModule(
-        argument_spec = dict(
-            state=dict(default='present', choices=['present', 'absent'], type='str'),
-            name=dict(required=True, aliases=['user'], type='str'),
-            uid=dict(default=None, type='str'),
-            non_unique=dict(default='no', type='bool'),
-            group=dict(default=None, type='str'),
-            groups=dict(default=None, type='str'),
-            comment=dict(default=None, type='str'),
-            home=dict(default=None, type='str'),
-            shell=dict(default=None, type='str'),
-            password=dict(default=None, type='str', no_log=True),
-            login_class=dict(default=None, type='str'),
-            # following options are specific to selinux
-            seuser=dict(default=None, type='str'),
-            # following options are specific to userdel
-            force=dict(default='no', type='bool'),
-            remove=dict(default='no', type='bool'),
-            # following options are specific to useradd
-            createhome=dict(default='yes', type='bool'),
-            skeleton=dict(default=None, type='str'),
-            system=dict(default='no', type='bool'),
-            # following options are specific to usermod
-            move_home=dict(default='no', type='bool'),
-            append=dict(default='no', type='bool'),
-            # following are specific to ssh key generation
-            generate_ssh_key=dict(type='bool'),
-            ssh_key_bits=dict(default=ssh_defaults['bits'], type='str'),
-            ssh_key_type=dict(default=ssh_defaults['type'], type='str'),
-            ssh_key_file=dict(default=None, type='str'),
-            ssh_key_comment=dict(default=ssh_defaults['comment'], type='str'),
-            ssh_key_passphrase=dict(default=None, type='str', no_log=True),
-            update_password=dict(default='always',choices=['always','on_create'],type='str'),
-            expires=dict(default=None, type='float'),
-        ),
-        supports_check_mode=True
-    )
-
-    user = User(module)
-
-    module.debug('User instantiated - platform %s' % user.platform)
-    if user.distribution:
-        module.debug('User instantiated - distribution %s' % user.distribution)
+# ===========================================
 
+def manage_user(module, user):
+    """
+    Bring one account to its desired state and return its result. Fails the
+    module on errors.
+    """
     rc = None
     out = ''
     err = ''
@@ -2099,7 +2228,8 @@ def main():
     if user.state == 'absent':
         if user.user_exists():
             if module.check_mode:
-                module.exit_json(changed=True)
+                result['changed'] = True
+                return result
             (rc, out, err) = user.remove_user()
             if rc != 0:
                 module.fail_json(name=user.name, msg=err, rc=rc)
@@ -2108,7 +2238,8 @@ def main():
     elif user.state == 'present':
         if not user.user_exists():
             if module.check_mode:
-                module.exit_json(changed=True)
+                result['changed'] = True
+                return result
             (rc, out, err) = user.create_user()
             result['system'] = user.system
             result['createhome'] = user.createhome
@@ -2126,6 +2257,13 @@ def main():
         result['changed'] = False
     else:
         result['changed'] = True
+        if user.accounts is not None and not module.check_mode:
+            # useradd -G, usermod -G and userdel also change group members
+            groups = set(user.accounts.get_memberships(user.name))
+            if user.groups:
+                groups.update(filter(None, user.groups.split(',')))
+            user.accounts.refresh_user(user.name)
+            user.accounts.refresh_groups(groups)
     if out:
         result['stdout'] = out
     if err:
@@ -2171,7 +2309,205 @@ def main():
             result['ssh_key_file'] = user.get_ssh_key_path()
             result['ssh_public_key'] = user.get_ssh_public_key()
 
-    module.exit_json(**result)
+    return result
+
+def get_users_params(module):
+    """
+    Turn each entry of the users list into a full set of user parameters.
+    Options given at the top level of the task act as defaults for every
+    entry.
+    """
+    defaults = dict(module.params)
+    del defaults['users']
+    users = []
+    secrets = set()
+    for entry in module.params['users']:
+        if not isinstance(entry, dict):
+            module.fail_json(msg="users must be a list of dictionaries")
+        params = dict(defaults)
+        for key, value in entry.items():
+            if key == 'user':
+                key = 'name'
+            if key not in defaults:
+                module.fail_json(msg="unsupported parameter for users: %s" % key)
+            spec = module.argument_spec[key]
+            if value is not None:
+                if spec.get('type') == 'bool':
+                    value = module.boolean(value)
+                elif spec.get('type') == 'float':
+                    value = float(value)
+                elif key == 'groups' and isinstance(value, list):
+                    value = ','.join([str(g) for g in value])
+                else:
+                    value = str(value)
+            if 'choices' in spec and value not in spec['choices']:
+                module.fail_json(msg="value of %s must be one of: %s, got: %s" % (key, ', '.join(spec['choices']), value))
+            params[key] = value
+        if not params['name']:
+            module.fail_json(msg="every entry of users requires a name")
+        for key in ('password', 'ssh_key_passphrase'):
+            if params[key]:
+                secrets.add(params[key])
+        users.append(params)
+
+    # users is no_log so that the passwords in it never reach the logs, which
+    # also masks every name and path of the list in the result; only the
+    # secrets themselves need hiding there
+    no_log_values = getattr(module, 'no_log_values', None)
+    if no_log_values is not None:
+        no_log_values.clear()
+        for secret in secrets:
+            no_log_values.update(return_values(secret))
+    return users
+
+def queue_group_members(user, pending):
+    """
+    Record the supplementary group changes of an existing user in pending
+    (group name -> (members to add, members to remove)) instead of passing
+    them to usermod, so that they can be applied with one gpasswd call per
+    group.
+    Returns True if any membership changes.
+    """
+    accounts = user.accounts
+    current = set(user.user_group_membership())
+    desired = set()
+    if user.groups != '':
+        # groups may be given by gid, membership is listed by name
+        for group in user.get_groups_set():
+            desired.add(accounts.get_group(group)[0])
+    add = desired.difference(current)
+    remove = set()
+    if not user.append:
+        remove = current.difference(desired)
+    for group in add.union(remove):
+        name = accounts.get_group(group)[0]
+        if name not in pending:
+            pending[name] = (set(), set())
+        if group in add:
+            pending[name][0].add(user.name)
+            pending[name][1].discard(user.name)
+        else:
+            pending[name][1].add(user.name)
+            pending[name][0].discard(user.name)
+    return bool(add or remove)
+
+def manage_users(module):
+    """
+    Reconcile every account of the users list against one snapshot of the
+    passwd, group and shadow databases, then exit the module.
+
+    Each account costs at most one useradd/usermod/userdel. Where gpasswd is
+    available, supplementary group changes of existing accounts are merged
+    into a single gpasswd -M per group instead of one usermod per account.
+    They are kept as additions and removals and applied to the members the
+    group has once every account was created or removed, so that accounts
+    created, removed or changed earlier in the list are not undone.
+    """
+    users = get_users_params(module)
+    accounts = None
+    gpasswd = None
+    results = []
+    pending = {}
+
+    for params in users:
+        user = User(module, params)
+        if accounts is None:
+            accounts = AccountSnapshot(user.SHADOWFILE)
+            if user.platform == 'Generic':
+                gpasswd = module.get_bin_path('gpasswd')
+        user.accounts = accounts
+
+        groups_changed = False
+        groups = user.groups
+        if gpasswd and user.state == 'present' and user.groups is not None and user.user_exists():
+            groups_changed = queue_group_members(user, pending)
+            user.groups = None
+
+        result = manage_user(module, user)
+        if groups is not None:
+            result['groups'] = groups
+        if groups_changed:
+            result['changed'] = True
+        results.append(result)
+
+    changed = False
+    for result in results:
+        changed = changed or result['changed']
+
+    for group, (add, remove) in pending.items():
+        current = set(accounts.get_group(group)[3])
+        # accounts removed further down the list are not added back
+        add = set([name for name in add if accounts.get_user(name) is not None])
+        members = current.union(add).difference(remove)
+        if members == current:
+            continue
+        if not module.check_mode:
+            members = sorted(members)
+            rc, out, err = module.run_command([gpasswd, '-M', ','.join(members), group])
+            if rc != 0:
+                module.fail_json(msg="failed to set members of group %s: %s" % (group, err), rc=rc, results=results)
+            accounts.set_members(group, members)
+
+    module.exit_json(changed=changed, results=results)
+
+def main():
+    ssh_defaults = {
+            'bits': '2048',
+            'type': 'rsa',
+            'passphrase': None,
+            'comment': 'ansible-generated on %s' % socket.gethostname()
+    }
+    module = AnsibleModule(
+        argument_spec = dict(
+            state=dict(default='present', choices=['present', 'absent'], type='str'),
+            name=dict(default=None, aliases=['user'], type='str'),
+            users=dict(default=None, type='list', no_log=True),
+            uid=dict(default=None, type='str'),
+            non_unique=dict(default='no', type='bool'),
+            group=dict(default=None, type='str'),
+            groups=dict(default=None, type='str'),
+            comment=dict(default=None, type='str'),
+            home=dict(default=None, type='str'),
+            shell=dict(default=None, type='str'),
+            password=dict(default=None, type='str', no_log=True),
+            login_class=dict(default=None, type='str'),
+            # following options are specific to selinux
+            seuser=dict(default=None, type='str'),
+            # following options are specific to userdel
+            force=dict(default='no', type='bool'),
+            remove=dict(default='no', type='bool'),
+            # following options are specific to useradd
+            createhome=dict(default='yes', type='bool'),
+            skeleton=dict(default=None, type='str'),
+            system=dict(default='no', type='bool'),
+            # following options are specific to usermod
+            move_home=dict(default='no', type='bool'),
+            append=dict(default='no', type='bool'),
+            # following are specific to ssh key generation
+            generate_ssh_key=dict(type='bool'),
+            ssh_key_bits=dict(default=ssh_defaults['bits'], type='str'),
+            ssh_key_type=dict(default=ssh_defaults['type'], type='str'),
+            ssh_key_file=dict(default=None, type='str'),
+            ssh_key_comment=dict(default=ssh_defaults['comment'], type='str'),
+            ssh_key_passphrase=dict(default=None, type='str', no_log=True),
+            update_password=dict(default='always',choices=['always','on_create'],type='str'),
+            expires=dict(default=None, type='float'),
+        ),
+        required_one_of=[['name', 'users']],
+        mutually_exclusive=[['name', 'users']],
+        supports_check_mode=True
+    )
+
+    if module.params['users'] is not None:
+        manage_users(module)
+
+    user = User(module)
+
+    module.debug('User instantiated - platform %s' % user.platform)
+    if user.distribution:
+        module.debug('User instantiated - distribution %s' % user.distribution)
+
+    module.exit_json(**manage_user(module, user))
 
 # import module snippets
 from ansible.module_utils.basic import *
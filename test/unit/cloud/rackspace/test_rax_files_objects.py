@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+
+import mock
+import pytest
+
+from cloud.rackspace import rax_files_objects
+
+
+class FakeObject(object):
+    def __init__(self, name, data, metadata=None):
+        self.name = name
+        self.data = data
+        self.etag = hashlib.md5(data).hexdigest()
+        self.total_bytes = len(data)
+        self.metadata = metadata or {}
+
+    def get_metadata(self):
+        return dict(self.metadata)
+
+    def set_metadata(self, meta):
+        for k, v in meta.items():
+            self.metadata['%s%s' % (rax_files_objects.META_PREFIX,
+                                    k.lower())] = str(v)
+
+
+class FakeContainer(object):
+    '''A local stand-in for a pyrax Swift container, implementing only the
+    calls TransferEngine makes.  Names listed in fail are refused.'''
+
+    name = 'testcont'
+
+    def __init__(self, objects=None, fail=()):
+        self.objects = dict((o.name, o) for o in objects or [])
+        self.fail = set(fail)
+        self.uploads = []
+        self.downloads = []
+        self.listings = 0
+        self.lock = threading.Lock()
+
+    def get_objects(self, full_listing=False):
+        self.listings += 1
+        return list(self.objects.values())
+
+    def get_object(self, name):
+        return self.objects[name]
+
+    def upload_file(self, path, obj_name=None, ttl=None, headers=None):
+        if obj_name in self.fail:
+            raise Exception('upload of %s refused' % obj_name)
+        f = open(path, 'rb')
+        try:
+            data = f.read()
+        finally:
+            f.close()
+        metadata = {}
+        for k, v in (headers or {}).items():
+            metadata[k.lower()] = str(v)
+        obj = FakeObject(obj_name, data, metadata)
+        self.lock.acquire()
+        try:
+            self.objects[obj_name] = obj
+            self.uploads.append(obj_name)
+        finally:
+            self.lock.release()
+        return obj
+
+    def download_object(self, name, dest, structure=True):
+        if name in self.fail:
+            raise Exception('download of %s refused' % name)
+        if structure:
+            path = os.path.join(dest, name)
+        else:
+            path = os.path.join(dest, os.path.basename(name))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        f = open(path, 'wb')
+        try:
+            f.write(self.objects[name].data)
+        finally:
+            f.close()
+        self.lock.acquire()
+        try:
+            self.downloads.append(name)
+        finally:
+            self.lock.release()
+
+
+def make_tree(root, count):
+    for i in range(count):
+        path = root.join('dir%d' % (i % 3), 'file%d' % i)
+        path.write('content %d' % i, ensure=True)
+    return rax_files_objects._folder_objects(str(root))
+
+
+def test_upload_folder_and_skip_unchanged(tmpdir):
+    jobs = make_tree(tmpdir.join('src'), 10)
+    container = FakeContainer()
+
+    engine = rax_files_objects.TransferEngine(container, 'upload', threads=4)
+    engine.upload(jobs)
+    assert sorted(engine.transferred) == sorted(n for n, p in jobs)
+    assert not engine.failed
+    assert container.listings == 1
+
+    engine = rax_files_objects.TransferEngine(container, 'upload', threads=4)
+    engine.upload(jobs)
+    assert engine.transferred == []
+    assert sorted(engine.skipped) == sorted(n for n, p in jobs)
+    assert len(container.uploads) == 10
+
+
+def test_upload_sends_metadata_with_object(tmpdir):
+    jobs = make_tree(tmpdir.join('src'), 2)
+    container = FakeContainer()
+
+    engine = rax_files_objects.TransferEngine(container, 'upload')
+    engine.upload(jobs, meta=dict(Owner='ops'))
+    for name, path in jobs:
+        assert container.objects[name].get_metadata() == {
+            'x-object-meta-owner': 'ops'}
+
+    engine = rax_files_objects.TransferEngine(container, 'upload')
+    engine.upload(jobs, meta=dict(Owner='dev'))
+    assert engine.transferred == []
+    assert sorted(engine.meta_updated) == sorted(n for n, p in jobs)
+
+
+def test_download(tmpdir):
+    objects = [FakeObject('a/one', 'one'), FakeObject('two', 'two')]
+    container = FakeContainer(objects)
+    dest = str(tmpdir.join('dest'))
+    jobs = [(o.name, os.path.join(dest, o.name)) for o in objects]
+
+    engine = rax_files_objects.TransferEngine(container, 'download',
+                                              threads=2)
+    engine.download(jobs, dest)
+    assert sorted(engine.transferred) == ['a/one', 'two']
+    assert tmpdir.join('dest', 'a', 'one').read() == 'one'
+    assert engine.bytes == 6
+
+    engine = rax_files_objects.TransferEngine(container, 'download')
+    engine.download(jobs, dest)
+    assert sorted(engine.skipped) == ['a/one', 'two']
+
+
+def test_state_is_saved_in_batches(tmpdir):
+    jobs = make_tree(tmpdir.join('src'), 25)
+    state_file = str(tmpdir.join('state.json'))
+    container = FakeContainer(fail=[jobs[0][0]])
+
+    engine = rax_files_objects.TransferEngine(container, 'upload',
+                                              state_file=state_file)
+    with mock.patch.object(rax_files_objects, 'STATE_FLUSH_OBJECTS', 10):
+        with mock.patch.object(rax_files_objects, 'STATE_FLUSH_SECONDS',
+                               3600):
+            with mock.patch.object(engine, '_save_state',
+                                   wraps=engine._save_state) as save:
+                engine.upload(jobs)
+
+    # Two full batches of ten, then the remaining four when the run ends
+    assert save.call_count == 3
+    assert list(engine.failed) == [jobs[0][0]]
+    state = json.load(open(state_file))
+    assert state['direction'] == 'upload'
+    assert len(state['done']) == 24
+
+
+def test_resume_skips_recorded_objects(tmpdir):
+    jobs = make_tree(tmpdir.join('src'), 5)
+    state_file = str(tmpdir.join('state.json'))
+    container = FakeContainer(fail=[jobs[0][0]])
+
+    engine = rax_files_objects.TransferEngine(container, 'upload',
+                                              state_file=state_file)
+    engine.upload(jobs)
+    assert len(engine.failed) == 1
+    assert os.path.exists(state_file)
+
+    container.fail = set()
+    engine = rax_files_objects.TransferEngine(container, 'upload',
+                                              skip_unchanged=False,
+                                              state_file=state_file)
+    with mock.patch.object(rax_files_objects, '_md5_file') as md5:
+        engine.upload(jobs)
+    assert not md5.called
+    assert engine.transferred == [jobs[0][0]]
+    assert len(engine.skipped) == 4
+    assert not os.path.exists(state_file)
+
+
+def test_state_for_other_direction_is_ignored(tmpdir):
+    state_file = tmpdir.join('state.json')
+    state_file.write(json.dumps(dict(direction='download',
+                                     done={'x': ['etag', 1, 1]})))
+    engine = rax_files_objects.TransferEngine(FakeContainer(), 'upload',
+                                              state_file=str(state_file))
+    assert engine._state == {}
+
+
+def test_failed_connection_marks_jobs_failed(tmpdir):
+    jobs = make_tree(tmpdir.join('src'), 3)
+
+    def connect():
+        raise Exception('no route to host')
+
+    engine = rax_files_objects.TransferEngine(FakeContainer(), 'upload',
+                                              threads=2, connect=connect)
+    engine.upload(jobs)
+    assert sorted(engine.failed) == sorted(n for n, p in jobs)
+    assert set(engine.failed.values()) == set(['no route to host'])
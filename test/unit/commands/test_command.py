@@ -0,0 +1,179 @@
+import os
+from hashlib import sha1
+
+from commands import command
+
+
+def fingerprint(*inputs):
+    digest = sha1()
+    command.fingerprint_inputs(digest, list(inputs))
+    return digest.hexdigest()
+
+
+class TestFingerprintInputs(object):
+
+    def test_unchanged_inputs_give_the_same_fingerprint(self, tmpdir):
+        tmpdir.join('a').write('one')
+        tmpdir.join('sub', 'b').write('two', ensure=True)
+        assert fingerprint(str(tmpdir)) == fingerprint(str(tmpdir))
+
+    def test_file_change_below_directory(self, tmpdir):
+        tmpdir.join('sub', 'b').write('two', ensure=True)
+        before = fingerprint(str(tmpdir))
+        tmpdir.join('sub', 'b').write('three')
+        assert fingerprint(str(tmpdir)) != before
+
+    def test_added_file_below_directory(self, tmpdir):
+        tmpdir.join('a').write('one')
+        before = fingerprint(str(tmpdir))
+        tmpdir.join('c').write('')
+        assert fingerprint(str(tmpdir)) != before
+
+    def test_mtime_change(self, tmpdir):
+        path = tmpdir.join('a')
+        path.write('one')
+        before = fingerprint(str(path))
+        os.utime(str(path), (0, 0))
+        assert fingerprint(str(path)) != before
+
+    def test_glob(self, tmpdir):
+        tmpdir.join('a.txt').write('one')
+        tmpdir.join('b.log').write('two')
+        pattern = str(tmpdir.join('*.txt'))
+        before = fingerprint(pattern)
+        tmpdir.join('b.log').write('changed')
+        assert fingerprint(pattern) == before
+        tmpdir.join('c.txt').write('three')
+        assert fingerprint(pattern) != before
+
+    def test_missing_input(self, tmpdir):
+        missing = str(tmpdir.join('missing'))
+        before = fingerprint(missing)
+        assert fingerprint(missing) == before
+        tmpdir.join('missing').write('')
+        assert fingerprint(missing) != before
+
+    def test_files_are_not_read(self, tmpdir, monkeypatch):
+        tmpdir.join('a').write('one')
+
+        def fail(*args, **kwargs):
+            raise AssertionError('input file was opened')
+        monkeypatch.setattr(command, 'open', fail, raising=False)
+        fingerprint(str(tmpdir))
+
+
+class TestGetFingerprint(object):
+
+    def args(self, **kwargs):
+        args = dict(args=['make', 'all'], shell=False, executable=None,
+                    chdir='/srv', cache_env=None, inputs=None)
+        args.update(kwargs)
+        return args
+
+    def test_stable(self):
+        assert (command.get_fingerprint(**self.args()) ==
+                command.get_fingerprint(**self.args()))
+
+    def test_command_line_and_options_count(self):
+        base = command.get_fingerprint(**self.args())
+        for change in [dict(args=['make', 'install']), dict(shell=True),
+                       dict(executable='/bin/bash'), dict(chdir='/tmp')]:
+            assert command.get_fingerprint(**self.args(**change)) != base
+
+    def test_cache_env(self, monkeypatch):
+        monkeypatch.setenv('BUILD_FLAVOR', 'debug')
+        args = self.args(cache_env=['BUILD_FLAVOR'])
+        before = command.get_fingerprint(**args)
+        monkeypatch.setenv('UNRELATED', 'x')
+        assert command.get_fingerprint(**args) == before
+        monkeypatch.setenv('BUILD_FLAVOR', 'release')
+        assert command.get_fingerprint(**args) != before
+        monkeypatch.delenv('BUILD_FLAVOR')
+        assert command.get_fingerprint(**args) != before
+
+    def test_cache_env_order_does_not_matter(self, monkeypatch):
+        monkeypatch.setenv('A', '1')
+        monkeypatch.setenv('B', '2')
+        assert (command.get_fingerprint(**self.args(cache_env=['A', 'B'])) ==
+                command.get_fingerprint(**self.args(cache_env=['B', 'A'])))
+
+    def test_inputs(self, tmpdir):
+        tmpdir.join('settings.py').write('DEBUG = False')
+        args = self.args(inputs=[str(tmpdir)])
+        before = command.get_fingerprint(**args)
+        tmpdir.join('settings.py').write('DEBUG = True')
+        assert command.get_fingerprint(**args) != before
+
+
+class TestResultCache(object):
+
+    def test_round_trip(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(command, 'RESULT_CACHE_DIR', str(tmpdir))
+        record = dict(fingerprint='abc', rc=0, stdout='out', stderr='')
+        command.save_result('app/migrate', record)
+        assert command.load_result('app/migrate', 'abc') == record
+        assert command.load_result('app/migrate', 'other') is None
+        assert command.load_result('app_migrate', 'abc') is None
+
+
+class TestOutputCapture(object):
+
+    def capture(self, tmpdir, limit, chunks):
+        capture = command.OutputCapture('stdout', limit, str(tmpdir))
+        for chunk in chunks:
+            capture.write(chunk)
+        capture.close()
+        return capture
+
+    def test_short_output_is_kept_whole(self, tmpdir):
+        capture = self.capture(tmpdir, 10, ['abc', 'defgh', 'ij'])
+        assert not capture.truncated()
+        assert capture.output() == 'abcdefghij'
+        assert capture.size == 10
+        assert capture.spool_path is None
+        assert tmpdir.listdir() == []
+
+    def test_head_and_tail_are_kept(self, tmpdir):
+        data = ''.join([chr(ord('a') + i % 26) for i in range(100)])
+        capture = self.capture(tmpdir, 10, [data[i:i + 7] for i in range(0, 100, 7)])
+        assert capture.truncated()
+        assert capture.size == 100
+        output = capture.output()
+        assert output.startswith(data[:5] + '\n')
+        assert output.endswith('\n' + data[-5:])
+        assert '90 bytes omitted' in output
+        assert capture.spool_path in output
+
+    def test_spool_holds_complete_output(self, tmpdir):
+        data = 'x' * 1000 + 'y' * 1000
+        capture = self.capture(tmpdir, 100, [data[:1], data[1:1500], data[1500:]])
+        assert open(capture.spool_path, 'rb').read() == data
+        assert capture.output().startswith('x' * 50 + '\n')
+        assert capture.output().endswith('\n' + 'y' * 50)
+
+    def test_tail_chunks_are_dropped(self, tmpdir):
+        capture = self.capture(tmpdir, 4, ['a' * 10] + ['b'] * 1000)
+        assert sum([len(chunk) for chunk in capture.tail]) < 10
+        assert capture.output().endswith('\nbb')
+
+    def test_cut_on_utf8_boundaries(self, tmpdir):
+        snowman = u'\u2603'.encode('utf-8')
+        data = snowman * 10
+        # 30 bytes, the head window of 4 bytes and tail window of 4 bytes
+        # both cut a 3 byte character
+        capture = self.capture(tmpdir, 8, [data])
+        output = capture.output()
+        output.decode('utf-8')
+        assert output.startswith(snowman + '\n')
+        assert output.endswith('\n' + snowman)
+        assert '24 bytes omitted' in output
+
+    def test_utf8_helpers(self):
+        euro = u'\u20ac'.encode('utf-8')
+        assert command._utf8_head('ab' + euro[:2]) == 'ab'
+        assert command._utf8_head('ab' + euro) == 'ab' + euro
+        assert command._utf8_head('abc') == 'abc'
+        assert command._utf8_head('') == ''
+        assert command._utf8_tail(euro[1:] + 'ab') == 'ab'
+        assert command._utf8_tail(euro + 'ab') == euro + 'ab'
+        assert command._utf8_tail('') == ''
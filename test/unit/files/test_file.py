@@ -0,0 +1,109 @@
+import imp
+import os
+import stat
+
+import pytest
+
+# imported by path, as files.file the implicit relative import of stat
+# would pick up files/stat.py
+file_module = imp.load_source(
+    'file_module', os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                                'files', 'file.py'))
+
+
+class FailJson(Exception):
+    pass
+
+
+class FakeModule(object):
+    check_mode = False
+
+    def selinux_enabled(self):
+        return False
+
+    def fail_json(self, **kwargs):
+        raise FailJson(kwargs)
+
+
+def make_tree(root):
+    for i in range(30):
+        path = root.join('d%d' % (i % 3), 'e%d' % (i % 2), 'f%d' % i)
+        path.write('content', ensure=True)
+        path.chmod(0644)
+    for path in root.visit(lambda p: p.check(dir=1)):
+        path.chmod(0755)
+    root.join('link').mksymlinkto(root.join('d0'))
+
+
+def modes(root):
+    result = {}
+    for path in root.visit():
+        st = os.lstat(str(path))
+        result[root.bestrelpath(path)] = stat.S_IMODE(st.st_mode)
+    return result
+
+
+def run(root, threads=1, follow=False, mode=0750):
+    file_args = dict(path=str(root), owner=None, group=None, mode=mode)
+    engine = file_module.RecursiveAttributes(FakeModule(), file_args, follow)
+    return engine.run(threads)
+
+
+@pytest.mark.parametrize('threads', [1, 4])
+def test_modes_are_applied_below_the_path(tmpdir, threads):
+    make_tree(tmpdir)
+    stats = run(tmpdir, threads)
+
+    # 30 files, 3 + 6 directories and the link
+    assert stats['examined'] == 40
+    assert stats['changed'] == 39
+    assert stats['mode'] == 39
+    for path, mode in modes(tmpdir).items():
+        if path != 'link':
+            assert mode == 0750, path
+
+    stats = run(tmpdir, threads)
+    assert stats['examined'] == 40
+    assert stats['changed'] == 0
+
+
+def test_serial_and_threaded_walks_agree(tmpdir):
+    serial = tmpdir.join('serial')
+    threaded = tmpdir.join('threaded')
+    make_tree(serial)
+    make_tree(threaded)
+
+    for follow in (False, True):
+        assert run(serial, 1, follow, 0700) == run(threaded, 8, follow, 0700)
+        assert modes(serial) == modes(threaded)
+
+
+def test_python24(tmpdir, monkeypatch):
+    # python 2.4 and 2.5 have neither os.fchown nor os.fchmod, 2.4 has no
+    # Queue.task_done() and Queue.join()
+    monkeypatch.setattr(file_module, 'HAVE_FCHOWN', False)
+    monkeypatch.delattr(os, 'fchown')
+    monkeypatch.delattr(os, 'fchmod')
+    monkeypatch.delattr(file_module.Queue.Queue, 'task_done')
+    monkeypatch.delattr(file_module.Queue.Queue, 'join')
+    make_tree(tmpdir)
+
+    stats = run(tmpdir, 4)
+    assert stats['mode'] == 39
+    assert tmpdir.join('d1', 'e0', 'f4').stat().mode & 0777 == 0750
+
+
+def test_errors_fail_the_module(tmpdir, monkeypatch):
+    make_tree(tmpdir)
+
+    def chmod(*args):
+        raise OSError(1, 'Operation not permitted')
+    monkeypatch.setattr(file_module, 'HAVE_FCHOWN', False)
+    monkeypatch.setattr(os, 'chmod', chmod)
+
+    with pytest.raises(FailJson) as e:
+        run(tmpdir, 4)
+    # directories that could not be changed are not walked
+    assert 'failed to set attributes of 3 entries' in e.value.args[0]['msg']
+    assert sorted(e.value.args[0]['failed_paths']) == [
+        str(tmpdir.join(d)) for d in ('d0', 'd1', 'd2')]
@@ -0,0 +1,177 @@
+import os
+
+import pytest
+
+from system import user
+
+
+class FakeDb(object):
+    '''passwd and group databases that the fake pwd and grp modules read and
+    the fake useradd, userdel and gpasswd commands change.'''
+
+    def __init__(self, users, groups):
+        self.users = {}
+        for name, uid in users:
+            self.users[name] = [name, 'x', uid, uid, '', '/home/' + name,
+                                '/bin/sh']
+        self.groups = {}
+        for name, gid, members in groups:
+            self.groups[name] = [name, 'x', gid, list(members)]
+        self.commands = []
+
+    # pwd
+    def getpwall(self):
+        return [list(e) for e in self.users.values()]
+
+    def getpwnam(self, name):
+        if name not in self.users:
+            raise KeyError(name)
+        return list(self.users[name])
+
+    # grp
+    def getgrall(self):
+        return [self.getgrnam(name) for name in self.groups]
+
+    def getgrnam(self, name):
+        if name not in self.groups:
+            raise KeyError(name)
+        entry = self.groups[name]
+        return [entry[0], entry[1], entry[2], list(entry[3])]
+
+    def getgrgid(self, gid):
+        for name, entry in self.groups.items():
+            if entry[2] == gid:
+                return self.getgrnam(name)
+        raise KeyError(gid)
+
+    def run_command(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        tool = os.path.basename(cmd[0])
+        if tool == 'useradd':
+            name = cmd[-1]
+            uid = 1000 + len(self.users)
+            self.users[name] = [name, 'x', uid, uid, '', '/home/' + name,
+                                '/bin/sh']
+            if '-G' in cmd:
+                for group in cmd[cmd.index('-G') + 1].split(','):
+                    self.groups[group][3].append(name)
+        elif tool == 'userdel':
+            name = cmd[-1]
+            del self.users[name]
+            for entry in self.groups.values():
+                if name in entry[3]:
+                    entry[3].remove(name)
+        elif tool == 'gpasswd':
+            members = filter(None, cmd[2].split(','))
+            for name in members:
+                if name not in self.users:
+                    return 3, '', 'user %s does not exist' % name
+            self.groups[cmd[3]][3] = members
+        else:
+            raise AssertionError('unexpected command %s' % cmd)
+        return 0, '', ''
+
+
+class ExitJson(Exception):
+    pass
+
+
+class FailJson(Exception):
+    pass
+
+
+class FakeModule(object):
+    check_mode = False
+
+    def __init__(self, db):
+        self.db = db
+
+    def run_command(self, cmd, **kwargs):
+        return self.db.run_command(cmd, **kwargs)
+
+    def get_bin_path(self, name, required=False):
+        return '/usr/sbin/' + name
+
+    def fail_json(self, **kwargs):
+        raise FailJson(kwargs)
+
+    def exit_json(self, **kwargs):
+        raise ExitJson(kwargs)
+
+
+DEFAULTS = dict(
+    state='present', name=None, uid=None, non_unique=False, seuser=None,
+    group=None, groups=None, comment=None, home=None, shell=None,
+    password=None, login_class=None, force=False, remove=False,
+    createhome=False, skeleton=None, system=False, move_home=False,
+    append=False, generate_ssh_key=None, ssh_key_bits='2048',
+    ssh_key_type='rsa', ssh_key_file=None, ssh_key_comment='',
+    ssh_key_passphrase=None, update_password='always', expires=None)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDb(users=[('alice', 1001), ('bob', 1002)],
+                groups=[('dev', 100, ['alice', 'bob']),
+                        ('ops', 101, ['bob'])])
+    monkeypatch.setattr(user, 'pwd', db)
+    monkeypatch.setattr(user, 'grp', db)
+    monkeypatch.setattr(user, 'HAVE_SPWD', False)
+    monkeypatch.setattr(user.User, 'SHADOWFILE', None)
+    monkeypatch.setattr(user.User, '_usermod_has_append', True)
+    monkeypatch.setattr(user, 'load_platform_subclass',
+                        lambda cls, args, kwargs: object.__new__(cls))
+    return db
+
+
+def run_users(db, monkeypatch, entries):
+    users = []
+    for entry in entries:
+        params = dict(DEFAULTS)
+        params.update(entry)
+        users.append(params)
+    module = FakeModule(db)
+    monkeypatch.setattr(user, 'get_users_params', lambda module: users)
+    try:
+        user.manage_users(module)
+    except ExitJson, e:
+        return e.args[0]
+    raise AssertionError('manage_users did not exit')
+
+
+def test_mixed_create_modify_remove(db, monkeypatch):
+    result = run_users(db, monkeypatch, [
+        dict(name='carol', groups='dev'),
+        dict(name='bob', state='absent'),
+        dict(name='alice', groups='ops'),
+    ])
+
+    assert result['changed']
+    # carol joined dev through useradd -G, bob left both groups through
+    # userdel, alice moved from dev to ops through gpasswd
+    assert sorted(db.groups['dev'][3]) == ['carol']
+    assert sorted(db.groups['ops'][3]) == ['alice']
+    gpasswd = [cmd for cmd in db.commands if cmd[0].endswith('gpasswd')]
+    assert sorted(gpasswd) == [['/usr/sbin/gpasswd', '-M', 'alice', 'ops'],
+                               ['/usr/sbin/gpasswd', '-M', 'carol', 'dev']]
+
+
+def test_user_removed_after_group_change_is_not_added_back(db, monkeypatch):
+    run_users(db, monkeypatch, [
+        dict(name='alice', groups='ops', append=True),
+        dict(name='alice', state='absent'),
+    ])
+
+    assert 'alice' not in db.users
+    assert db.groups['ops'][3] == ['bob']
+    assert db.groups['dev'][3] == ['bob']
+
+
+def test_unchanged_members_run_no_gpasswd(db, monkeypatch):
+    result = run_users(db, monkeypatch, [
+        dict(name='alice', groups='dev'),
+        dict(name='bob', groups='dev,ops'),
+    ])
+
+    assert not result['changed']
+    assert db.commands == []
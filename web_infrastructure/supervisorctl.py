@@ -19,6 +19,11 @@
 # along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 #
 import os
+import socket
+import httplib
+import urllib
+import xmlrpclib
+import ConfigParser
 
 DOCUMENTATION = '''
 ---
@@ -74,6 +79,9 @@ options:
 notes:
   - When C(state) = I(present), the module will call C(supervisorctl reread) then C(supervisorctl add) if the program/group does not exist.
   - When C(state) = I(restarted), the module will call C(supervisorctl update) then call C(supervisorctl restart).
+  - Since 2.1 the module talks to the XML-RPC interface of supervisord directly, over its unix socket or HTTP URL
+    (C(server_url), or the C(serverurl) of the configuration file), and acts on all the matched processes at once.
+    C(supervisorctl) is only used when the XML-RPC interface cannot be reached.
 requirements: [ "supervisorctl" ]
 author:
     - "Matt Wright (@mattupstate)"
@@ -94,6 +102,98 @@ EXAMPLES = '''
 - supervisorctl: name=my_app state=restarted username=test password=testpass server_url=http://localhost:9001
 '''
 
+# default locations of the configuration file, as searched by supervisorctl
+CONFIG_LOCATIONS = ['/etc/supervisord.conf', '/etc/supervisor/supervisord.conf']
+
+# status of the successful results of the *ProcessGroup calls
+RPC_SUCCESS = 80
+
+
+class UnixStreamHTTPConnection(httplib.HTTPConnection):
+    def __init__(self, path, *args, **kwargs):
+        httplib.HTTPConnection.__init__(self, 'localhost', *args, **kwargs)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class UnixStreamHTTP(httplib.HTTP):
+    ''' the old style connection object xmlrpclib uses before python 2.7 '''
+
+    def __init__(self, path):
+        self._setup(UnixStreamHTTPConnection(path))
+
+
+class UnixStreamTransport(xmlrpclib.Transport):
+    ''' XML-RPC over the unix socket of supervisord '''
+
+    def __init__(self, path):
+        xmlrpclib.Transport.__init__(self)
+        self.socket_path = path
+
+    def make_connection(self, host):
+        # python 2.7 talks to an HTTPConnection (and added single_request),
+        # older versions to an httplib.HTTP with getreply()
+        if hasattr(xmlrpclib.Transport, 'single_request'):
+            return UnixStreamHTTPConnection(self.socket_path)
+        return UnixStreamHTTP(self.socket_path)
+
+
+def get_server_settings(config, server_url, username, password):
+    ''' returns the server url, username and password, completed from the
+    [supervisorctl] section of the configuration file like supervisorctl does '''
+    if config:
+        locations = [config]
+    else:
+        locations = CONFIG_LOCATIONS
+    for location in locations:
+        if not os.path.exists(location):
+            continue
+        parser = ConfigParser.RawConfigParser()
+        try:
+            parser.read(location)
+        except ConfigParser.Error:
+            break
+        if parser.has_section('supervisorctl'):
+            here = os.path.dirname(os.path.abspath(location))
+            options = {}
+            for option in ('serverurl', 'username', 'password'):
+                if parser.has_option('supervisorctl', option):
+                    options[option] = parser.get('supervisorctl', option).replace('%(here)s', here)
+            server_url = server_url or options.get('serverurl')
+            username = username or options.get('username')
+            password = password or options.get('password')
+        break
+    return server_url or 'http://localhost:9001', username, password
+
+
+def get_rpc_server(server_url, username, password):
+    ''' returns a proxy to the XML-RPC interface of supervisord '''
+    auth = ''
+    if username:
+        auth = urllib.quote(username, safe='')
+        if password:
+            auth += ':' + urllib.quote(password, safe='')
+        auth += '@'
+    if server_url.startswith('unix://'):
+        return xmlrpclib.ServerProxy('http://%slocalhost/RPC2' % auth,
+                                     transport=UnixStreamTransport(server_url[len('unix://'):]))
+    scheme, rest = server_url.split('://', 1)
+    if not rest.rstrip('/').endswith('RPC2'):
+        rest = rest.rstrip('/') + '/RPC2'
+    return xmlrpclib.ServerProxy('%s://%s%s' % (scheme, auth, rest))
+
+
+def rpc_errors(names, results):
+    ''' returns the error messages of the results of a system.multicall '''
+    errors = []
+    for process_name, result in zip(names, results):
+        if isinstance(result, dict) and 'faultCode' in result:
+            errors.append('%s: ERROR (%s)' % (process_name, result['faultString']))
+    return errors
+
 
 def main():
     arg_spec = dict(
@@ -128,7 +228,7 @@ def main():
             module.fail_json(
                 msg="Provided path to supervisorctl does not exist or isn't executable: %s" % supervisorctl_path)
     else:
-        supervisorctl_args = [module.get_bin_path('supervisorctl', True)]
+        supervisorctl_args = [module.get_bin_path('supervisorctl', False)]
 
     if config:
         supervisorctl_args.extend(['-c', os.path.expanduser(config)])
@@ -146,8 +246,75 @@ def main():
             args.append(name)
         return module.run_command(args, **kwargs)
 
+    # talk to supervisord directly when its XML-RPC interface can be reached,
+    # supervisorctl is the fallback; a server which answers with an error
+    # (e.g. bad credentials) is not worked around
+    rpc = None
+    try:
+        rpc = get_rpc_server(*get_server_settings(config and os.path.expanduser(config), server_url, username, password))
+        rpc.supervisor.getState()
+    except xmlrpclib.ProtocolError, e:
+        module.fail_json(name=name, state=state, msg="supervisord XML-RPC error: %s %s" % (e.errcode, e.errmsg))
+    except xmlrpclib.Fault, e:
+        module.fail_json(name=name, state=state, msg="ERROR (%s)" % e.faultString)
+    except (socket.error, httplib.HTTPException, ValueError):
+        rpc = None
+    if rpc is None and supervisorctl_args[0] is None:
+        module.fail_json(msg="Failed to find required executable supervisorctl")
+
+    def rpc_call(method, *args):
+        try:
+            return getattr(rpc.supervisor, method)(*args)
+        except xmlrpclib.Fault, e:
+            module.fail_json(name=name, state=state, msg="ERROR (%s)" % e.faultString)
+        except Exception, e:
+            module.fail_json(name=name, state=state, msg="supervisord XML-RPC call %s failed: %s" % (method, str(e)))
+
+    def rpc_multicall(method, process_names):
+        calls = [{'methodName': 'supervisor.%s' % method, 'params': [namespecs[process_name]]} for process_name in process_names]
+        try:
+            results = rpc.system.multicall(calls)
+        except Exception, e:
+            module.fail_json(name=name, state=state, msg="supervisord XML-RPC call %s failed: %s" % (method, str(e)))
+        return rpc_errors(process_names, results)
+
+    def rpc_group_call(method):
+        errors = []
+        for result in rpc_call(method, name):
+            if result['status'] != RPC_SUCCESS:
+                errors.append('%s:%s: ERROR (%s)' % (result['group'], result['name'], result['description']))
+        return errors
+
+    def rpc_update():
+        # the equivalent of supervisorctl update: reread the configuration,
+        # then remove, replace and add the process groups that changed
+        added, changed, removed = rpc_call('reloadConfig')[0]
+        for group in changed + removed:
+            rpc_call('stopProcessGroup', group)
+            rpc_call('removeProcessGroup', group)
+        for group in changed + added:
+            rpc_call('addProcessGroup', group)
+
+    # process name as supervisorctl status shows it -> name for the XML-RPC calls
+    namespecs = {}
+
     def get_matched_processes():
         matched = []
+        if rpc is not None:
+            for info in rpc_call('getAllProcessInfo'):
+                if info['group'] == info['name']:
+                    process_name = info['name']
+                else:
+                    process_name = '%s:%s' % (info['group'], info['name'])
+                if is_group:
+                    if info['group'] != name or info['group'] == info['name']:
+                        continue
+                elif process_name != name:
+                    continue
+                namespecs[process_name] = '%s:%s' % (info['group'], info['name'])
+                matched.append((process_name, info['statename']))
+            return matched
+
         rc, out, err = run_supervisorctl('status')
         for line in out.splitlines():
             # One status line may look like one of these two:
@@ -174,6 +341,24 @@ def main():
             matched.append((process_name, status))
         return matched
 
+    def rpc_take_action(processes, to_take_action_on, action):
+        whole_group = is_group and len(to_take_action_on) == len(processes)
+        errors = []
+        if action in ('stop', 'restart'):
+            running = [process_name for process_name, status in processes
+                       if process_name in to_take_action_on and status in ('RUNNING', 'STARTING')]
+            if whole_group:
+                errors.extend(rpc_group_call('stopProcessGroup'))
+            elif running:
+                errors.extend(rpc_multicall('stopProcess', running))
+        if action in ('start', 'restart') and not errors:
+            if whole_group:
+                errors.extend(rpc_group_call('startProcessGroup'))
+            else:
+                errors.extend(rpc_multicall('startProcess', to_take_action_on))
+        if errors:
+            module.fail_json(msg='\n'.join(errors), name=name, state=state)
+
     def take_action_on_processes(processes, status_filter, action, expected_result):
         to_take_action_on = []
         for process_name, status in processes:
@@ -184,15 +369,21 @@ def main():
             module.exit_json(changed=False, name=name, state=state)
         if module.check_mode:
             module.exit_json(changed=True)
-        for process_name in to_take_action_on:
-            rc, out, err = run_supervisorctl(action, process_name, check_rc=True)
-            if '%s: %s' % (process_name, expected_result) not in out:
-                module.fail_json(msg=out)
+        if rpc is not None:
+            rpc_take_action(processes, to_take_action_on, action)
+        else:
+            for process_name in to_take_action_on:
+                rc, out, err = run_supervisorctl(action, process_name, check_rc=True)
+                if '%s: %s' % (process_name, expected_result) not in out:
+                    module.fail_json(msg=out)
 
         module.exit_json(changed=True, name=name, state=state, affected=to_take_action_on)
 
     if state == 'restarted':
-        rc, out, err = run_supervisorctl('update', check_rc=True)
+        if rpc is not None:
+            rpc_update()
+        else:
+            rc, out, err = run_supervisorctl('update', check_rc=True)
         processes = get_matched_processes()
         if len(processes) == 0:
             module.fail_json(name=name, msg="ERROR (no such process)")
@@ -207,6 +398,10 @@ def main():
 
         if module.check_mode:
             module.exit_json(changed=True)
+        if rpc is not None:
+            rpc_call('reloadConfig')
+            rpc_call('removeProcessGroup', name)
+            module.exit_json(changed=True, name=name, state=state)
         run_supervisorctl('reread', check_rc=True)
         rc, out, err = run_supervisorctl('remove', name)
         if '%s: removed process group' % name in out:
@@ -220,6 +415,10 @@ def main():
 
         if module.check_mode:
             module.exit_json(changed=True)
+        if rpc is not None:
+            rpc_call('reloadConfig')
+            rpc_call('addProcessGroup', name)
+            module.exit_json(changed=True, name=name, state=state)
         run_supervisorctl('reread', check_rc=True)
         rc, out, err = run_supervisorctl('add', name)
         if '%s: added process group' % name in out: